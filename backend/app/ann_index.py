@@ -0,0 +1,134 @@
+"""Approximate nearest-neighbour (IVF) index over catalog embeddings, for very large catalogs.
+
+build_ann_index.py embeds every catalog row offline: its sparse TF-IDF vector
+(app/content_engine.py) is projected to a few dozen dense dimensions with truncated SVD and
+L2-normalised. The embeddings are clustered with k-means into inverted lists and written
+grouped by list, so every list is one contiguous slice of vectors.npy:
+
+    <dir>/manifest.json   catalog path, row count and checksum, dims, lists
+    <dir>/encoder.joblib  TF-IDF vectorizers and SVD projection, to embed queries
+    <dir>/centroids.npy   (lists, dims) float32
+    <dir>/vectors.npy     (rows, dims) float32, grouped by list
+    <dir>/ids.npy         (rows,) catalog position of each vector
+    <dir>/offsets.npy     (lists + 1,) where each list starts in vectors/ids
+
+The Recommender memory-maps vectors.npy and ids.npy, so the pages are shared between workers
+and only the probed lists are read. A query scores the centroids, scans the ANN_N_PROBE closest
+lists and returns the best k rows: more probes give higher recall for more latency, and
+ANN_N_PROBE >= lists is an exact search over the embeddings.
+
+ANNIndex has the same query() / top_k() interface as ContentIndex.
+"""
+import json
+import logging
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.decomposition import TruncatedSVD
+from sklearn.preprocessing import normalize
+
+from . import content_engine
+from .model_artifacts import file_checksum
+
+logger = logging.getLogger(__name__)
+
+ANN_INDEX_DIR = os.getenv("ANN_INDEX_DIR", "app/ann")
+ANN_N_PROBE = int(os.getenv("ANN_N_PROBE", 16))
+DEFAULT_DIMS = 64
+
+
+def build(df, text_columns, tag_column, directory: str, catalog_path: str = None, dims: int = DEFAULT_DIMS, lists: int = None, seed: int = 0) -> dict:
+    """Embeds and clusters the catalog rows and writes the index files; returns the manifest."""
+    start_time = time.perf_counter()
+    content = content_engine.ContentIndex.from_frame(df, text_columns, tag_column)
+    dims = max(1, min(dims, content.matrix.shape[1] - 1))
+    svd = TruncatedSVD(n_components=dims, random_state=seed)
+    vectors = normalize(svd.fit_transform(content.matrix)).astype(np.float32)
+
+    # About sqrt(rows) lists keeps both the centroid scan and each list scan short
+    lists = max(1, min(lists or int(np.sqrt(len(vectors))), len(vectors)))
+    kmeans = MiniBatchKMeans(n_clusters=lists, random_state=seed, n_init=3, batch_size=max(1024, 4 * lists))
+    labels = kmeans.fit_predict(vectors)
+    order = np.argsort(labels, kind="stable")
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=lists))]).astype(np.int64)
+
+    os.makedirs(directory, exist_ok=True)
+    # Only the vectorizers are needed to embed queries
+    content.matrix = None
+    joblib.dump({"content": content, "components": svd.components_.astype(np.float32)}, os.path.join(directory, "encoder.joblib"))
+    np.save(os.path.join(directory, "centroids.npy"), normalize(kmeans.cluster_centers_).astype(np.float32))
+    np.save(os.path.join(directory, "vectors.npy"), vectors[order])
+    np.save(os.path.join(directory, "ids.npy"), order.astype(np.int64))
+    np.save(os.path.join(directory, "offsets.npy"), offsets)
+    manifest = {
+        "catalog_path": catalog_path,
+        "catalog_checksum": file_checksum(catalog_path) if catalog_path else None,
+        "rows": len(vectors),
+        "dims": dims,
+        "lists": lists,
+        "explained_variance": float(svd.explained_variance_ratio_.sum()),
+        "build_seconds": time.perf_counter() - start_time,
+    }
+    # Written last: a directory without a manifest is never loaded
+    with open(os.path.join(directory, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ANNIndex:
+    def __init__(self, directory: str, n_probe: int = ANN_N_PROBE):
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        encoder = joblib.load(os.path.join(directory, "encoder.joblib"))
+        self.content = encoder["content"]
+        self.components = encoder["components"]
+        self.centroids = np.load(os.path.join(directory, "centroids.npy"))
+        self.offsets = np.load(os.path.join(directory, "offsets.npy"))
+        self.vectors = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+        self.ids = np.load(os.path.join(directory, "ids.npy"), mmap_mode="r")
+        self.size = len(self.ids)
+        self.lists = len(self.centroids)
+        self.n_probe = n_probe
+
+    def query(self, text: str = "", tags=()) -> np.ndarray:
+        """Embeds free text and skill tags into a normalised dense query vector."""
+        vector = np.asarray(self.content.query(text, tags) @ self.components.T).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def top_k(self, query: np.ndarray, k: int, exclude=(), n_probe: int = None):
+        """Returns (catalog positions, scores) of the best k rows in the n_probe closest lists, best first."""
+        n_probe = max(1, min(n_probe or self.n_probe, self.lists))
+        centroid_scores = self.centroids @ query
+        probed = np.argpartition(centroid_scores, self.lists - n_probe)[self.lists - n_probe:]
+        ids = np.concatenate([self.ids[self.offsets[i]:self.offsets[i + 1]] for i in probed])
+        scores = np.concatenate([self.vectors[self.offsets[i]:self.offsets[i + 1]] @ query for i in probed])
+        if len(exclude):
+            scores[np.isin(ids, np.asarray(exclude, dtype=ids.dtype))] = -np.inf
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        candidates = np.argpartition(scores, len(scores) - k)[len(scores) - k:]
+        order = candidates[np.argsort(scores[candidates])[::-1]]
+        order = order[np.isfinite(scores[order])]
+        return ids[order], scores[order]
+
+
+def load(directory: str, catalog_path: str, rows: int, n_probe: int = ANN_N_PROBE):
+    """Returns the ANNIndex in `directory` if one was built for this catalog file, else None."""
+    manifest_path = os.path.join(directory, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        index = ANNIndex(directory, n_probe)
+    except Exception as e:
+        logger.warning("Could not load the ANN index in %s: %s", directory, e)
+        return None
+    if index.size != rows or index.manifest.get("catalog_checksum") != file_checksum(catalog_path):
+        logger.warning("Ignoring the ANN index in %s: it was built for a different version of %s. Rebuild it with build_ann_index.py.", directory, catalog_path)
+        return None
+    logger.info("Loaded ANN index for %s (%d rows, %d lists, n_probe=%d).", catalog_path, index.size, index.lists, index.n_probe)
+    return index
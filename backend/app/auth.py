@@ -139,6 +139,13 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     return user
 
 
+def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+    # Granted per account with manage_admins.py, so renaming an account never changes its rights
+    if not current_user.is_admin:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Administrator access required")
+    return current_user
+
+
 def update_user(db: Session, current_user: models.User, user_update: schemas.UserUpdate):
     if user_update.username is not None:
         current_user.username = user_update.username
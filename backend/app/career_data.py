@@ -0,0 +1,83 @@
+"""Loading the career aptitude dataset (data/cleaned_dataset.csv) for training.
+
+Every column is read with an explicit dtype: the profession labels as a categorical, the
+sixteen aptitude and preference scores as int8 (they are small integers, but P6 and P8 are
+written as floats such as "1.0"). Labels are normalised once per distinct value rather than
+per row: the file quotes them with a trailing newline ("Astronomer\\n").
+
+The file is read in chunks of CAREER_DATA_CHUNK_ROWS, so peak memory is the compact result
+plus one chunk. A row takes 16 bytes of features and a category code, which keeps tens of
+millions of rows trainable in memory; iter_career_chunks() serves consumers that can work
+chunk by chunk.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sklearn.preprocessing import LabelEncoder
+
+CAREER_DATA_PATH = "data/cleaned_dataset.csv"
+CAREER_DATA_CHUNK_ROWS = int(os.getenv("CAREER_DATA_CHUNK_ROWS", 1_000_000))
+
+LABEL_COLUMN = "Job profession"
+# Multiple-intelligence scores
+APTITUDE_COLUMNS = ['Linguistic', 'Musical', 'Bodily', 'Logical - Mathematical', 'Spatial-Visualization', 'Interpersonal', 'Intrapersonal', 'Naturalist']
+# Personality answers, already mapped to 0-2 by the cleaning script
+PREFERENCE_COLUMNS = ['P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8']
+FEATURE_COLUMNS = APTITUDE_COLUMNS + PREFERENCE_COLUMNS
+
+# float32 holds every small integer exactly, whether the file writes "2" or "2.0"
+_READ_DTYPES = {LABEL_COLUMN: "category", **{column: "float32" for column in FEATURE_COLUMNS}}
+_INT8_RANGE = (np.iinfo(np.int8).min, np.iinfo(np.int8).max)
+
+
+def _normalize(chunk: pd.DataFrame, first_row: int) -> pd.DataFrame:
+    labels = chunk[LABEL_COLUMN]
+    if labels.isna().any():
+        row = first_row + int(np.flatnonzero(labels.isna().to_numpy())[0])
+        raise ValueError(f"Missing {LABEL_COLUMN!r} in data row {row}")
+    # Strip each distinct label once; labels that differ only in whitespace merge
+    stripped = labels.cat.categories.str.strip()
+    codes, categories = pd.factorize(stripped)
+    labels = pd.Categorical.from_codes(codes[labels.cat.codes.to_numpy()], categories=categories)
+
+    features = {}
+    for column in FEATURE_COLUMNS:
+        values = chunk[column].to_numpy()
+        invalid = np.isnan(values) | (values != np.round(values)) | (values < _INT8_RANGE[0]) | (values > _INT8_RANGE[1])
+        if invalid.any():
+            row = first_row + int(np.flatnonzero(invalid)[0])
+            raise ValueError(f"{column!r} in data row {row} is not a small integer: {chunk[column].iloc[row - first_row]!r}")
+        features[column] = values.astype(np.int8)
+    return pd.DataFrame({LABEL_COLUMN: labels, **features}, index=chunk.index)
+
+
+def iter_career_chunks(path: str = CAREER_DATA_PATH, chunk_rows: int = CAREER_DATA_CHUNK_ROWS):
+    """Yields the dataset as normalised DataFrames of at most chunk_rows rows."""
+    first_row = 0
+    with pd.read_csv(path, usecols=[LABEL_COLUMN] + FEATURE_COLUMNS, dtype=_READ_DTYPES, chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            yield _normalize(chunk, first_row)
+            first_row += len(chunk)
+
+
+def load_career_data(path: str = CAREER_DATA_PATH, chunk_rows: int = CAREER_DATA_CHUNK_ROWS) -> pd.DataFrame:
+    """Reads the whole dataset into one compact DataFrame, chunk by chunk."""
+    chunks = list(iter_career_chunks(path, chunk_rows))
+    if not chunks:
+        return _normalize(pd.read_csv(path, usecols=[LABEL_COLUMN] + FEATURE_COLUMNS, dtype=_READ_DTYPES), 0)
+    labels = union_categoricals([chunk[LABEL_COLUMN] for chunk in chunks], sort_categories=True)
+    features = {column: np.concatenate([chunk[column].to_numpy() for chunk in chunks]) for column in FEATURE_COLUMNS}
+    return pd.DataFrame({LABEL_COLUMN: labels, **features})
+
+
+def encode_labels(labels: pd.Series):
+    """Fits a LabelEncoder on the profession labels; returns it with the encoded targets.
+
+    Works on the categories, so it matches LabelEncoder().fit_transform(labels) without
+    building one string object per row."""
+    labels = labels.cat.remove_unused_categories()
+    encoder = LabelEncoder().fit(labels.cat.categories.astype(str))
+    category_codes = encoder.transform(labels.cat.categories.astype(str))
+    return encoder, category_codes[labels.cat.codes.to_numpy()]
@@ -0,0 +1,331 @@
+"""Course and career catalogs, hot-reloadable and compact in memory.
+
+A Catalog is one immutable version of the catalog files (courses, careers, course metadata and
+course families) together with the lookup indexes built from them. CatalogManager holds the
+current version. When a file changes, reload_if_changed() builds the next version completely
+(off the request path: in the model watcher or the gunicorn master) and then swaps it in with
+a single assignment. A request reads `manager.current` once and uses that version throughout,
+so it never sees a half-updated catalog. If the new files cannot be loaded, the current
+version keeps serving.
+
+Catalog tables are kept small: numeric columns stay numeric (downcast), repetitive text columns
+are categorical (each distinct string stored once plus a small code per row), and the course
+metadata keeps one row per course name with its templated sentences ("Graduates of X can
+work in ...") stored as template + course name.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import telemetry, content_engine, ann_index
+
+logger = logging.getLogger(__name__)
+
+COURSE_METADATA_PATH = "data/courses_jobApplicability_future_trends_automation_risk.csv"
+# Course families the course models predict: course_id = class + 1 (see train.py)
+COURSE_FAMILIES_PATH = "data/courses.csv"
+# Columns indexed for content matching: (text columns, skill tag column)
+COURSE_CONTENT_COLUMNS = (['course_name', 'field', 'description'], 'skills_tags')
+# Names only: the career index resolves predicted career names that differ slightly from the catalog
+CAREER_CONTENT_COLUMNS = (['career_name'], None)
+
+# How many of the most similar catalog courses are considered when looking for one of the right type
+COURSE_MATCH_CANDIDATES = 20
+# Minimum TF-IDF cosine similarity for matching a predicted career name to a catalog entry
+CAREER_MATCH_MIN_SCORE = 0.5
+# Candidates taken from an ANN career index and re-scored in TF-IDF space before applying the minimum
+CAREER_MATCH_CANDIDATES = 10
+COURSE_TYPE_KEYWORDS = {"Bachelor's Degree": "bachelor", "Diploma": "diploma", "Certificate": "certificate"}
+
+# Text columns with at most this share of distinct values are dictionary-encoded (categorical)
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+# Rows read first to find the text columns
+CATEGORY_SAMPLE_ROWS = 1000
+
+CATALOG_RELOADS = telemetry.counter("catalog_reloads_total", "Catalog reloads by outcome.", labelnames=("status",))
+
+
+def _fingerprint(paths) -> tuple:
+    """(path, mtime, size) of each file; any change to a file changes the fingerprint."""
+    fingerprint = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((path, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            fingerprint.append((path, None, None))
+    return tuple(fingerprint)
+
+
+def read_catalog_csv(path, strip_columns=()) -> pd.DataFrame:
+    """Reads a catalog CSV compactly: missing text becomes 'N/A', numeric columns are downcast and
+    repetitive text columns become categorical."""
+    # Text columns that repeat within the first rows are parsed straight into categoricals, which
+    # never materialises one string object per row
+    sample = pd.read_csv(path, nrows=CATEGORY_SAMPLE_ROWS)
+    text_columns = [column for column in sample.columns if pd.api.types.is_object_dtype(sample[column]) or pd.api.types.is_string_dtype(sample[column])]
+    categorical = [column for column in text_columns if sample[column].nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(sample)]
+    df = pd.read_csv(path, dtype={column: "category" for column in categorical})
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="integer")
+            continue
+        if pd.api.types.is_float_dtype(series):
+            df[column] = pd.to_numeric(series, downcast="float")
+            continue
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.fillna('N/A').astype(str)
+            if column in strip_columns:
+                series = series.str.strip()
+            if series.nunique() <= CATEGORY_MAX_UNIQUE_RATIO * len(series):
+                series = series.astype("category")
+            df[column] = series
+            continue
+        if series.isna().any():
+            if 'N/A' not in series.cat.categories:
+                series = series.cat.add_categories(['N/A'])
+            series = series.fillna('N/A')
+        if column in strip_columns:
+            series = series.astype(str).str.strip().astype("category")
+        if len(series.cat.categories) > CATEGORY_MAX_UNIQUE_RATIO * len(series):
+            series = series.astype(str)
+        df[column] = series
+    return df
+
+
+class TemplatedText:
+    """A text column generated from a few templates around a per-row parameter.
+
+    Each distinct template is stored once, with the parameter replaced by a placeholder, plus
+    one small code per row; values that do not contain their parameter are their own template."""
+
+    PLACEHOLDER = "\x00"
+
+    def __init__(self, texts, params):
+        templates = {}
+        codes = []
+        for text, param in zip(texts, params):
+            if param and param in text and self.PLACEHOLDER not in text:
+                text = text.replace(param, self.PLACEHOLDER)
+            codes.append(templates.setdefault(text, len(templates)))
+        self.templates = list(templates)
+        self.codes = np.asarray(codes, dtype=np.min_scalar_type(max(len(self.templates) - 1, 0)))
+        self.params = params
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, position):
+        return self.templates[self.codes[position]].replace(self.PLACEHOLDER, self.params[position])
+
+
+class CourseMetadata:
+    """Job applicability, future trends and automation risk by course name.
+
+    lookup() returns the first row, in file order, whose name contains or is contained in the
+    course name. Rows repeating an earlier name can never be that row, so only the first row
+    per name is kept."""
+
+    FIELDS = ("job_applicability", "future_trends", "automation_risk")
+
+    def __init__(self, df):
+        self.rows = len(df)
+        first_rows = df.drop_duplicates("course_name")
+        self.names = [sys.intern(str(name)) for name in first_rows["course_name"]]
+        self.names_lower = [name.lower() for name in self.names]
+        self.columns = {field: TemplatedText([str(value) for value in first_rows[field]], self.names) for field in self.FIELDS}
+
+    def __len__(self):
+        return len(self.names)
+
+    def lookup(self, course_name_lower):
+        """Returns (job_applicability, future_trends, automation_risk) for the first matching course name, or None."""
+        for position, meta_course_name_lower in enumerate(self.names_lower):
+            if meta_course_name_lower in course_name_lower or course_name_lower in meta_course_name_lower:
+                return tuple(self.columns[field][position] for field in self.FIELDS)
+        return None
+
+
+def _load_course_families(path):
+    """Returns {course_id: {"name", "required_skills"}} from courses.csv, or {} if it is missing."""
+    if not os.path.exists(path):
+        return {}
+    families = pd.read_csv(path).fillna('')
+    return {
+        int(row.course_id): {"name": str(row.course_name), "required_skills": content_engine.split_tags(row.required_skills)}
+        for row in families.itertuples(index=False)
+    }
+
+
+def _load_content_index(name, df, path, columns):
+    # A prebuilt ANN index (build_ann_index.py) when there is one for this catalog file, else exact sparse TF-IDF
+    if df.empty:
+        return None
+    index = ann_index.load(os.path.join(ann_index.ANN_INDEX_DIR, name), path, len(df))
+    if index is not None:
+        return index
+    text_columns, tag_column = columns
+    return content_engine.ContentIndex.from_frame(df, text_columns, tag_column)
+
+
+class Catalog:
+    def __init__(self, version, courses_path, careers_path, metadata_path=COURSE_METADATA_PATH, families_path=COURSE_FAMILIES_PATH):
+        start_time = time.perf_counter()
+        self.version = version
+        # Taken before reading, so a write during the load is picked up by the next check
+        self.fingerprint = _fingerprint((courses_path, careers_path, metadata_path, families_path))
+
+        self.courses_df = read_catalog_csv(courses_path)
+        self.careers_df = read_catalog_csv(careers_path, strip_columns=('career_name',))
+        self.course_metadata = CourseMetadata(read_catalog_csv(metadata_path))
+        self.course_families = _load_course_families(families_path)
+
+        self.course_content = _load_content_index("courses", self.courses_df, courses_path, COURSE_CONTENT_COLUMNS)
+        # Rows sharing a course name (case-insensitive) share a name code; the rows of each code are
+        # a slice of course_name_order. The catalog repeats names, and a name is recommended only once.
+        names = self.courses_df['course_name'].astype("category")
+        lower_codes, uniques = pd.factorize(names.cat.categories.str.lower())
+        codes = lower_codes[names.cat.codes.to_numpy()]
+        self.course_name_codes = codes.astype(np.min_scalar_type(max(len(uniques) - 1, 0)))
+        self.course_name_order = np.argsort(codes, kind="stable")
+        self.course_name_offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(uniques)))])
+        # Lower-cased name of each code; its hash table is built on the first find_course()
+        self.course_names_lower = pd.Index(uniques)
+        self.career_content = _load_content_index("careers", self.careers_df, careers_path, CAREER_CONTENT_COLUMNS)
+        # Exact name lookup; the first row wins for duplicate names
+        self.career_positions = {}
+        for position, name in enumerate(self.careers_df['career_name'].astype(str).str.lower()):
+            self.career_positions.setdefault(name, position)
+
+        self.loaded_at = time.time()
+        self.load_seconds = time.perf_counter() - start_time
+
+    def summary(self) -> dict:
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds,
+            "courses": len(self.courses_df),
+            "careers": len(self.careers_df),
+            "course_metadata": self.course_metadata.rows,
+            "course_families": len(self.course_families),
+            "course_index": type(self.course_content).__name__ if self.course_content is not None else None,
+        }
+
+    def lookup_course_metadata(self, course_name_lower):
+        """Returns (job_applicability, future_trends, automation_risk) for the first matching metadata row, or None."""
+        return self.course_metadata.lookup(course_name_lower)
+
+    def course_name_positions(self, name_code) -> np.ndarray:
+        """Rows of courses_df with this course name code."""
+        return self.course_name_order[self.course_name_offsets[name_code]:self.course_name_offsets[name_code + 1]]
+
+    def find_course(self, course_name):
+        """courses_df row of the first course with this name (case-insensitive), or None."""
+        code = self.course_names_lower.get_indexer([course_name.lower()])[0]
+        if code < 0:
+            return None
+        return self.courses_df.iloc[self.course_name_positions(code)[0]]
+
+    def find_career(self, career_name):
+        """careers_df row of the career with exactly this name (case-insensitive), or None."""
+        position = self.career_positions.get(career_name.lower())
+        return None if position is None else self.careers_df.iloc[position]
+
+    def resolve_career(self, predicted_career_name):
+        """Finds the careers_df row for a predicted career name (exact, then most similar catalog entry), or None."""
+        # 1. Try exact match
+        career = self.find_career(predicted_career_name)
+        if career is not None:
+            return career
+        # 2. Try the most similar catalog name
+        if self.career_content is None:
+            return None
+        if isinstance(self.career_content, ann_index.ANNIndex):
+            positions, scores = self._rescore_careers(predicted_career_name)
+        else:
+            positions, scores = self.career_content.top_k(self.career_content.query(predicted_career_name), 1)
+        if len(positions) and scores[0] >= CAREER_MATCH_MIN_SCORE:
+            return self.careers_df.iloc[positions[0]]
+        return None
+
+    def _rescore_careers(self, predicted_career_name):
+        # ANN scores are cosines between SVD embeddings, which run higher than the TF-IDF cosine
+        # CAREER_MATCH_MIN_SCORE is set for. Re-embed the best few candidates with the index's own
+        # TF-IDF vectorizers and rank them by their exact TF-IDF cosine.
+        index = self.career_content
+        positions, _ = index.top_k(index.query(predicted_career_name), CAREER_MATCH_CANDIDATES)
+        if not len(positions):
+            return positions, np.empty(0, dtype=np.float32)
+        texts, tags = content_engine.frame_texts(self.careers_df.iloc[positions], *CAREER_CONTENT_COLUMNS)
+        query = index.content.query(predicted_career_name)
+        scores = np.asarray((index.content.embed(texts, tags) @ query.T).todense()).ravel()
+        order = np.argsort(scores, kind="stable")[::-1]
+        return positions[order], scores[order]
+
+    def match_course(self, student_input, course_id, course_type, exclude):
+        """Returns the position in courses_df of the catalog course most similar to the student's interests
+        and skills and to the predicted course family, preferring courses of the given type and skipping
+        the course name codes in `exclude`; None if the catalog is empty."""
+        if self.course_content is None:
+            return None
+        family = self.course_families.get(int(course_id) + 1, {"name": "", "required_skills": []})
+        terms = list(student_input.interests) + list(student_input.skills)
+        query = self.course_content.query(" ".join(terms + [family["name"]]), terms + family["required_skills"])
+        excluded = np.concatenate([self.course_name_positions(code) for code in exclude]) if exclude else ()
+        positions, _ = self.course_content.top_k(query, COURSE_MATCH_CANDIDATES, excluded)
+        if not len(positions):
+            return None
+        keyword = COURSE_TYPE_KEYWORDS.get(course_type)
+        for position in positions:
+            if keyword and keyword in str(self.courses_df['course_name'].iat[position]).lower():
+                return int(position)
+        return int(positions[0])
+
+
+class CatalogManager:
+    def __init__(self, courses_path, careers_path, metadata_path=COURSE_METADATA_PATH, families_path=COURSE_FAMILIES_PATH):
+        self.paths = dict(courses_path=courses_path, careers_path=careers_path, metadata_path=metadata_path, families_path=families_path)
+        # Serialises reloads; readers never take it
+        self._reload_lock = threading.Lock()
+        self._failed_fingerprint = None
+        self.current = Catalog(1, **self.paths)
+
+    def changed(self) -> bool:
+        fingerprint = _fingerprint(self.paths.values())
+        return fingerprint != self.current.fingerprint and fingerprint != self._failed_fingerprint
+
+    def reload(self) -> Catalog:
+        """Builds the next catalog version from the files and swaps it in; raises if they cannot be loaded."""
+        with self._reload_lock:
+            try:
+                catalog = Catalog(self.current.version + 1, **self.paths)
+            except Exception:
+                CATALOG_RELOADS.labels(status="failure").inc()
+                # Not retried until the files change again
+                self._failed_fingerprint = _fingerprint(self.paths.values())
+                raise
+            self.current = catalog
+            self._failed_fingerprint = None
+        CATALOG_RELOADS.labels(status="success").inc()
+        logger.info("Catalog version %d loaded in %.2fs (%d courses, %d careers).", catalog.version, catalog.load_seconds, len(catalog.courses_df), len(catalog.careers_df))
+        return catalog
+
+    def reload_if_changed(self) -> bool:
+        """Reloads when a catalog file changed; returns whether a new version was swapped in."""
+        if not self.changed():
+            return False
+        try:
+            self.reload()
+        except Exception as e:
+            logger.exception("Could not load the changed catalog files; keeping version %d: %s", self.current.version, e)
+            return False
+        return True
@@ -0,0 +1,462 @@
+"""School cohort jobs: recommendations for a whole class from one uploaded results CSV.
+
+/admin/cohorts streams the upload to COHORT_JOB_DIR under COHORT_MAX_UPLOAD_BYTES and checks its
+header at once. The job is a row in cohort_jobs, so any worker can report its progress. A single
+CohortJobRunner works through the queue, in the app process or, under gunicorn, in the job runner
+process (app/job_runners.py). It scores each job in a child process (python -m app.cohorts
+<job id>) that loads the current models itself, so the runner's process never starts model
+threads or OpenMP pools. The child reads the file
+COHORT_CHUNK_ROWS rows at a time, and for each chunk:
+
+- validates every cell with column-wise checks; a bad row is reported in the results, the rest
+  of the chunk is still scored;
+- builds the course and career model inputs of the valid rows at once and scores them with one
+  predict_proba (course) and one predict (career) call;
+- appends the chunk's results to the results CSV and bulk-inserts them into cohort_results.
+
+Memory is bounded by the chunk size, whatever the size of the cohort. The courses reported are
+the top predicted course families, as in /recommend/what-if. Matching a student to individual
+catalog courses takes a text search per course and stays with /recommend.
+"""
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+from fastapi import UploadFile
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models, serving, telemetry
+from .database import SessionLocal
+from .logging_config import setup_logging
+from .recommender import CAREER_APTITUDE_FIELDS, P_VALUE_MAPPING, DEFAULT_PATHS, Recommender
+from .uploads import UPLOAD_CHUNK_SIZE, UploadTooLarge
+
+# Named explicitly: run with python -m, __name__ is "__main__", outside the "app" logger
+logger = logging.getLogger("app.cohorts")
+
+COHORT_JOB_DIR = os.getenv("COHORT_JOB_DIR", "jobs/cohorts")
+COHORT_MAX_UPLOAD_BYTES = int(os.getenv("COHORT_MAX_UPLOAD_BYTES", 64 * 1024 * 1024))
+COHORT_CHUNK_ROWS = int(os.getenv("COHORT_CHUNK_ROWS", 5000))
+COHORT_QUEUE_MAX_JOBS = int(os.getenv("COHORT_QUEUE_MAX_JOBS", 10))
+# How often the runner looks for new jobs
+COHORT_POLL_SECONDS = 1.0
+COHORT_KILL_GRACE_SECONDS = 10
+
+SCORE_COMMAND = [sys.executable, "-m", "app.cohorts"]
+
+# Columns of the uploaded CSV, besides one column per subject holding the KCSE grade ("B+"; blank if not taken)
+REFERENCE_COLUMN = "student_ref"  # Optional: admission number or name, copied to the results
+LIST_COLUMNS = ("interests", "skills")  # Optional, separated by LIST_SEPARATOR
+APTITUDE_COLUMNS = tuple(CAREER_APTITUDE_FIELDS.values())  # Whole numbers, as in the student form
+PREFERENCE_COLUMNS = tuple(f"p{i}" for i in range(1, 9))  # POOR, AVG or BEST; blank counts as AVG
+LIST_SEPARATOR = ";"
+MAX_SUBJECTS = 7  # Same limit as /recommend
+TOP_COURSES = 5
+
+RESULT_COLUMNS = (
+    ["row", REFERENCE_COLUMN, "status", "error", "average_points", "profile_rating", "eligible_course_types"]
+    + [column for rank in range(1, TOP_COURSES + 1) for column in (f"course_{rank}", f"course_{rank}_probability")]
+    + ["career"]
+)
+
+COHORT_ROWS = telemetry.counter("cohort_rows_total", "Rows of uploaded cohort CSVs processed, by outcome.", labelnames=("status",))
+
+
+class CohortQueueFull(Exception):
+    pass
+
+
+# --- Upload and submission (API workers) ---
+
+async def store_upload(file: UploadFile, max_bytes: int = COHORT_MAX_UPLOAD_BYTES):
+    """Streams an uploaded CSV into COHORT_JOB_DIR. Returns (path, estimated number of data rows);
+    raises UploadTooLarge."""
+    os.makedirs(COHORT_JOB_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(dir=COHORT_JOB_DIR, prefix="upload-", suffix=".csv")
+    size = 0
+    lines = 0
+    last_byte = b"\n"
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                lines += chunk.count(b"\n")
+                last_byte = chunk[-1:]
+                await run_in_threadpool(out.write, chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    if last_byte != b"\n":
+        lines += 1
+    # Quoted cells may hold newlines; the exact count is recorded when the job finishes
+    return path, max(lines - 1, 0)
+
+
+def column_names(columns, subjects) -> dict:
+    """Maps the CSV's column names (any case, surrounding spaces) to the expected ones; ValueError
+    for unknown or missing columns."""
+    expected = list(subjects) + [REFERENCE_COLUMN, *LIST_COLUMNS, *APTITUDE_COLUMNS, *PREFERENCE_COLUMNS]
+    by_lower = {name.lower(): name for name in expected}
+    names = {}
+    unknown = []
+    for column in columns:
+        name = by_lower.get(str(column).strip().lower())
+        if name is None:
+            unknown.append(str(column))
+        else:
+            names[column] = name
+    if unknown:
+        raise ValueError(f"Unknown columns: {', '.join(unknown)}")
+    found = set(names.values())
+    missing = [name for name in APTITUDE_COLUMNS + PREFERENCE_COLUMNS if name not in found]
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(missing)}")
+    if not found.intersection(subjects):
+        raise ValueError("No subject grade columns")
+    return names
+
+
+def check_header(path: str, subjects) -> dict:
+    try:
+        header = pd.read_csv(path, nrows=0, dtype=str, encoding="utf-8-sig")
+    except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+        raise ValueError(f"Not a readable UTF-8 CSV file: {e}")
+    return column_names(header.columns, subjects)
+
+
+def submit(db: Session, input_path: str, filename: Optional[str], rows_total: int, requested_by: Optional[str] = None) -> models.CohortJob:
+    queued = db.query(models.CohortJob).filter(models.CohortJob.status == "queued").count()
+    if queued >= COHORT_QUEUE_MAX_JOBS:
+        raise CohortQueueFull(f"{queued} cohort jobs are already queued")
+    job = models.CohortJob(
+        status="queued", requested_by=requested_by, filename=filename, input_path=input_path,
+        rows_total=rows_total, rows_processed=0, rows_scored=0, rows_invalid=0, cancel_requested=False,
+    )
+    db.add(job)
+    db.commit()
+    job.result_path = os.path.join(COHORT_JOB_DIR, f"{job.id}-results.csv")
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def cancel(db: Session, job: models.CohortJob) -> models.CohortJob:
+    """Cancels a queued job at once; a running one stops before its next chunk."""
+    # Conditional updates: the runner may claim the job between the caller's read and this write
+    jobs = db.query(models.CohortJob).filter(models.CohortJob.id == job.id)
+    cancelled = jobs.filter(models.CohortJob.status == "queued").update(
+        {"status": "cancelled", "finished_at": datetime.utcnow()}, synchronize_session=False)
+    if not cancelled:
+        jobs.filter(models.CohortJob.status == "running").update({"cancel_requested": True}, synchronize_session=False)
+    db.commit()
+    if cancelled and os.path.exists(job.input_path):
+        os.remove(job.input_path)
+    db.refresh(job)
+    return job
+
+
+def describe(db: Session, job: models.CohortJob) -> dict:
+    """The job's row plus its place in the queue and its progress."""
+    description = {column.name: getattr(job, column.name) for column in job.__table__.columns}
+    description["progress"] = min(job.rows_processed / job.rows_total, 1.0) if job.rows_total else float(job.status == "succeeded")
+    description["queue_position"] = None
+    if job.status == "queued":
+        description["queue_position"] = db.query(models.CohortJob).filter(
+            (models.CohortJob.status == "running")
+            | ((models.CohortJob.status == "queued") & (models.CohortJob.id < job.id))
+        ).count()
+    return description
+
+
+# --- Scoring (runner) ---
+
+class _CohortScorer:
+    """The models, grade scale and course families of one job, fixed when the job starts so a
+    model or catalog reload in between does not mix versions in one results file."""
+
+    def __init__(self, recommender):
+        self.recommender = recommender
+        self.subjects = list(recommender.all_subjects)
+        self.grade_points = dict(recommender.grade_points)
+        self.default_points = self.grade_points.get('E', 1)
+        snapshot = recommender.snapshot
+        self.model_version = snapshot.model_version
+        self.course_model_key = snapshot.chosen_course_model_key
+        self.course_pipeline = snapshot.course_pipelines[self.course_model_key]
+        self.career_pipeline = snapshot.career_model_pipeline
+        self.career_label_encoder = snapshot.career_label_encoder
+        self.catalog = recommender.catalog.current
+        families = self.catalog.course_families
+        self.course_names = np.array([
+            families[int(label) + 1]["name"] if int(label) + 1 in families else f"Course {int(label) + 1}"
+            for label in self.course_pipeline.classes_
+        ], dtype=object)
+        self._career_names = {}
+
+    def _career_name(self, predicted: str) -> str:
+        # A handful of distinct labels per cohort: resolve each once
+        name = self._career_names.get(predicted)
+        if name is None:
+            career = self.catalog.resolve_career(predicted)
+            name = self._career_names[predicted] = career['career_name'] if career is not None else predicted
+        return name
+
+    def score_chunk(self, chunk: pd.DataFrame, first_row: int) -> pd.DataFrame:
+        """Results of one chunk of the CSV (renamed columns, every cell a string), one row per input row."""
+        rows = len(chunk)
+        errors = pd.Series("", index=chunk.index, dtype=object)
+
+        def flag(invalid, message):
+            # Only a row's first problem is reported
+            invalid = invalid & (errors == "")
+            errors[invalid] = message if isinstance(message, str) else message[invalid]
+
+        subjects = [subject for subject in self.subjects if subject in chunk.columns]
+        grades = chunk[subjects].apply(lambda column: column.str.strip().str.upper())
+        points = grades.apply(lambda column: column.map(self.grade_points))
+        taken = grades != ""
+        unknown = taken & points.isna()
+        flag(unknown.any(axis=1), "Unknown grade for " + unknown.idxmax(axis=1))
+        subject_counts = taken.sum(axis=1)
+        flag(subject_counts == 0, "No grades")
+        flag(subject_counts > MAX_SUBJECTS, f"More than {MAX_SUBJECTS} subjects")
+
+        aptitudes = {}
+        for column in APTITUDE_COLUMNS:
+            values = pd.to_numeric(chunk[column].str.strip(), errors="coerce")
+            flag(values.isna() | (values != values.round()), f"{column} must be a whole number")
+            aptitudes[column] = values
+        preferences = {}
+        for column in PREFERENCE_COLUMNS:
+            values = chunk[column].str.strip().str.upper().replace("", "AVG").map(P_VALUE_MAPPING)
+            flag(values.isna(), f"{column} must be POOR, AVG or BEST")
+            preferences[column] = values
+
+        valid = (errors == "").to_numpy()
+        results = {column: np.full(rows, None, dtype=object) for column in RESULT_COLUMNS}
+        results["row"] = np.arange(first_row + 1, first_row + rows + 1)
+        if REFERENCE_COLUMN in chunk.columns:
+            results[REFERENCE_COLUMN] = chunk[REFERENCE_COLUMN].to_numpy(dtype=object)
+        results["status"] = np.where(valid, "scored", "invalid")
+        results["error"] = errors.to_numpy(dtype=object)
+        if not valid.any():
+            return pd.DataFrame(results, dtype=object)
+
+        # Model inputs of the valid rows, in the layout of Recommender._build_course_frame/_build_career_frame
+        course_frame = {}
+        for subject in self.subjects:
+            if subject in points.columns:
+                course_frame[subject] = points[subject].to_numpy()[valid]
+            else:
+                course_frame[subject] = np.full(valid.sum(), np.nan)
+            course_frame[subject] = np.nan_to_num(course_frame[subject], nan=self.default_points).astype(int)
+        for column in LIST_COLUMNS:
+            cells = chunk[column].to_numpy()[valid] if column in chunk.columns else [""] * int(valid.sum())
+            course_frame[column] = [[item.strip() for item in cell.split(LIST_SEPARATOR) if item.strip()] for cell in cells]
+        course_frame = pd.DataFrame(course_frame)
+        career_frame = {column: aptitudes[field].to_numpy()[valid].astype(int) for column, field in CAREER_APTITUDE_FIELDS.items()}
+        for i, column in enumerate(PREFERENCE_COLUMNS, start=1):
+            career_frame[f"P{i}"] = preferences[column].to_numpy()[valid].astype(int)
+        career_frame = pd.DataFrame(career_frame)
+
+        # One call per model for the whole chunk
+        course_probabilities = serving.score(self.course_pipeline, course_frame)
+        top_courses = np.argsort(course_probabilities, axis=1)[:, ::-1][:, :TOP_COURSES]
+        careers = self.career_label_encoder.inverse_transform(self.career_pipeline.predict(career_frame))
+
+        average_points = np.nanmean(points.to_numpy(dtype=float)[valid], axis=1)
+        results["average_points"][valid] = np.round(average_points, 2)
+        results["profile_rating"][valid] = [self.recommender._get_profile_rating(value) for value in average_points]
+        results["eligible_course_types"][valid] = [
+            LIST_SEPARATOR.join(self.recommender._get_possible_course_types(value)) for value in average_points
+        ]
+        for rank in range(min(TOP_COURSES, top_courses.shape[1])):
+            results[f"course_{rank + 1}"][valid] = self.course_names[top_courses[:, rank]]
+            results[f"course_{rank + 1}_probability"][valid] = np.round(
+                np.take_along_axis(course_probabilities, top_courses[:, rank:rank + 1], axis=1)[:, 0].astype(float), 4)
+        results["career"][valid] = [self._career_name(str(name).strip()) for name in careers]
+        return pd.DataFrame(results, dtype=object)
+
+
+def _result_records(job_id: int, results: pd.DataFrame) -> list:
+    courses = results[[f"course_{rank}" for rank in range(1, TOP_COURSES + 1)]]
+    return [
+        {
+            "job_id": job_id,
+            "row_number": int(row.row),
+            "student_ref": getattr(row, REFERENCE_COLUMN) or None,
+            "status": row.status,
+            "error": row.error or None,
+            "average_points": None if row.average_points is None else float(row.average_points),
+            "profile_rating": row.profile_rating,
+            "courses": LIST_SEPARATOR.join(name for name in names if name is not None) or None,
+            "top_course_probability": None if row.course_1_probability is None else float(row.course_1_probability),
+            "career": row.career,
+        }
+        for row, names in zip(results.itertuples(index=False), courses.itertuples(index=False))
+    ]
+
+
+def score_job(recommender, job_id: int):
+    """Scores one claimed job to the end, recording the outcome on its row."""
+    db = SessionLocal()
+    try:
+        job = db.get(models.CohortJob, job_id)
+        logger.info("Starting cohort job %d (%s, about %d rows)...", job_id, job.filename, job.rows_total)
+        try:
+            _process(db, job, _CohortScorer(recommender))
+        except Exception as e:
+            logger.exception("Cohort job %d failed: %s", job_id, e)
+            db.rollback()
+            job.status, job.error = "failed", str(e)
+        job.finished_at = datetime.utcnow()
+        db.commit()
+        if os.path.exists(job.input_path):
+            os.remove(job.input_path)
+        logger.info("Cohort job %d %s: %d rows scored, %d invalid.", job_id, job.status, job.rows_scored, job.rows_invalid)
+    finally:
+        db.close()
+
+
+def _process(db: Session, job: models.CohortJob, scorer: _CohortScorer):
+    job.course_model, job.model_version = scorer.course_model_key, scorer.model_version
+    db.commit()
+    names = None
+    with pd.read_csv(job.input_path, dtype=str, keep_default_na=False, encoding="utf-8-sig", chunksize=COHORT_CHUNK_ROWS) as reader:
+        for chunk in reader:
+            db.refresh(job, ["cancel_requested"])
+            if job.cancel_requested:
+                job.status, job.error = "cancelled", "cancelled on request"
+                return
+            if names is None:
+                names = column_names(chunk.columns, scorer.subjects)
+            # Short rows leave NaN in the missing cells
+            results = scorer.score_chunk(chunk.fillna("").rename(columns=names), job.rows_processed)
+            results.to_csv(job.result_path, mode="a" if job.rows_processed else "w", header=not job.rows_processed, index=False)
+            db.execute(insert(models.CohortResult), _result_records(job.id, results))
+            scored = int((results["status"] == "scored").sum())
+            job.rows_processed += len(results)
+            job.rows_scored += scored
+            job.rows_invalid += len(results) - scored
+            db.commit()
+    if not job.rows_processed:
+        # A header without rows still gets a results file
+        pd.DataFrame(columns=RESULT_COLUMNS).to_csv(job.result_path, index=False)
+    job.rows_total = job.rows_processed
+    job.status = "succeeded"
+
+
+class CohortJobRunner:
+    def __init__(self, command=SCORE_COMMAND, cwd: str = "."):
+        self.command = list(command)
+        self.cwd = cwd  # The app package is in the backend directory
+
+    # --- Database access, run on worker threads ---
+
+    def _claim_next(self) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            while True:
+                job_id = db.query(models.CohortJob.id).filter(models.CohortJob.status == "queued").order_by(models.CohortJob.id).limit(1).scalar()
+                if job_id is None:
+                    return None
+                # Only if it is still queued: a cancel request may have come in since the read
+                claimed = db.query(models.CohortJob).filter(models.CohortJob.id == job_id, models.CohortJob.status == "queued").update(
+                    {"status": "running", "started_at": datetime.utcnow()}, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return job_id
+        finally:
+            db.close()
+
+    def _recover(self):
+        """Fails the jobs a previous server process left behind."""
+        db = SessionLocal()
+        try:
+            db.query(models.CohortJob).filter(models.CohortJob.status == "running").update({
+                "status": "failed", "finished_at": datetime.utcnow(),
+                "error": "interrupted: the server stopped during the job",
+            })
+            db.commit()
+        finally:
+            db.close()
+
+    def _finish(self, job_id: int, error: str):
+        """Records the scoring process's outcome; error is used if it left the job running."""
+        db = SessionLocal()
+        try:
+            job = db.get(models.CohortJob, job_id)
+            if job.status == "running":
+                job.status, job.error, job.finished_at = "failed", error, datetime.utcnow()
+                db.commit()
+                if os.path.exists(job.input_path):
+                    os.remove(job.input_path)
+                logger.error("Cohort job %d failed: %s", job_id, error)
+            COHORT_ROWS.labels(status="scored").inc(job.rows_scored)
+            COHORT_ROWS.labels(status="invalid").inc(job.rows_invalid)
+        finally:
+            db.close()
+
+    # --- Running jobs ---
+
+    async def run_forever(self):
+        await asyncio.to_thread(self._recover)
+        while True:
+            try:
+                job_id = await asyncio.to_thread(self._claim_next)
+            except Exception as e:
+                logger.exception("Error reading the cohort job queue: %s", e)
+                job_id = None
+            if job_id is None:
+                await asyncio.sleep(COHORT_POLL_SECONDS)
+                continue
+            await self.run_job(job_id)
+
+    async def _stop(self, process) -> int:
+        for stop in (process.terminate, process.kill):
+            try:
+                stop()
+            except ProcessLookupError:
+                break
+            try:
+                return await asyncio.wait_for(process.wait(), COHORT_KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        return await process.wait()
+
+    async def run_job(self, job_id: int):
+        try:
+            process = await asyncio.create_subprocess_exec(*self.command, str(job_id), cwd=self.cwd)
+        except OSError as e:
+            await asyncio.to_thread(self._finish, job_id, f"could not start the scoring process: {e}")
+            return
+        try:
+            exit_code = await process.wait()
+        except asyncio.CancelledError:
+            # The server is shutting down: do not leave the scoring process running unsupervised
+            await self._stop(process)
+            await asyncio.to_thread(self._finish, job_id, "interrupted: the server stopped during the job")
+            raise
+        await asyncio.to_thread(self._finish, job_id, f"the scoring process exited with code {exit_code}")
+
+
+def main(job_id: int):
+    setup_logging()
+    score_job(Recommender(**DEFAULT_PATHS), job_id)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]))
@@ -0,0 +1,85 @@
+"""Content-similarity search over a catalog (courses or careers).
+
+Each catalog row is represented by a sparse vector: TF-IDF over its free text (name,
+description, ...) stacked with TF-IDF over its comma-separated skill tags, which are kept
+as whole phrases ("problem solving") and weighted up. Rows are L2-normalised, so the dot
+product with a normalised query is the cosine similarity.
+
+The matrix is stored column-major (CSC). A query only has a handful of non-zero terms, so
+scoring reads just those terms' columns (effectively posting lists) instead of the whole
+matrix, and top-k selection uses argpartition rather than a full sort.
+"""
+import numpy as np
+import scipy.sparse as sp
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# Skill tags are more specific than free text; weight them up relative to the text terms
+TAG_WEIGHT = 2.0
+
+
+def split_tags(value) -> list:
+    """'Problem Solving, mathematics' -> ['problem solving', 'mathematics']"""
+    tags = (tag.strip().lower() for tag in str(value).split(','))
+    return [tag for tag in tags if tag and tag != 'n/a']
+
+
+def frame_texts(df, text_columns, tag_column=None):
+    """(texts, tags) of each row: the text columns joined with spaces, and the tag column (None without one)."""
+    texts = df[text_columns[0]].astype(str)
+    for column in text_columns[1:]:
+        texts = texts + " " + df[column].astype(str)
+    tags = df[tag_column].astype(str).tolist() if tag_column else None
+    return texts.tolist(), tags
+
+
+class ContentIndex:
+    def __init__(self, texts, tags=None, tag_weight: float = TAG_WEIGHT):
+        self.tag_weight = tag_weight
+        self.text_vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True, dtype=np.float32)
+        matrices = [self.text_vectorizer.fit_transform(texts)]
+        # Without tags the index is text only (e.g. matching names)
+        self.tag_vectorizer = None
+        if tags is not None:
+            self.tag_vectorizer = TfidfVectorizer(analyzer=split_tags, dtype=np.float32)
+            matrices.append(self.tag_vectorizer.fit_transform(tags) * tag_weight)
+        self.matrix = normalize(sp.hstack(matrices, format="csr")).tocsc()
+        self.size = self.matrix.shape[0]
+
+    @classmethod
+    def from_frame(cls, df, text_columns, tag_column=None, tag_weight: float = TAG_WEIGHT):
+        texts, tags = frame_texts(df, text_columns, tag_column)
+        return cls(texts, tags, tag_weight)
+
+    def query(self, text: str = "", tags=()) -> sp.csr_matrix:
+        """Builds a normalised query vector from free text and skill tags."""
+        vectors = [self.text_vectorizer.transform([text])]
+        if self.tag_vectorizer is not None:
+            vectors.append(self.tag_vectorizer.transform([", ".join(tags)]) * self.tag_weight)
+        return normalize(sp.hstack(vectors, format="csr"))
+
+    def embed(self, texts, tags=None) -> sp.csr_matrix:
+        """Vectors of catalog rows, as the index matrix holds them; works without the matrix (see ann_index)."""
+        matrices = [self.text_vectorizer.transform(texts)]
+        if self.tag_vectorizer is not None:
+            matrices.append(self.tag_vectorizer.transform(tags) * self.tag_weight)
+        return normalize(sp.hstack(matrices, format="csr"))
+
+    def scores(self, query: sp.csr_matrix) -> np.ndarray:
+        """Cosine similarity of every row to the query."""
+        if query.nnz == 0:
+            return np.zeros(self.size, dtype=np.float32)
+        return np.asarray(self.matrix[:, query.indices] @ query.data).ravel()
+
+    def top_k(self, query: sp.csr_matrix, k: int, exclude=()):
+        """Returns (row positions, scores) of the k most similar rows, best first, skipping the `exclude` positions."""
+        scores = self.scores(query)
+        if len(exclude):
+            scores[np.asarray(exclude, dtype=np.intp)] = -np.inf
+        k = min(k, self.size)
+        if k <= 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=scores.dtype)
+        candidates = np.argpartition(scores, self.size - k)[self.size - k:] if k < self.size else np.arange(self.size)
+        order = candidates[np.argsort(scores[candidates])[::-1]]
+        order = order[np.isfinite(scores[order])]
+        return order, scores[order]
@@ -0,0 +1,76 @@
+"""Weighted ensemble of the course pipelines.
+
+train.py fits the same preprocessor definition on the same data for every course pipeline, so the
+features are computed once with the first pipeline's preprocessor and handed to each classifier.
+The classifiers are scored concurrently on a small thread pool (the tree and SVM libraries release
+the GIL while predicting), so an ensemble prediction costs roughly the slowest single model rather
+than the sum of all three.
+
+The ensemble looks like a pipeline to its callers: it has predict_proba() and classes_.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+COURSE_ENSEMBLE_THREADS = int(os.getenv("COURSE_ENSEMBLE_THREADS", 2))
+# Metric from model_metrics.json used to weight each model
+COURSE_ENSEMBLE_WEIGHT_METRIC = os.getenv("COURSE_ENSEMBLE_WEIGHT_METRIC", "accuracy")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    # Created on first use, so a gunicorn master never forks with live threads
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=COURSE_ENSEMBLE_THREADS, thread_name_prefix="ensemble-scoring")
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+def metric_weights(metrics: dict, names, metric: str = COURSE_ENSEMBLE_WEIGHT_METRIC) -> dict:
+    """Returns {model: weight} from model_metrics.json, normalised to sum to 1 (equal weights if none are known)."""
+    raw = {name: max(float(metrics.get(name, {}).get(metric, 0) or 0), 0.0) for name in names}
+    total = sum(raw.values())
+    if total <= 0:
+        return {name: 1.0 / len(raw) for name in raw}
+    return {name: value / total for name, value in raw.items()}
+
+
+class CourseEnsemble:
+    def __init__(self, pipelines: dict, weights: dict):
+        self.pipelines = dict(pipelines)
+        self.weights = {name: weights.get(name, 0.0) for name in self.pipelines}
+        self.preprocessor = next(iter(self.pipelines.values()))[:-1]
+        self.classifiers = {name: pipeline[-1] for name, pipeline in self.pipelines.items()}
+        # Union of the classes, with each model's probability columns mapped into it
+        self.classes_ = np.unique(np.concatenate([pipeline.classes_ for pipeline in self.pipelines.values()]))
+        self._columns = {name: np.searchsorted(self.classes_, pipeline.classes_) for name, pipeline in self.pipelines.items()}
+
+    def predict_proba(self, frame) -> np.ndarray:
+        return self.predict_proba_features(self.preprocessor.transform(frame))
+
+    def predict_proba_features(self, features) -> np.ndarray:
+        """Blends the classifiers' probabilities for already preprocessed rows."""
+        active = [(name, classifier) for name, classifier in self.classifiers.items() if self.weights[name] > 0]
+        # The first model is scored in the calling thread while the pool handles the rest
+        executor = _get_executor()
+        futures = {name: executor.submit(classifier.predict_proba, features) for name, classifier in active[1:]}
+        name, classifier = active[0]
+        blended = np.zeros((features.shape[0], len(self.classes_)))
+        blended[:, self._columns[name]] += self.weights[name] * classifier.predict_proba(features)
+        for name, future in futures.items():
+            blended[:, self._columns[name]] += self.weights[name] * future.result()
+        return blended
@@ -0,0 +1,154 @@
+"""Per-user feature store.
+
+The featurized course and career vectors of each user's last submitted profile are kept in
+the user_feature_vectors table, keyed by model version (the fitted preprocessors differ
+between training runs). When the user submits again, the new profile is compared with the
+stored one and only the vector entries of the changed fields are rewritten: grade points,
+interest and skill indicator bits, scaled aptitude scores and P-values. Scoring then starts
+from the patched vectors instead of rebuilding DataFrames and re-running the preprocessors.
+
+Set FEATURE_STORE_ENABLED=false to always featurize from scratch.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from . import models, telemetry
+
+logger = logging.getLogger(__name__)
+
+FEATURE_STORE_ENABLED = os.getenv("FEATURE_STORE_ENABLED", "true").lower() not in ("0", "false", "no")
+
+# The preprocessors emit float64; storing anything narrower could move a value across a tree split
+VECTOR_DTYPE = np.float64
+
+FEATURE_STORE_LOOKUPS = telemetry.counter(
+    "feature_store_lookups_total",
+    "Feature store lookups by outcome (miss, unchanged, patched).",
+    labelnames=("result",),
+)
+_STAGE_FEATURE_STORE = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="feature_store")
+
+
+def student_profile(student) -> dict:
+    """The Student fields the feature vectors are built from."""
+    return student.model_dump(exclude={"preferred_careers"})
+
+
+class FeatureLayout:
+    """Where each Student field lands in the course and career feature vectors of one model version."""
+
+    def __init__(self, course_preprocessor, career_preprocessor, grade_points, aptitude_fields, p_value_mapping):
+        self.grade_points = grade_points
+        self.p_value_mapping = p_value_mapping
+
+        course_transformers = {name: (transformer, columns) for name, transformer, columns in course_preprocessor.transformers_}
+        course_slices = course_preprocessor.output_indices_
+        grade_start = course_slices["grades"].start
+        self.grade_index = {subject: grade_start + i for i, subject in enumerate(course_transformers["grades"][1])}
+        self.interest_index = self._label_index(course_transformers["interests_bin"][0], course_slices["interests_bin"])
+        self.skill_index = self._label_index(course_transformers["skills_bin"][0], course_slices["skills_bin"])
+
+        career_transformers = {name: (transformer, columns) for name, transformer, columns in career_preprocessor.transformers_}
+        career_slices = career_preprocessor.output_indices_
+        scaler, numerical_columns = career_transformers["numerical"]
+        numerical_start = career_slices["numerical"].start
+        self.aptitude_index = {}
+        for i, column in enumerate(numerical_columns):
+            mean = scaler.mean_[i] if scaler.with_mean else 0.0
+            scale = scaler.scale_[i] if scaler.with_std else 1.0
+            self.aptitude_index[aptitude_fields[column]] = (numerical_start + i, mean, scale)
+        ordinal_start = career_slices["ordinal"].start
+        self.p_value_index = {column.lower(): ordinal_start + i for i, column in enumerate(career_transformers["ordinal"][1])}
+
+    @staticmethod
+    def _label_index(wrapper, columns: slice) -> dict:
+        return {label: columns.start + i for i, label in enumerate(wrapper.mlb.classes_)}
+
+    def _grade_value(self, grades: dict, subject: str) -> float:
+        return self.grade_points.get(grades.get(subject, 'E').upper(), 1)
+
+    def patch(self, old: dict, new: dict, course_vector: np.ndarray, career_vector: np.ndarray) -> int:
+        """Rewrites the entries of the fields that differ between two profiles; returns how many changed."""
+        changed = 0
+        if old["grades"] != new["grades"]:
+            for subject, index in self.grade_index.items():
+                points = self._grade_value(new["grades"], subject)
+                if course_vector[index] != points:
+                    course_vector[index] = points
+                    changed += 1
+        for field, label_index in (("interests", self.interest_index), ("skills", self.skill_index)):
+            present = set(new[field])
+            for label in present.symmetric_difference(old[field]):
+                index = label_index.get(label)
+                if index is not None:
+                    # Labels unseen in training have no column, exactly as in MultiLabelBinarizer
+                    course_vector[index] = 1.0 if label in present else 0.0
+                    changed += 1
+        for field, (index, mean, scale) in self.aptitude_index.items():
+            if old[field] != new[field]:
+                career_vector[index] = (float(new[field]) - mean) / scale
+                changed += 1
+        for field, index in self.p_value_index.items():
+            if old[field] != new[field]:
+                career_vector[index] = self.p_value_mapping.get(new[field], 1)
+                changed += 1
+        return changed
+
+
+def _decode(blob: bytes) -> np.ndarray:
+    return np.frombuffer(blob, dtype=VECTOR_DTYPE).copy()
+
+
+def _encode(vector: np.ndarray) -> bytes:
+    return np.ascontiguousarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def load_features(db: Session, recommender, user_id: int, student, snapshot=None):
+    """Returns (course_features, career_features) as one-row arrays for this student, or (None, None)
+    when the store is off. The vectors are those of `snapshot`'s models (default: the current ones);
+    pass the same snapshot to recommend(). The user's stored vectors are created or patched in the
+    session; the caller commits them together with its own writes."""
+    snapshot = snapshot or recommender.snapshot
+    layout = snapshot.feature_layout
+    if not FEATURE_STORE_ENABLED or layout is None:
+        return None, None
+
+    with _STAGE_FEATURE_STORE.time():
+        model_version = snapshot.model_version
+        profile = student_profile(student)
+        row = (
+            db.query(models.UserFeatureVector)
+            .filter(models.UserFeatureVector.user_id == user_id, models.UserFeatureVector.model_version == model_version)
+            .order_by(models.UserFeatureVector.id.desc())
+            .first()
+        )
+        if row is None:
+            course_vector, career_vector = recommender.featurize(student, snapshot)
+            # Vectors built by older preprocessors cannot be patched; keep one row per user
+            db.query(models.UserFeatureVector).filter(models.UserFeatureVector.user_id == user_id).delete(synchronize_session=False)
+            db.add(models.UserFeatureVector(
+                user_id=user_id,
+                model_version=model_version,
+                profile=json.dumps(profile),
+                course_vector=_encode(course_vector),
+                career_vector=_encode(career_vector),
+            ))
+            result = "miss"
+        else:
+            stored_profile = json.loads(row.profile)
+            course_vector, career_vector = _decode(row.course_vector), _decode(row.career_vector)
+            if stored_profile == profile:
+                result = "unchanged"
+            else:
+                changed = layout.patch(stored_profile, profile, course_vector, career_vector)
+                row.profile = json.dumps(profile)
+                row.course_vector = _encode(course_vector)
+                row.career_vector = _encode(career_vector)
+                logger.debug("Patched %d feature(s) for user %s.", changed, user_id)
+                result = "patched"
+        FEATURE_STORE_LOOKUPS.labels(result=result).inc()
+    return course_vector.reshape(1, -1), career_vector.reshape(1, -1)
@@ -0,0 +1,187 @@
+"""Aggregated views of the training datasets for the Data Insights page.
+
+Each view is computed from the shipped CSVs with vectorized pandas/NumPy and rendered to
+compact JSON once per data version. The version is derived from the files' mtimes and sizes.
+Requests serve the cached bytes, and a changed file triggers one recomputation on the next
+request. A missing or unreadable file raises InsightsUnavailable (503) until it is fixed. Views:
+
+    grade-distribution    KCSE grade counts, overall and per subject (synthetic_student_data.csv)
+    subject-correlations  correlation of course grade points with each other and CGPA (cleaned_grades.csv)
+    cgpa-bins             CGPA histogram and summary (Grades.csv)
+    course-targets        students and mean grade points per target course (synthetic_student_data.csv)
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import orjson
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+INSIGHT_SOURCES = {
+    "students": "data/synthetic_student_data.csv",
+    "university_grades": "data/Grades.csv",
+    "university_points": "data/cleaned_grades.csv",
+    "courses": "data/courses.csv",
+}
+KCSE_GRADES = ['A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'E']
+# Same scale as the recommender's grade points
+KCSE_POINTS = np.arange(len(KCSE_GRADES), 0, -1, dtype=np.float32)
+CGPA_BIN_WIDTH = 0.25
+STUDENT_NON_GRADE_COLUMNS = ("interests", "skills", "target_course_id")
+
+
+def _round(values, digits: int = 3):
+    """Plain lists of rounded floats, with NaN (e.g. a constant column's correlation) as null."""
+    values = np.round(np.asarray(values, dtype=np.float64), digits)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _grade_codes(frame: pd.DataFrame) -> np.ndarray:
+    """(rows, subjects) positions in KCSE_GRADES; -1 for a missing or unknown grade."""
+    return np.column_stack([pd.Categorical(frame[column], categories=KCSE_GRADES).codes for column in frame.columns])
+
+
+def grade_distribution(students: pd.DataFrame) -> dict:
+    subjects = [column for column in students.columns if column not in STUDENT_NON_GRADE_COLUMNS]
+    codes = _grade_codes(students[subjects])
+    valid = codes >= 0
+    # One bincount over (subject, grade) pairs
+    pairs = (codes + np.arange(len(subjects)) * len(KCSE_GRADES))[valid]
+    by_subject = np.bincount(pairs, minlength=len(subjects) * len(KCSE_GRADES)).reshape(len(subjects), len(KCSE_GRADES))
+    return {
+        "grades": KCSE_GRADES,
+        "students": len(students),
+        "overall": by_subject.sum(axis=0).tolist(),
+        "students_per_subject": dict(zip(subjects, valid.sum(axis=0).tolist())),
+        "by_subject": dict(zip(subjects, by_subject.tolist())),
+    }
+
+
+def subject_correlations(points: pd.DataFrame) -> dict:
+    # Pairwise-complete Pearson correlations over every course and the CGPA
+    correlations = points.corr().to_numpy()
+    subjects = [column for column in points.columns if column != "CGPA"]
+    with_cgpa = {}
+    if "CGPA" in points.columns:
+        cgpa = points.columns.get_loc("CGPA")
+        with_cgpa = dict(zip(subjects, _round(np.delete(correlations[cgpa], cgpa))))
+    return {
+        "subjects": list(points.columns),
+        "matrix": [_round(row) for row in correlations],
+        "with_cgpa": with_cgpa,
+    }
+
+
+def cgpa_bins(grades: pd.DataFrame) -> dict:
+    cgpa = pd.to_numeric(grades["CGPA"], errors="coerce").dropna().to_numpy()
+    upper = max(4.0, float(np.ceil(cgpa.max() / CGPA_BIN_WIDTH) * CGPA_BIN_WIDTH)) if len(cgpa) else 4.0
+    counts, edges = np.histogram(cgpa, bins=np.arange(0.0, upper + CGPA_BIN_WIDTH / 2, CGPA_BIN_WIDTH))
+    quartiles = np.percentile(cgpa, [25, 50, 75]) if len(cgpa) else [np.nan] * 3
+    return {
+        "edges": _round(edges, 2),
+        "counts": counts.tolist(),
+        "students": int(len(cgpa)),
+        "mean": _round([cgpa.mean() if len(cgpa) else np.nan])[0],
+        "quartiles": _round(quartiles),
+    }
+
+
+def course_targets(students: pd.DataFrame, courses: pd.DataFrame) -> dict:
+    subjects = [column for column in students.columns if column not in STUDENT_NON_GRADE_COLUMNS]
+    codes = _grade_codes(students[subjects])
+    points = np.where(codes >= 0, KCSE_POINTS[codes], np.nan)
+    targets = students["target_course_id"].to_numpy()
+    ids, inverse, counts = np.unique(targets, return_inverse=True, return_counts=True)
+    # Per-course sums and counts of the grade points, in one pass each
+    sums = np.zeros((len(ids), len(subjects)))
+    np.add.at(sums, inverse, np.nan_to_num(points))
+    taken = np.zeros((len(ids), len(subjects)))
+    np.add.at(taken, inverse, ~np.isnan(points))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_points = sums / taken
+    names = dict(zip(courses["course_id"].tolist(), courses["course_name"].tolist()))
+    return {
+        "subjects": subjects,
+        "courses": [
+            {
+                "course_id": int(course_id),
+                "course_name": names.get(course_id),
+                "students": int(count),
+                "share": _round([count / len(targets)])[0],
+                "mean_points": _round(mean_points[i], 2),
+            }
+            for i, (course_id, count) in enumerate(zip(ids.tolist(), counts.tolist()))
+        ],
+    }
+
+
+def compute_views(sources: dict) -> dict:
+    students = pd.read_csv(sources["students"])
+    university_grades = pd.read_csv(sources["university_grades"], usecols=["CGPA"])
+    university_points = pd.read_csv(sources["university_points"], dtype="float32")
+    courses = pd.read_csv(sources["courses"], usecols=["course_id", "course_name"])
+    return {
+        "grade-distribution": grade_distribution(students),
+        "subject-correlations": subject_correlations(university_points),
+        "cgpa-bins": cgpa_bins(university_grades),
+        "course-targets": course_targets(students, courses),
+    }
+
+
+class InsightsUnavailable(Exception):
+    pass
+
+
+class InsightsCache:
+    def __init__(self, sources: dict = INSIGHT_SOURCES):
+        self.sources = dict(sources)
+        self._lock = threading.Lock()
+        # (data version, {view name: JSON bytes}), replaced as a whole
+        self._state = (None, {})
+        # (data version, error) of the last failed computation, so a bad file is not re-read on every request
+        self._failed = (None, None)
+        self.computations = 0
+
+    def data_version(self) -> str:
+        digest = hashlib.blake2b(digest_size=8)
+        for name, path in sorted(self.sources.items()):
+            try:
+                st = os.stat(path)
+            except OSError as e:
+                raise InsightsUnavailable(f"The {name} data file is unavailable: {e.strerror}")
+            digest.update(f"{name}:{st.st_mtime_ns}:{st.st_size};".encode())
+        return digest.hexdigest()
+
+    def _current(self):
+        version = self.data_version()
+        if version != self._state[0]:
+            with self._lock:
+                if version == self._failed[0]:
+                    raise InsightsUnavailable(self._failed[1])
+                if version != self._state[0]:
+                    start_time = time.perf_counter()
+                    try:
+                        views = compute_views(self.sources)
+                    except (OSError, ValueError, KeyError) as e:
+                        logger.exception("Could not compute the data insights for version %s: %s", version, e)
+                        self._failed = (version, f"The data insights could not be computed: {e}")
+                        raise InsightsUnavailable(self._failed[1])
+                    self._state = (version, {name: orjson.dumps({"version": version, **view}) for name, view in views.items()})
+                    self.computations += 1
+                    logger.info("Computed the data insights for version %s in %.3fs.", version, time.perf_counter() - start_time)
+        return self._state
+
+    def index(self) -> dict:
+        version, views = self._current()
+        return {"version": version, "views": sorted(views)}
+
+    def get(self, name: str):
+        """Returns (data version, JSON bytes) of a view; KeyError for an unknown view, InsightsUnavailable
+        when the data files cannot be read."""
+        version, views = self._current()
+        return version, views[name]
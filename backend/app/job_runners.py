@@ -0,0 +1,77 @@
+"""The process that runs the training and cohort jobs under gunicorn.
+
+The gunicorn master reaps its children with waitpid(-1). A train.py or `python -m app.cohorts`
+started from one of its threads could be reaped by the arbiter before asyncio read its exit
+status; asyncio then reports 255, and a job that had finished was recorded as failed.
+So the master starts this process instead (gunicorn.conf.py) and restarts it if it dies. The
+runners start their children from here, where nothing else waits for them.
+
+Without gunicorn, the app process runs the runners itself (see app.main's startup event).
+"""
+import asyncio
+import logging
+import signal
+import subprocess
+import sys
+from typing import Optional
+
+from . import cohorts, training_jobs
+from .logging_config import setup_logging
+
+# Named explicitly: run with python -m, __name__ is "__main__", outside the "app" logger
+logger = logging.getLogger("app.job_runners")
+
+RUNNER_COMMAND = [sys.executable, "-m", "app.job_runners"]
+
+# The job runner process of this gunicorn master; kept here because gunicorn re-reads its config file on SIGHUP
+_process: Optional[subprocess.Popen] = None
+
+
+def ensure_running():
+    """Starts the job runner process, or starts a new one if it exited."""
+    global _process
+    # The arbiter may have reaped it already; poll() then reports it as exited
+    if _process is not None and _process.poll() is None:
+        return
+    if _process is not None:
+        logger.error("The job runner process exited; starting a new one.")
+    _process = subprocess.Popen(RUNNER_COMMAND)
+
+
+def stop(timeout: float):
+    """Stops the job runner process, which stops the jobs in progress; they are recorded as interrupted."""
+    if _process is None or _process.poll() is not None:
+        return
+    _process.terminate()
+    try:
+        _process.wait(timeout)
+    except subprocess.TimeoutExpired:
+        _process.kill()
+
+
+async def run_forever(runners):
+    """Runs the runners until SIGTERM or SIGINT, or until one of them fails."""
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stopping.set)
+    tasks = [asyncio.create_task(runner.run_forever()) for runner in runners]
+    stop_requested = asyncio.create_task(stopping.wait())
+    await asyncio.wait([stop_requested, *tasks], return_when=asyncio.FIRST_COMPLETED)
+    # Stops the child of any job in progress; those jobs are recorded as interrupted
+    for task in [stop_requested, *tasks]:
+        task.cancel()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Job runner failed: %r", result)
+
+
+def main():
+    setup_logging()
+    logger.info("Job runner process started.")
+    asyncio.run(run_forever([training_jobs.TrainingJobRunner(), cohorts.CohortJobRunner()]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Asynchronous outbound email.
+
+Request handlers only put messages on an in-memory queue; a background task sends
+them in batches over a single reused SMTP connection, retrying failures with
+exponential backoff. Only temporary failures are retried: lost connections and 4xx
+replies. A 5xx reply is permanent and the message is dropped at once. smtplib is
+blocking, so all SMTP I/O happens on one dedicated thread that owns the connection.
+
+To try it locally against an aiosmtpd stand-in:
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_HOST=localhost SMTP_PORT=8025 SMTP_STARTTLS=false SMTP_USERNAME= uvicorn app.main:app
+"""
+import asyncio
+import logging
+import os
+import smtplib
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+logger = logging.getLogger(__name__)
+
+# --- Email Configuration (Replace with your actual details or environment variables) ---
+# You need to set these environment variables or replace them with your actual SMTP details.
+# Example for Gmail: SMTP_HOST='smtp.gmail.com', SMTP_PORT=587, SMTP_USERNAME='your_email@gmail.com', SMTP_PASSWORD='your_app_password'
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.example.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
+SMTP_USERNAME = os.getenv("SMTP_USERNAME", "your_email@example.com")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "your_email_password")
+SENDER_EMAIL = os.getenv("SENDER_EMAIL", "no-reply@example.com")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() not in ("0", "false", "no")
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 10))
+
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", 20))
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", 5))
+MAIL_RETRY_BASE_DELAY = float(os.getenv("MAIL_RETRY_BASE_DELAY", 2.0)) # Seconds; doubles on each attempt
+MAIL_IDLE_TIMEOUT = float(os.getenv("MAIL_IDLE_TIMEOUT", 30.0)) # Close the SMTP connection after this long without mail
+# -----------------------------------------------------------------------------------
+
+
+class QueuedEmail:
+    __slots__ = ("message", "attempts")
+
+    def __init__(self, message: EmailMessage):
+        self.message = message
+        self.attempts = 0
+
+
+def connection_lost(error: Exception) -> bool:
+    # SMTPException is itself an OSError: only the non-SMTP ones are socket errors
+    return isinstance(error, smtplib.SMTPServerDisconnected) or not isinstance(error, smtplib.SMTPException)
+
+
+def is_temporary(error: Exception) -> bool:
+    """Whether a failed send is worth retrying: connection problems and 4xx replies."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(400 <= code < 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    return connection_lost(error)
+
+
+class MailOutbox:
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, username=SMTP_USERNAME, password=SMTP_PASSWORD,
+                 sender=SENDER_EMAIL, use_starttls=SMTP_STARTTLS, batch_size=MAIL_BATCH_SIZE,
+                 max_retries=MAIL_MAX_RETRIES, retry_base_delay=MAIL_RETRY_BASE_DELAY,
+                 idle_timeout=MAIL_IDLE_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.use_starttls = use_starttls
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.idle_timeout = idle_timeout
+
+        self.sent_count = 0
+        self.failed_count = 0
+
+        self._queue = None
+        self._task = None
+        self._stopping = False
+        self._retries = {}  # Mail waiting out its backoff, with the handle of its timer
+        self._smtp = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="smtp-outbox")
+
+    def start(self):
+        """Starts the background sender. Must be called from a running event loop."""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """Gives queued mail, including mail waiting for a retry, a last chance to go out, then
+        stops the sender and closes the connection. Mail still unsent is logged."""
+        if self._task is None:
+            return
+        self._stopping = True
+        for item, timer in self._retries.items():
+            timer.cancel()
+            self._queue.put_nowait(item)
+        self._retries.clear()
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        while not self._queue.empty():
+            self._drop(self._queue.get_nowait(), "the outbox stopped before it was sent")
+        await asyncio.get_running_loop().run_in_executor(self._executor, self._close)
+
+    def enqueue(self, to_email: str, subject: str, body: str):
+        """Queues a plain-text email. Returns immediately; delivery happens in the background."""
+        msg = EmailMessage()
+        msg.set_content(body)
+        msg['Subject'] = subject
+        msg['From'] = self.sender
+        msg['To'] = to_email
+        self._queue.put_nowait(QueuedEmail(msg))
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                first = await asyncio.wait_for(self._queue.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                await loop.run_in_executor(self._executor, self._close)
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                failed = await loop.run_in_executor(self._executor, self._send_batch, batch)
+            except asyncio.CancelledError:
+                logger.warning("Mail outbox stopped while sending %d email(s); they may not have been delivered.", len(batch))
+                raise
+            except Exception as e:
+                logger.exception("Unexpected error in mail outbox: %s", e)
+                failed = batch
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            for item in failed:
+                self._schedule_retry(loop, item)
+
+    def _schedule_retry(self, loop, item: QueuedEmail):
+        item.attempts += 1
+        if self._stopping:
+            self._drop(item, "the outbox stopped before it could be retried")
+            return
+        if item.attempts > self.max_retries:
+            self._drop(item, f"giving up after {item.attempts} attempts")
+            return
+        delay = self.retry_base_delay * (2 ** (item.attempts - 1))
+        self._retries[item] = loop.call_later(delay, self._retry, item)
+
+    def _retry(self, item: QueuedEmail):
+        del self._retries[item]
+        self._queue.put_nowait(item)
+
+    def _drop(self, item: QueuedEmail, reason: str):
+        self.failed_count += 1
+        logger.error("Dropping email to %s: %s.", item.message['To'], reason)
+
+    # --- The methods below run on the SMTP thread ---
+
+    def _connect(self):
+        smtp = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        if self.use_starttls:
+            smtp.starttls()
+        if self.username:
+            smtp.login(self.username, self.password)
+        return smtp
+
+    def _close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            pass
+        self._smtp = None
+
+    def _ensure_connection(self):
+        # Reuse the open connection when the server still answers, otherwise reconnect
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close()
+        self._smtp = self._connect()
+        return self._smtp
+
+    def _send_batch(self, batch):
+        """Sends a batch; returns the mail to retry. Mail refused for good is dropped here."""
+        try:
+            smtp = self._ensure_connection()
+        except (smtplib.SMTPException, OSError) as e:
+            logger.warning("Could not connect to SMTP server %s:%s: %s", self.host, self.port, e)
+            if is_temporary(e):
+                return batch
+            for item in batch:
+                self._drop(item, f"the SMTP server refused the connection: {e}")
+            return []
+
+        failed = []
+        for position, item in enumerate(batch):
+            try:
+                smtp.send_message(item.message)
+                self.sent_count += 1
+                logger.info("Email sent successfully to %s", item.message['To'])
+            except (smtplib.SMTPException, OSError) as e:
+                if connection_lost(e):
+                    # The connection is gone: everything not yet sent goes back for a retry
+                    logger.warning("SMTP connection lost while sending to %s: %s", item.message['To'], e)
+                    self._close()
+                    failed.extend(batch[position:])
+                    break
+                if is_temporary(e):
+                    logger.warning("Failed to send email to %s, will retry: %s", item.message['To'], e)
+                    failed.append(item)
+                else:
+                    self._drop(item, f"refused by the SMTP server: {e}")
+        return failed
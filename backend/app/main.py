@@ -1,143 +1,208 @@
-from typing import Optional, List
-from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File
+from typing import Dict, Optional, List
+from fastapi import FastAPI, Depends, HTTPException, status, UploadFile, File, Request, Query
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse, FileResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
 import os
-import shutil
-import smtplib
-from email.message import EmailMessage
 import json
+import logging
 import asyncio
-import time
-import subprocess
+import threading
+import uuid
 
-from . import auth, models, schemas
+from . import auth, models, schemas, model_registry, mailer, uploads, maintenance, telemetry, ensemble, feature_store, what_if, response_json, single_flight, model_artifacts, training_jobs, insights, reports, cohorts
 from .database import SessionLocal, engine, get_db
-from .recommender import Recommender
+from .recommender import Recommender, DEFAULT_PATHS
 from .models import Student
+from .logging_config import setup_logging, RequestIdMiddleware, request_id_var
+
+setup_logging()
+logger = logging.getLogger(__name__)
 
 models.Base.metadata.create_all(bind=engine)
 
 app = FastAPI()
 
-# Global variable to store the last modification time of model files
-last_model_mtime = 0.0
-
-async def run_train_script_in_background():
-    """Runs the train.py script in a separate process."""
-    print("Starting background training script (train.py)...")
-    # Use subprocess.Popen to run train.py without blocking the main thread
-    # stdout and stderr are redirected to pipes to prevent blocking
-    process = subprocess.Popen(
-        ["python", "train.py"],
-        cwd=".", # train.py is in the current working directory (backend)
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
-    # You can read stdout/stderr if needed, but for a background task,
-    # it might be sufficient to just let it run.
-    # For debugging, you might want to log these.
-    stdout, stderr = process.communicate()
-    if process.returncode != 0:
-        print(f"Error running train.py: {stderr.decode()}")
-    else:
-        print(f"train.py completed successfully: {stdout.decode()}")
+# Set TRAIN_ON_STARTUP=false to serve the existing model files without retraining (load tests, local runs)
+TRAIN_ON_STARTUP = os.getenv("TRAIN_ON_STARTUP", "true").lower() not in ("0", "false", "no")
+
+# Training, the model watcher and the token purge run in one process only. Under gunicorn
+# (gunicorn.conf.py) the master runs them and sets this to false for the workers.
+RUN_BACKGROUND_TASKS = os.getenv("RUN_BACKGROUND_TASKS", "true").lower() not in ("0", "false", "no")
+# Longest a model watcher wait blocks before returning; reloads themselves are event-driven
+MODEL_WATCH_TIMEOUT_SECONDS = 1.0
+CATALOG_CHECK_INTERVAL_SECONDS = int(os.getenv("CATALOG_CHECK_INTERVAL_SECONDS", 5))
+# Held while the models or the catalog are swapped; gunicorn's master waits on it before forking a worker
+model_reload_lock = threading.Lock()
+
+# Metrics of the currently served models, refreshed only when a new training run is loaded
+metrics_cache = model_registry.LatestMetricsCache()
+
+# Outgoing email is queued and sent in the background so handlers never wait on SMTP
+outbox = mailer.MailOutbox()
+
+# Identical profiles submitted concurrently share one inference run (RECOMMEND_SINGLE_FLIGHT=false to disable)
+RECOMMEND_SINGLE_FLIGHT = os.getenv("RECOMMEND_SINGLE_FLIGHT", "true").lower() not in ("0", "false", "no")
+recommend_flights = single_flight.SingleFlight()
+
+# Writes /recommend bodies with cached JSON fragments of the catalog items
+recommendations_renderer = response_json.RecommendationsRenderer()
+
+# Aggregates of the training datasets for the Data Insights page, computed once per data version
+insights_cache = insights.InsightsCache()
+try:
+    # Before gunicorn forks, so the workers start with them
+    insights_cache.index()
+except insights.InsightsUnavailable as e:
+    logger.warning("Data insights unavailable: %s", e)
+
+# Rendered recommendation reports, by set, catalog version and format
+report_cache = reports.ReportCache()
+
+# --- Metrics exposed on /metrics ---
+_STAGE_DB_PERSIST = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="db_persist")
+telemetry.callback("model_metrics_cache_hits_total", "Model metrics snapshot cache hits.", lambda: metrics_cache.hits, kind="counter")
+telemetry.callback("model_metrics_cache_misses_total", "Model metrics snapshot cache misses.", lambda: metrics_cache.misses, kind="counter")
+telemetry.callback("password_reset_tokens_purged_total", "Expired password reset tokens deleted.", lambda: maintenance.token_purge_stats["rows_purged_total"], kind="counter")
+telemetry.callback("password_reset_token_purge_last_seconds", "Duration of the last expired-token purge.", lambda: maintenance.token_purge_stats["last_run_seconds"])
+telemetry.callback("mail_outbox_pending", "Emails waiting in the outbox.", lambda: outbox.pending())
+telemetry.callback("mail_outbox_sent_total", "Emails delivered by the outbox.", lambda: outbox.sent_count, kind="counter")
+telemetry.callback("mail_outbox_failed_total", "Emails dropped: refused by the server, out of retries or unsent at shutdown.", lambda: outbox.failed_count, kind="counter")
+telemetry.callback("response_fragment_cache_hits_total", "Cached JSON fragments reused in /recommend responses.", lambda: recommendations_renderer.hits, kind="counter")
+telemetry.callback("response_fragment_cache_misses_total", "JSON fragments encoded for /recommend responses.", lambda: recommendations_renderer.misses, kind="counter")
+telemetry.callback("recommend_single_flight_pending", "Recommendation computations in flight that identical requests can join.", lambda: recommend_flights.pending())
+telemetry.callback("insights_computations_total", "Times the data insights were computed (once per data version).", lambda: insights_cache.computations, kind="counter")
+telemetry.callback("report_cache_hits_total", "Recommendation reports served from the cache.", lambda: report_cache.hits, kind="counter")
+telemetry.callback("report_cache_misses_total", "Recommendation reports rendered.", lambda: report_cache.misses, kind="counter")
+telemetry.callback("catalog_version", "Version of the catalog being served (increments on each reload).", lambda: recommender.catalog.current.version)
+
+# Runs the queued train.py jobs; started only in the process that owns the background tasks
+training_runner = training_jobs.TrainingJobRunner()
+training_task = None
+
+def submit_startup_training():
+    db = SessionLocal()
+    try:
+        training_jobs.submit(db, requested_by="startup")
+    except training_jobs.TrainingQueueFull as e:
+        logger.warning("Skipping the startup training run: %s", e)
+    finally:
+        db.close()
+
+def reload_models():
+    with model_reload_lock:
+        # Recorded first: files that fail to load are retried only once they change again
+        model_watcher.mark_loaded()
+        recommender._load_models()
+        metrics_cache.invalidate()
+    telemetry.MODEL_RELOADS.inc()
+
+def reload_catalog_if_changed() -> bool:
+    """Loads and swaps in a new catalog version if a catalog file changed."""
+    with model_reload_lock:
+        return recommender.catalog.reload_if_changed()
+
+async def monitor_and_reload_catalog():
+    """Watches the catalog files; a changed catalog is rebuilt on a worker thread, off the event loop."""
+    while True:
+        await asyncio.sleep(CATALOG_CHECK_INTERVAL_SECONDS)
+        await asyncio.to_thread(reload_catalog_if_changed)
 
 async def monitor_and_reload_models():
-    """Monitors model files for changes and reloads them dynamically."""
-    global last_model_mtime
-    model_paths = [recommender.rf_model_path, recommender.xgb_model_path, recommender.svm_model_path]
-    
-    # Initialize last_model_mtime with the current modification time of the newest model
-    for path in model_paths:
-        if os.path.exists(path):
-            current_mtime = os.path.getmtime(path)
-            if current_mtime > last_model_mtime:
-                last_model_mtime = current_mtime
-
+    """Reloads the models once per published training run (see app/model_artifacts.py)."""
+    model_watcher.start()
     while True:
-        await asyncio.sleep(10)  # Check every 10 seconds
-        
-        updated = False
-        for path in model_paths:
-            if os.path.exists(path):
-                current_mtime = os.path.getmtime(path)
-                if current_mtime > last_model_mtime:
-                    print(f"Detected change in model file: {path}. Reloading models...")
-                    recommender._load_models()
-                    last_model_mtime = current_mtime
-                    updated = True
-                    break # Only need to reload once if any model file changes
-        
-        if updated:
-            print("Models reloaded successfully.")
+        if await asyncio.to_thread(model_watcher.wait, MODEL_WATCH_TIMEOUT_SECONDS):
+            logger.info("Detected new model files. Reloading models...")
+            try:
+                await asyncio.to_thread(reload_models)
+            except Exception as e:
+                logger.exception("Error reloading models; keeping the current ones: %s", e)
+            else:
+                logger.info("Models reloaded successfully (version %s).", recommender.snapshot.model_version)
 
 @app.on_event("startup")
 async def startup_event():
-    # Run train.py in the background once on startup
-    asyncio.create_task(run_train_script_in_background())
-    # Start monitoring model files for changes
-    asyncio.create_task(monitor_and_reload_models())
+    if RUN_BACKGROUND_TASKS:
+        # Run train.py jobs, starting with one at startup
+        global training_task
+        training_task = asyncio.create_task(training_runner.run_forever())
+        if TRAIN_ON_STARTUP:
+            await asyncio.to_thread(submit_startup_training)
+        # Score uploaded cohort CSVs
+        global cohort_task
+        cohort_task = asyncio.create_task(cohort_runner.run_forever())
+        # Reload the models when train.py publishes a new run
+        asyncio.create_task(monitor_and_reload_models())
+        asyncio.create_task(monitor_and_reload_catalog())
+        # Periodically delete expired password reset tokens
+        asyncio.create_task(maintenance.purge_expired_tokens_periodically())
+    # Start the background email sender
+    outbox.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await outbox.stop()
+    model_watcher.stop()
+    if training_task is not None:
+        # Stops a run in progress; it is recorded as interrupted
+        training_task.cancel()
+        await asyncio.gather(training_task, return_exceptions=True)
+    if cohort_task is not None:
+        # Stops the scoring process of the job in progress; it is recorded as interrupted
+        cohort_task.cancel()
+        await asyncio.gather(cohort_task, return_exceptions=True)
+    uploads.shutdown_pool()
+    reports.shutdown_pool()
+    recommender.serving_policy.shutdown()
+    ensemble.shutdown_executor()
 
 # Create a directory for static files if it doesn't exist
 STATIC_DIR = "static"
 if not os.path.exists(STATIC_DIR):
     os.makedirs(STATIC_DIR)
 
+UPLOAD_DIR = os.path.join(STATIC_DIR, "uploads")
+
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
 origins = [
     "http://localhost:3000",
 ]
 
+# Caps the upload request bodies before the multipart parser spools them to disk
+app.add_middleware(uploads.BodySizeLimitMiddleware, limits={
+    "/upload-profile-image/": uploads.MAX_UPLOAD_BYTES + uploads.MULTIPART_OVERHEAD_BYTES,
+    "/admin/cohorts/": cohorts.COHORT_MAX_UPLOAD_BYTES + uploads.MULTIPART_OVERHEAD_BYTES,
+})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
-recommender = Recommender(
-    courses_path="data/final_courses_cleaned.csv",
-    careers_path="data/careers.csv",
-    rf_model_path="app/random_forest_course_model.joblib", # Updated path
-    xgb_model_path="app/xgboost_course_model.joblib", # Updated path
-    svm_model_path="app/svm_course_model.joblib", # New path
-    metrics_path="app/model_metrics.json",
-    career_model_path="app/career_recommendation_model.joblib", # New path
-    career_label_encoder_path="app/career_label_encoder.joblib" # New path
-)
+# Tags every request (and its log lines and saved recommendations) with an ID
+app.add_middleware(RequestIdMiddleware)
 
-# --- Email Configuration (Replace with your actual details or environment variables) ---
-# You need to set these environment variables or replace them with your actual SMTP details.
-# Example for Gmail: SMTP_HOST='smtp.gmail.com', SMTP_PORT=587, SMTP_USERNAME='your_email@gmail.com', SMTP_PASSWORD='your_app_password'
-SMTP_HOST = os.getenv("SMTP_HOST", "smtp.example.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", 587))
-SMTP_USERNAME = os.getenv("SMTP_USERNAME", "your_email@example.com")
-SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "your_email_password")
-SENDER_EMAIL = os.getenv("SENDER_EMAIL", "no-reply@example.com")
-
-def send_email(to_email: str, subject: str, body: str):
-    msg = EmailMessage()
-    msg.set_content(body)
-    msg['Subject'] = subject
-    msg['From'] = SENDER_EMAIL
-    msg['To'] = to_email
+recommender = Recommender(**DEFAULT_PATHS)
 
-    try:
-        with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as smtp:
-            smtp.starttls()
-            smtp.login(SMTP_USERNAME, SMTP_PASSWORD)
-            smtp.send_message(msg)
-        print(f"Email sent successfully to {to_email}")
-    except Exception as e:
-        print(f"Failed to send email to {to_email}: {e}")
-        # In a real application, you might log this error or raise an HTTPException
-# -----------------------------------------------------------------------------------
+# Scores uploaded cohort CSVs in a child process per job; like the training runner, started only in the process that owns the background tasks
+cohort_runner = cohorts.CohortJobRunner()
+cohort_task = None
+
+# Watches every artifact the Recommender loads, plus the manifest train.py writes last
+model_watcher = model_artifacts.ArtifactWatcher([
+    recommender.rf_model_path, recommender.xgb_model_path, recommender.svm_model_path,
+    recommender.career_model_path, recommender.career_label_encoder_path, recommender.metrics_path,
+])
 
 @app.post("/token", response_model=schemas.Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
@@ -178,15 +243,21 @@ async def update_users_me(user_update: schemas.UserUpdate, db: Session = Depends
 
 @app.post("/upload-profile-image/")
 async def upload_profile_image(file: UploadFile = File(...)):
+    # The request body is capped by BodySizeLimitMiddleware before it is parsed; this caps the file itself
     try:
-        file_location = f"{STATIC_DIR}/{file.filename}"
-        with open(file_location, "wb+") as file_object:
-            shutil.copyfileobj(file.file, file_object)
+        stored_name, thumbnails = await uploads.store_image(file, UPLOAD_DIR)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File is too large")
+    except (ValueError, uploads.InvalidImage):
+        raise HTTPException(status_code=400, detail="File must be a JPEG, PNG, GIF or WebP image")
     except Exception:
         raise HTTPException(status_code=500, detail="Could not upload file")
     finally:
-        file.file.close()
-    return {"url": f"http://localhost:8000/static/{file.filename}"}
+        await file.close()
+    return {
+        "url": f"http://localhost:8000/static/uploads/{stored_name}",
+        "thumbnails": {str(size): f"http://localhost:8000/static/uploads/{name}" for size, name in zip(uploads.THUMBNAIL_SIZES, thumbnails)},
+    }
 
 @app.post("/forgot-password/")
 async def forgot_password(request: schemas.ForgotPasswordRequest, db: Session = Depends(get_db)):
@@ -200,8 +271,8 @@ async def forgot_password(request: schemas.ForgotPasswordRequest, db: Session =
     reset_link = f"http://localhost:3000/reset-password/{token}"
     email_body = f"Hello {user.username},\n\nTo reset your password, please click on the following link: {reset_link}\n\nThis link will expire in {auth.PASSWORD_RESET_TOKEN_EXPIRE_MINUTES} minutes.\n\nIf you did not request a password reset, please ignore this email.\n\nBest regards,\nYour App Team"
     
-    # Send the actual email
-    send_email(to_email=user.email, subject="Password Reset Request", body=email_body)
+    # Queue the email; the outbox delivers it in the background
+    outbox.enqueue(to_email=user.email, subject="Password Reset Request", body=email_body)
     
     return {"message": "If an account with that email exists, a password reset token has been sent."}
 
@@ -228,37 +299,61 @@ def get_recommendations(student: Student, db: Session = Depends(get_db), current
             detail="The number of subjects cannot exceed 7."
         )
 
-    recommendations = recommender.recommend(student)
+    # One set of models for the features, the cache key and the scoring, even if a reload lands meanwhile
+    snapshot = recommender.snapshot
+    # Reuses (and patches) this user's stored feature vectors when the model version matches
+    course_features, career_features = feature_store.load_features(db, recommender, current_user.id, student, snapshot)
+    def compute():
+        return recommender.recommend(student, user_id=current_user.id, course_features=course_features, career_features=career_features, snapshot=snapshot)
+
+    if RECOMMEND_SINGLE_FLIGHT:
+        # The result depends on the profile, the loaded models and catalog, and the course model serving this user
+        course_model_key = recommender.serving_policy.choose(current_user.id, snapshot.course_pipelines, snapshot.chosen_course_model_key)
+        key = single_flight.profile_key(student, snapshot.model_version, recommender.catalog.current.version, course_model_key)
+        shared, _ = recommend_flights.do(key, compute)
+        # Every caller persists and numbers its own copy of the items
+        recommendations = {**shared, "courses": [dict(item) for item in shared["courses"]], "careers": [dict(item) for item in shared["careers"]]}
+    else:
+        recommendations = compute()
+
+    with _STAGE_DB_PERSIST.time():
+        saved_recommendations = []
+        # Groups this call's rows for reports; never the client-supplied request ID
+        set_id = uuid.uuid4().hex
+
+        # Save courses recommendations to the database
+        for course_rec in recommendations['courses']:
+            db_recommendation = models.Recommendation(
+                user_id=current_user.id,
+                course_name=course_rec['name'],
+                career_name=None, # This is a course recommendation, so career_name is None
+                course_type=course_rec['type'],
+                request_id=request_id_var.get(),
+                course_model=recommendations['course_model'],
+                set_id=set_id
+            )
+            db.add(db_recommendation)
+            saved_recommendations.append(db_recommendation)
+        
+        # Save career recommendations to the database
+        for career_rec in recommendations['careers']:
+            db_recommendation = models.Recommendation(
+                user_id=current_user.id,
+                course_name=None, # This is a career recommendation, so course_name is None
+                career_name=career_rec['name'],
+                request_id=request_id_var.get(),
+                set_id=set_id
+            )
+            db.add(db_recommendation)
+            saved_recommendations.append(db_recommendation)
+        
+        db.commit()
 
-    saved_recommendations = []
+        # Refresh all saved recommendations to get their IDs
+        for rec in saved_recommendations:
+            db.refresh(rec)
+    logger.info("Saved %d recommendations for user %s.", len(saved_recommendations), current_user.id)
 
-    # Save courses recommendations to the database
-    for course_rec in recommendations['courses']:
-        db_recommendation = models.Recommendation(
-            user_id=current_user.id,
-            course_name=course_rec['name'],
-            career_name=None, # This is a course recommendation, so career_name is None
-            course_type=course_rec['type']
-        )
-        db.add(db_recommendation)
-        saved_recommendations.append(db_recommendation)
-    
-    # Save career recommendations to the database
-    for career_rec in recommendations['careers']:
-        db_recommendation = models.Recommendation(
-            user_id=current_user.id,
-            course_name=None, # This is a career recommendation, so course_name is None
-            career_name=career_rec['name']
-        )
-        db.add(db_recommendation)
-        saved_recommendations.append(db_recommendation)
-    
-    db.commit()
-
-    # Refresh all saved recommendations to get their IDs
-    for rec in saved_recommendations:
-        db.refresh(rec)
-    
     # Update the recommendations object with the IDs
     for i, course_rec in enumerate(recommendations['courses']):
         course_rec['id'] = saved_recommendations[i].id
@@ -267,8 +362,24 @@ def get_recommendations(student: Student, db: Session = Depends(get_db), current
         # Adjust index for careers as they come after courses in saved_recommendations
         career_rec['id'] = saved_recommendations[len(recommendations['courses']) + i].id
 
+    if response_json.FAST_RECOMMEND_RESPONSES:
+        # Same bytes as the response_model serialization, without validating and encoding every field
+        return Response(recommendations_renderer.render(recommendations, recommender.catalog.current.version), media_type="application/json")
     return recommendations
 
+@app.post("/recommend/what-if", response_model=schemas.WhatIfResponse)
+def get_what_if(request: schemas.WhatIfRequest, current_user: schemas.User = Depends(auth.get_current_user)):
+    # Hypotheticals are scored in one batch and never saved as recommendations
+    if len(request.student.grades) > 7:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="The number of subjects cannot exceed 7."
+        )
+    try:
+        return what_if.run_what_if(recommender, request, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
 @app.post("/ratings/")
 def create_rating(
     rating_data: schemas.RatingCreate,
@@ -296,22 +407,104 @@ def get_all_ratings(db: Session = Depends(get_db)):
     ratings = db.query(models.Rating).all()
     return ratings
 
-@app.get("/model-metrics/")
+@app.get("/model-metrics/", response_model=Dict[str, schemas.ModelMetrics])
 def get_model_metrics(db: Session = Depends(get_db)):
-    metrics = db.query(models.ModelMetric).all()
+    metrics = metrics_cache.get(db, recommender.snapshot.metrics.get("model_version"))
     if not metrics:
         raise HTTPException(status_code=404, detail="Model metrics not found in database.")
+    return metrics
+
+@app.get("/model-metrics/history/", response_model=List[schemas.ModelMetricsRun])
+def get_model_metrics_history(model_name: Optional[str] = None, limit: int = 50, db: Session = Depends(get_db)):
+    return model_registry.get_metrics_history(db, model_name=model_name, limit=max(1, min(limit, 500)))
+
+@app.get("/model-serving/stats/")
+def get_model_serving_stats():
+    # Live per-model latency and shadow agreement for this process
+    return {"default_model": recommender.snapshot.chosen_course_model_key, **recommender.serving_policy.stats()}
+
+@app.get("/catalog/")
+def get_catalog_status():
+    # Version and size of the catalog this process is serving
+    return recommender.catalog.current.summary()
+
+def check_report_format(report_format: str):
+    if report_format not in reports.REPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown report format '{report_format}'; use one of: {', '.join(reports.REPORT_FORMATS)}")
+
+@app.get("/reports/")
+def list_reports(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user)):
+    # The recommendation sets of the current user that a report can be rendered for
+    return reports.list_sets(db, [current_user.id])
+
+@app.get("/reports/school/")
+async def download_school_reports(
+    school: Optional[str] = None,
+    report_format: str = Query("html", alias="format"),
+    db: Session = Depends(get_db),
+    admin: models.User = Depends(auth.get_current_admin_user),
+):
+    """Every report of the students of a school (by default the administrator's own) as one streamed zip."""
+    check_report_format(report_format)
+    school = school or admin.school_attended
+    if not school:
+        raise HTTPException(status_code=400, detail="No school given and none on your profile")
+    user_ids = [user_id for (user_id,) in db.query(models.User.id).filter(models.User.school_attended == school)]
+    sets = reports.list_sets(db, user_ids) if user_ids else []
+    if not sets:
+        raise HTTPException(status_code=404, detail=f"No recommendations found for students of {school}")
+    catalog = recommender.catalog.current
+
+    async def collected():
+        for recommendation_set in sets:
+            yield await run_in_threadpool(reports.load_report, recommendation_set["set_id"], recommendation_set["user_id"], catalog)
+
+    return StreamingResponse(
+        reports.iter_reports_zip(collected(), report_format, report_cache),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="reports-{reports.safe_filename(school)}.zip"'},
+    )
 
-    # Format the metrics into the expected JSON structure
-    formatted_metrics = {}
-    for metric in metrics:
-        formatted_metrics[metric.model_name] = {
-            "accuracy": metric.accuracy,
-            "precision": metric.precision,
-            "recall": metric.recall,
-            "f1_score": metric.f1_score
-        }
-    return formatted_metrics
+@app.get("/reports/{set_id}")
+async def get_report(
+    set_id: str,
+    report_format: str = Query("html", alias="format"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user),
+):
+    check_report_format(report_format)
+    # Users see their own sets; administrators any set. Other users' sets are reported as missing, not forbidden
+    owner_id = current_user.id
+    if current_user.is_admin:
+        owner_id = await run_in_threadpool(reports.set_owner, db, set_id)
+    try:
+        report = await run_in_threadpool(reports.collect_report, db, set_id, owner_id, recommender.catalog.current)
+    except reports.ReportNotFound:
+        raise HTTPException(status_code=404, detail="Report not found")
+    body = await reports.render_report(report, report_format, report_cache)
+    return Response(body, media_type=reports.REPORT_FORMATS[report_format][0],
+                    headers={"Content-Disposition": f'inline; filename="{reports.report_filename(report, report_format)}"'})
+
+@app.get("/insights/")
+def list_insights():
+    try:
+        return insights_cache.index()
+    except insights.InsightsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/insights/{view}")
+def get_insight(view: str, request: Request):
+    # Served from the cache; the ETag lets the page skip even the transfer while the data is unchanged
+    try:
+        version, body = insights_cache.get(view)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown insight view '{view}'")
+    except insights.InsightsUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    etag = f'"{version}-{view}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return Response(body, media_type="application/json", headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 @app.get("/recommendations/history/", response_model=List[schemas.RecommendationInDB])
 def get_recommendation_history(
@@ -321,6 +514,81 @@ def get_recommendation_history(
     history = db.query(models.Recommendation).filter(models.Recommendation.user_id == current_user.id).order_by(models.Recommendation.created_at.desc()).all()
     return history
 
+@app.post("/admin/train", response_model=schemas.TrainingJob, status_code=status.HTTP_202_ACCEPTED)
+def start_training(db: Session = Depends(get_db), admin: models.User = Depends(auth.get_current_admin_user)):
+    # Queued behind any run in progress; the models reload on their own when it publishes
+    try:
+        job = training_jobs.submit(db, requested_by=admin.username)
+    except training_jobs.TrainingQueueFull as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    return training_jobs.describe(db, job)
+
+def get_training_job_or_404(db: Session, job_id: int) -> models.TrainingJob:
+    job = db.query(models.TrainingJob).filter(models.TrainingJob.id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Training job not found")
+    return job
+
+@app.get("/admin/train/{job_id}", response_model=schemas.TrainingJob)
+def get_training_job(job_id: int, db: Session = Depends(get_db), admin: models.User = Depends(auth.get_current_admin_user)):
+    return training_jobs.describe(db, get_training_job_or_404(db, job_id))
+
+@app.post("/admin/train/{job_id}/cancel", response_model=schemas.TrainingJob)
+def cancel_training_job(job_id: int, db: Session = Depends(get_db), admin: models.User = Depends(auth.get_current_admin_user)):
+    job = get_training_job_or_404(db, job_id)
+    if job.status not in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Training job already {job.status}")
+    return training_jobs.describe(db, training_jobs.cancel(db, job))
+
+@app.post("/admin/cohorts/", response_model=schemas.CohortJob, status_code=status.HTTP_202_ACCEPTED)
+async def upload_cohort(file: UploadFile = File(...), db: Session = Depends(get_db), admin: models.User = Depends(auth.get_current_admin_user)):
+    # A results CSV for a whole class, scored in the background; see app/cohorts.py for the columns
+    try:
+        path, rows = await cohorts.store_upload(file)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File is too large")
+    finally:
+        await file.close()
+    try:
+        await run_in_threadpool(cohorts.check_header, path, recommender.all_subjects)
+        job = await run_in_threadpool(cohorts.submit, db, path, file.filename, rows, admin.username)
+    except ValueError as e:
+        os.remove(path)
+        raise HTTPException(status_code=400, detail=str(e))
+    except cohorts.CohortQueueFull as e:
+        os.remove(path)
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    return await run_in_threadpool(cohorts.describe, db, job)
+
+def get_cohort_job_or_404(db: Session, job_id: int) -> models.CohortJob:
+    job = db.query(models.CohortJob).filter(models.CohortJob.id == job_id).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Cohort job not found")
+    return job
+
+@app.get("/admin/cohorts/{job_id}", response_model=schemas.CohortJob)
+def get_cohort_job(job_id: int, db: Session = Depends(get_db), admin: models.User = Depends(auth.get_current_admin_user)):
+    return cohorts.describe(db, get_cohort_job_or_404(db, job_id))
+
+@app.get("/admin/cohorts/{job_id}/results")
+def download_cohort_results(job_id: int, db: Session = Depends(get_db), admin: models.User = Depends(auth.get_current_admin_user)):
+    job = get_cohort_job_or_404(db, job_id)
+    if job.status != "succeeded":
+        raise HTTPException(status_code=409, detail=f"Cohort job is {job.status}; results are available once it succeeds")
+    name = os.path.splitext(os.path.basename(job.filename or "cohort"))[0]
+    return FileResponse(job.result_path, media_type="text/csv", filename=f"{name}-results.csv")
+
+@app.post("/admin/cohorts/{job_id}/cancel", response_model=schemas.CohortJob)
+def cancel_cohort_job(job_id: int, db: Session = Depends(get_db), admin: models.User = Depends(auth.get_current_admin_user)):
+    job = get_cohort_job_or_404(db, job_id)
+    if job.status not in ("queued", "running"):
+        raise HTTPException(status_code=409, detail=f"Cohort job already {job.status}")
+    return cohorts.describe(db, cohorts.cancel(db, job))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(telemetry.REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to the Career Guidance API"}
\ No newline at end of file
@@ -0,0 +1,85 @@
+"""Periodic database housekeeping tasks."""
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PURGE_INTERVAL_SECONDS = int(os.getenv("TOKEN_PURGE_INTERVAL_SECONDS", 3600))
+TOKEN_PURGE_BATCH_SIZE = int(os.getenv("TOKEN_PURGE_BATCH_SIZE", 1000))
+
+# Totals for the expired-token purge, reported by the monitoring endpoints
+token_purge_stats = {
+    "runs": 0,
+    "rows_purged_total": 0,
+    "last_rows_purged": 0,
+    "last_run_seconds": 0.0,
+    "last_run_at": None,
+}
+
+
+def purge_expired_reset_tokens(db: Session, batch_size: int = TOKEN_PURGE_BATCH_SIZE, now: Optional[datetime] = None) -> int:
+    """Deletes expired password reset tokens in batches of at most batch_size rows.
+
+    Each batch is committed on its own so the delete never holds locks on a large
+    part of the table. Returns the number of rows deleted.
+    """
+    now = now or datetime.utcnow()
+    total = 0
+    while True:
+        ids = [
+            row.id for row in
+            db.query(models.PasswordResetToken.id)
+            .filter(models.PasswordResetToken.expires_at < now)
+            .limit(batch_size)
+        ]
+        if not ids:
+            break
+        total += db.query(models.PasswordResetToken).filter(
+            models.PasswordResetToken.id.in_(ids)
+        ).delete(synchronize_session=False)
+        db.commit()
+        if len(ids) < batch_size:
+            break
+    return total
+
+
+def run_token_purge() -> int:
+    start_time = time.perf_counter()
+    db = SessionLocal()
+    try:
+        purged = purge_expired_reset_tokens(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    elapsed = time.perf_counter() - start_time
+
+    token_purge_stats["runs"] += 1
+    token_purge_stats["rows_purged_total"] += purged
+    token_purge_stats["last_rows_purged"] = purged
+    token_purge_stats["last_run_seconds"] = elapsed
+    token_purge_stats["last_run_at"] = datetime.utcnow()
+    logger.info("Purged %d expired password reset token(s) in %.3fs.", purged, elapsed,
+                extra={"rows_purged": purged, "duration_seconds": round(elapsed, 6)})
+    return purged
+
+
+async def purge_expired_tokens_periodically(interval: int = TOKEN_PURGE_INTERVAL_SECONDS):
+    """Runs the expired-token purge every `interval` seconds, off the event loop."""
+    while True:
+        try:
+            await run_in_threadpool(run_token_purge)
+        except Exception as e:
+            logger.exception("Error purging expired password reset tokens: %s", e)
+        await asyncio.sleep(interval)
@@ -0,0 +1,217 @@
+"""Publishing and watching the trained model artifacts.
+
+train.py publishes a run with publish(): each artifact (the course and career pipelines, the
+career label encoder and model_metrics.json) is written to a temporary file and renamed into
+place, so a reader never sees a half-written file. After the last rename it writes
+model_manifest.json, the same way, listing the model version and each artifact's size and
+checksum. The manifest is the commit point of a training run.
+
+ArtifactWatcher tells the serving process when to reload. It is woken by inotify events on
+the artifact directories (watchfiles; it falls back to polling when that is not installed)
+and decides from the files themselves:
+
+- every artifact matches the manifest: a complete run was published, reload now;
+- the files differ from the manifest, or there is no manifest (artifacts copied by hand,
+  a run still renaming its files): reload once they have been quiet for
+  MODEL_RELOAD_DEBOUNCE_SECONDS.
+
+A training run therefore causes exactly one reload, within a fraction of a second of its
+manifest being written.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import joblib
+
+logger = logging.getLogger(__name__)
+
+MODEL_MANIFEST_PATH = "app/model_manifest.json"
+# Quiet period before loading files that are not described by the manifest
+MODEL_RELOAD_DEBOUNCE_SECONDS = float(os.getenv("MODEL_RELOAD_DEBOUNCE_SECONDS", 0.5))
+# Used only without inotify (watchfiles not installed)
+MODEL_POLL_INTERVAL_SECONDS = float(os.getenv("MODEL_POLL_INTERVAL_SECONDS", 1))
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _stage(path: str, write) -> str:
+    """Calls write(file) on a new temporary file next to `path` and returns its path."""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="." + os.path.basename(path) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
+
+
+def _writer(artifact, path: str):
+    if path.endswith(".json"):
+        return lambda f: f.write(json.dumps(artifact, indent=4).encode())
+    return lambda f: joblib.dump(artifact, f)
+
+
+def publish(artifacts: dict, model_version: str, manifest_path: str = MODEL_MANIFEST_PATH) -> dict:
+    """Writes {path: object} (JSON for .json paths, joblib otherwise) and then the manifest.
+
+    Everything is staged in temporary files first, so the renames that replace the served
+    files follow each other within milliseconds."""
+    staged = {}
+    try:
+        for path, artifact in artifacts.items():
+            staged[path] = _stage(path, _writer(artifact, path))
+    except BaseException:
+        for tmp_path in staged.values():
+            os.remove(tmp_path)
+        raise
+    for path, tmp_path in staged.items():
+        os.replace(tmp_path, path)
+    manifest = {
+        "model_version": model_version,
+        "artifacts": {
+            os.path.basename(path): {"size": os.path.getsize(path), "sha256": file_checksum(path)}
+            for path in artifacts
+        },
+    }
+    os.replace(_stage(manifest_path, _writer(manifest, manifest_path)), manifest_path)
+    return manifest
+
+
+def read_manifest(manifest_path: str = MODEL_MANIFEST_PATH):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except ValueError as e:
+        logger.warning("Ignoring unreadable model manifest %s: %s", manifest_path, e)
+        return None
+
+
+def _stat(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ArtifactWatcher:
+    def __init__(self, artifact_paths, manifest_path: str = MODEL_MANIFEST_PATH, debounce_seconds: float = MODEL_RELOAD_DEBOUNCE_SECONDS):
+        self.artifact_paths = [os.path.abspath(path) for path in artifact_paths]
+        self.manifest_path = os.path.abspath(manifest_path)
+        self.debounce_seconds = debounce_seconds
+        self._watched = set(self.artifact_paths) | {self.manifest_path}
+        self._loaded = self.fingerprint()
+        self._pending = None
+        self._pending_since = 0.0
+        self._checksums = {}
+        self._event = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self.inotify = False
+
+    def fingerprint(self):
+        """(mtime, size, inode) of every artifact and the manifest; a rename changes the inode."""
+        return tuple(_stat(path) for path in sorted(self._watched))
+
+    def start(self):
+        """Starts the inotify thread; without watchfiles, wait() polls instead."""
+        try:
+            import watchfiles
+        except ImportError:
+            logger.info("watchfiles is not installed; polling the model files every %.1fs.", MODEL_POLL_INTERVAL_SECONDS)
+            return self
+        directories = sorted({os.path.dirname(path) for path in self._watched})
+        self._thread = threading.Thread(target=self._watch, args=(watchfiles, directories), name="model-artifact-watcher", daemon=True)
+        self._thread.start()
+        self.inotify = True
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._event.set()
+
+    def _watch(self, watchfiles, directories):
+        watch_filter = lambda change, path: path in self._watched
+        try:
+            for _ in watchfiles.watch(*directories, watch_filter=watch_filter, debounce=200, step=20, stop_event=self._stop,
+                                      raise_interrupt=False, recursive=False):
+                self._event.set()
+        except Exception as e:
+            logger.warning("The model file watcher stopped (%s); polling every %.1fs instead.", e, MODEL_POLL_INTERVAL_SECONDS)
+            self.inotify = False
+            self._event.set()
+
+    def _checksum(self, path: str, stat) -> str:
+        cached = self._checksums.get(path)
+        if cached is None or cached[0] != stat:
+            cached = self._checksums[path] = (stat, file_checksum(path))
+        return cached[1]
+
+    def matches_manifest(self, manifest) -> bool:
+        """True when every artifact on disk is the one the manifest describes."""
+        entries = manifest.get("artifacts", {})
+        for path in self.artifact_paths:
+            entry, stat = entries.get(os.path.basename(path)), _stat(path)
+            if entry is None or stat is None or stat[1] != entry["size"]:
+                return False
+            if self._checksum(path, stat) != entry["sha256"]:
+                return False
+        return True
+
+    def reload_due(self) -> bool:
+        """Decides whether the artifacts on disk should be loaded now (see the module docstring)."""
+        fingerprint = self.fingerprint()
+        if fingerprint == self._loaded:
+            self._pending = None
+            return False
+        manifest = read_manifest(self.manifest_path)
+        if manifest is not None and self.matches_manifest(manifest):
+            return True
+        if fingerprint != self._pending:
+            # Still changing: restart the quiet period
+            self._pending, self._pending_since = fingerprint, time.monotonic()
+            return False
+        if time.monotonic() - self._pending_since < self.debounce_seconds:
+            return False
+        if manifest is not None:
+            logger.warning("The model files do not match %s; loading them anyway.", self.manifest_path)
+        return True
+
+    def mark_loaded(self):
+        """Call before loading the artifacts; a failed load is retried only once the files change again."""
+        self._loaded = self.fingerprint()
+        self._pending = None
+
+    def wait(self, timeout: float) -> bool:
+        """Blocks until a reload is due (True) or `timeout` seconds pass (False)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            if self.reload_due():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._stop.is_set():
+                return False
+            if self._pending is not None:
+                # Re-check when the quiet period ends
+                remaining = min(remaining, max(0.01, self._pending_since + self.debounce_seconds - time.monotonic()))
+            if not self.inotify:
+                remaining = min(remaining, MODEL_POLL_INTERVAL_SECONDS)
+            self._event.wait(remaining)
+            self._event.clear()
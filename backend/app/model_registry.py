@@ -0,0 +1,124 @@
+import threading
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+
+
+def new_model_version() -> str:
+    """Returns a sortable identifier for a training run, e.g. '20261019T175929-3fa2c1'."""
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def format_scores(metric: models.ModelMetric) -> dict:
+    """The scores only: what /model-metrics/ has always returned."""
+    return {
+        "accuracy": metric.accuracy,
+        "precision": metric.precision,
+        "recall": metric.recall,
+        "f1_score": metric.f1_score,
+    }
+
+
+def format_metric(metric: models.ModelMetric) -> dict:
+    return {
+        **format_scores(metric),
+        "training_time_seconds": metric.training_time_seconds,
+        "model_version": metric.model_version,
+    }
+
+
+def _filter_version(query, model_version: Optional[str]):
+    # Rows written before versioning was introduced have a NULL model_version
+    if model_version is None:
+        return query.filter(models.ModelMetric.model_version.is_(None))
+    return query.filter(models.ModelMetric.model_version == model_version)
+
+
+def get_run_metrics(db: Session, model_version: Optional[str] = None) -> dict:
+    """Returns the scores of one training run keyed by model name.
+
+    If model_version is not given (or has no rows yet) the most recent run is used. Training
+    times and model versions are only in get_metrics_history().
+    """
+    rows = []
+    if model_version is not None:
+        rows = _filter_version(db.query(models.ModelMetric), model_version).all()
+    if not rows:
+        latest = db.query(models.ModelMetric).order_by(
+            models.ModelMetric.created_at.desc(), models.ModelMetric.id.desc()
+        ).first()
+        if latest is None:
+            return {}
+        rows = _filter_version(db.query(models.ModelMetric), latest.model_version).all()
+
+    return {row.model_name: format_scores(row) for row in rows}
+
+
+def get_metrics_history(db: Session, model_name: Optional[str] = None, limit: int = 50) -> list:
+    """Returns the last `limit` training runs, oldest first, for charting accuracy and training cost."""
+    trained_at = func.max(models.ModelMetric.created_at).label("trained_at")
+    runs = (
+        db.query(models.ModelMetric.model_version, trained_at)
+        .group_by(models.ModelMetric.model_version)
+        .order_by(trained_at.desc())
+        .limit(limit)
+        .all()
+    )
+
+    history = []
+    for model_version, run_trained_at in reversed(runs):
+        query = _filter_version(db.query(models.ModelMetric), model_version)
+        if model_name:
+            query = query.filter(models.ModelMetric.model_name == model_name)
+        rows = query.all()
+        if not rows:
+            continue
+        history.append({
+            "model_version": model_version,
+            "trained_at": run_trained_at,
+            "models": {row.model_name: format_metric(row) for row in rows},
+        })
+    return history
+
+
+class LatestMetricsCache:
+    """Caches the metrics snapshot of the models currently being served.
+
+    The snapshot is keyed by the model version the recommender has loaded, so the
+    table is only queried again once a new training run lands and its models are reloaded.
+    """
+
+    _UNSET = object()
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = self._UNSET
+        self._snapshot = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, db: Session, model_version: Optional[str]) -> dict:
+        with self._lock:
+            if self._snapshot and self._version == model_version:
+                self.hits += 1
+                return self._snapshot
+
+        snapshot = get_run_metrics(db, model_version)
+
+        with self._lock:
+            self.misses += 1
+            # Don't cache an empty result so metrics show up as soon as train.py has written them
+            if snapshot:
+                self._version = model_version
+                self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        with self._lock:
+            self._version = self._UNSET
+            self._snapshot = None
@@ -1,6 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Text, LargeBinary, Boolean
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -40,6 +40,7 @@ class User(Base):
     school_attended = Column(String, nullable=True)
     id_birth_cert_number = Column(String, nullable=True)
     phone_number = Column(String, nullable=True)
+    is_admin = Column(Boolean, default=False)  # May use the /admin endpoints and see every report
 
     password_reset_tokens = relationship("PasswordResetToken", back_populates="user")
 
@@ -50,7 +51,7 @@ class PasswordResetToken(Base):
     user_id = Column(Integer, ForeignKey("users.id"))
     token = Column(String, unique=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
-    expires_at = Column(DateTime)
+    expires_at = Column(DateTime, index=True) # Indexed for the expired-token purge
 
     user = relationship("User", back_populates="password_reset_tokens")
 
@@ -62,10 +63,24 @@ class Recommendation(Base):
     course_name = Column(String, nullable=True) # Allow null for career-only recommendations
     career_name = Column(String, nullable=True) # Allow null for course-only recommendations
     course_type = Column(String, nullable=True)
+    request_id = Column(String, index=True, nullable=True) # Request that produced this recommendation
+    course_model = Column(String, nullable=True) # Course model that served it (model_metrics.json key)
+    set_id = Column(String, index=True, nullable=True) # Server-generated ID shared by the rows of one /recommend call (reports)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     owner = relationship("User")
 
+class UserFeatureVector(Base):
+    __tablename__ = "user_feature_vectors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    model_version = Column(String) # Training run whose preprocessors built the vectors
+    profile = Column(Text) # JSON of the Student fields the vectors were built from
+    course_vector = Column(LargeBinary) # float64 course model features
+    career_vector = Column(LargeBinary) # float64 career model features
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class Rating(Base):
     __tablename__ = "ratings"
 
@@ -81,9 +96,64 @@ class ModelMetric(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     model_name = Column(String, index=True)
+    model_version = Column(String, index=True, nullable=True) # Identifies the training run that produced the metric
     accuracy = Column(Float)
     precision = Column(Float)
     recall = Column(Float)
     f1_score = Column(Float)
+    training_time_seconds = Column(Float, nullable=True) # Wall-clock fit time, used to chart training cost
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+
+class TrainingJob(Base):
+    __tablename__ = "training_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, index=True, default="queued") # queued, running, succeeded, failed, cancelled, timed_out
+    requested_by = Column(String, nullable=True) # Username, or "startup" for the run at server start
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    progress = Column(Float, default=0.0) # Share of train.py's stages completed, 0 to 1
+    stage = Column(String, nullable=True) # Last stage train.py reported
+    model_version = Column(String, nullable=True)
+    exit_code = Column(Integer, nullable=True)
+    error = Column(String, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    log_path = Column(String, nullable=True)
+
+class CohortJob(Base):
+    __tablename__ = "cohort_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, index=True, default="queued") # queued, running, succeeded, failed, cancelled
+    requested_by = Column(String, nullable=True)
+    filename = Column(String, nullable=True) # Name of the uploaded file
     created_at = Column(DateTime, default=datetime.utcnow)
-    
\ No newline at end of file
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    rows_total = Column(Integer, default=0) # Estimated from the upload; exact once the job succeeds
+    rows_processed = Column(Integer, default=0)
+    rows_scored = Column(Integer, default=0)
+    rows_invalid = Column(Integer, default=0)
+    course_model = Column(String, nullable=True) # Course model that scored the cohort (model_metrics.json key)
+    model_version = Column(String, nullable=True)
+    error = Column(String, nullable=True)
+    cancel_requested = Column(Boolean, default=False)
+    input_path = Column(String, nullable=True)
+    result_path = Column(String, nullable=True)
+
+class CohortResult(Base):
+    __tablename__ = "cohort_results"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("cohort_jobs.id"), index=True)
+    row_number = Column(Integer) # Data row of the uploaded CSV, from 1
+    student_ref = Column(String, nullable=True)
+    status = Column(String) # scored or invalid
+    error = Column(String, nullable=True)
+    average_points = Column(Float, nullable=True)
+    profile_rating = Column(String, nullable=True)
+    courses = Column(Text, nullable=True) # Top predicted course families, best first, ";"-separated
+    top_course_probability = Column(Float, nullable=True)
+    career = Column(String, nullable=True)
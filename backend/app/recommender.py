@@ -2,11 +2,126 @@ import pandas as pd
 import joblib
 import numpy as np
 import json
+import logging
+import os
+import time
+from types import MappingProxyType
 from app.custom_transformers import MLBWrapper
+from app import telemetry, serving, ensemble, feature_store, catalog
+
+logger = logging.getLogger(__name__)
+
+# Artifact and data locations used by the API, relative to the backend directory
+DEFAULT_PATHS = dict(
+    courses_path="data/final_courses_cleaned.csv",
+    careers_path="data/careers.csv",
+    rf_model_path="app/random_forest_course_model.joblib",
+    xgb_model_path="app/xgboost_course_model.joblib",
+    svm_model_path="app/svm_course_model.joblib",
+    metrics_path="app/model_metrics.json",
+    career_model_path="app/career_recommendation_model.joblib",
+    career_label_encoder_path="app/career_label_encoder.joblib",
+)
+
+# Course pipelines by their key in model_metrics.json, with the names shown to users
+COURSE_MODEL_NAMES = {
+    "random_forest_course": "Random Forest Course",
+    "xgboost_course": "XGBoost Course",
+    "svm_course": "SVM Course",
+    "ensemble": "Weighted Ensemble",
+}
+
+# Career model input columns and the Student fields they come from
+CAREER_APTITUDE_FIELDS = {
+    'Linguistic': 'linguistic',
+    'Musical': 'musical',
+    'Bodily': 'bodily',
+    'Logical - Mathematical': 'logicalMathematical',
+    'Spatial-Visualization': 'spatialVisualization',
+    'Interpersonal': 'interpersonal',
+    'Intrapersonal': 'intrapersonal',
+    'Naturalist': 'naturalist',
+}
+# Map P-values from string ('POOR', 'AVG', 'BEST') to numerical (0, 1, 2), defaulting to AVG (1)
+P_VALUE_MAPPING = {'POOR': 0, 'AVG': 1, 'BEST': 2}
+
+# Bound once so recording a stage timing is a single histogram update
+_STAGE_GRADE_CONVERSION = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="grade_conversion")
+_STAGE_DATAFRAME_BUILD = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="dataframe_build")
+_STAGE_PREDICT_PROBA = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="predict_proba")
+_STAGE_CATALOG_MATCH = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="catalog_match")
+_STAGE_COURSE_METADATA = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="course_metadata_lookup")
+_STAGE_CAREER_PREDICT = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="career_predict")
+_STAGE_CAREER_LOOKUP = telemetry.RECOMMEND_STAGE_SECONDS.labels(stage="career_lookup")
+
+class ModelSnapshot:
+    """The loaded course and career models of one training run, with everything derived from them.
+
+    Never modified once built: Recommender._load_models swaps in a new one, as CatalogManager does catalogs."""
+
+    def __init__(self, rf_model_path, xgb_model_path, svm_model_path, metrics_path, career_model_path, career_label_encoder_path, grade_points, serving_policy):
+        logger.info("Loading models and metrics...")
+        # Load course recommendation models
+        self.rf_course_model_pipeline = joblib.load(rf_model_path)
+        self.xgb_course_model_pipeline = joblib.load(xgb_model_path)
+        self.svm_course_model_pipeline = joblib.load(svm_model_path)
+
+        # Load career recommendation model and label encoder
+        self.career_model_pipeline = joblib.load(career_model_path)
+        self.career_label_encoder = joblib.load(career_label_encoder_path)
+
+        with open(metrics_path, 'r') as f:
+            self.metrics = json.load(f)
+        
+        logger.info("Models and metrics loaded successfully.")
+
+        course_pipelines = {
+            "random_forest_course": self.rf_course_model_pipeline,
+            "xgboost_course": self.xgb_course_model_pipeline,
+            "svm_course": self.svm_course_model_pipeline,
+        }
+
+        # Determine the best course model based on accuracy; it serves unless a traffic split says otherwise
+        model_accuracies = {key: self.metrics.get(key, {}).get('accuracy', 0) for key in course_pipelines}
+        best_model_key = max(model_accuracies, key=model_accuracies.get)
+
+        # Blend of the three models, weighted by their metrics
+        ensemble_weights = ensemble.metric_weights(self.metrics, course_pipelines)
+        self.course_ensemble = ensemble.CourseEnsemble(course_pipelines, ensemble_weights)
+        if serving_policy.ensemble_enabled:
+            course_pipelines["ensemble"] = self.course_ensemble
+            # The blend has no offline evaluation of its own; report its members' weighted accuracy
+            model_accuracies["ensemble"] = sum(ensemble_weights[key] * model_accuracies[key] for key in ensemble_weights)
+            if serving_policy.ensemble:
+                best_model_key = "ensemble"
+
+        # Identifies the loaded artifacts: the training run, or the model files' age for metrics files that predate versioning
+        model_paths = [rf_model_path, xgb_model_path, svm_model_path, career_model_path]
+        self.model_version = self.metrics.get("model_version") or "mtime-%d" % max(os.path.getmtime(path) for path in model_paths)
+
+        # train.py fits the same preprocessor for every course pipeline, so any of them featurizes for all
+        self.course_preprocessor = self.rf_course_model_pipeline[:-1]
+        self.career_preprocessor = self.career_model_pipeline[:-1]
+        try:
+            self.feature_layout = feature_store.FeatureLayout(
+                self.rf_course_model_pipeline[0], self.career_model_pipeline[0], grade_points, CAREER_APTITUDE_FIELDS, P_VALUE_MAPPING)
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            logger.warning("Preprocessors have an unexpected layout; per-user feature vectors are disabled: %s", e)
+            self.feature_layout = None
+
+        # Read-only views: readers share them across threads
+        self.course_pipelines = MappingProxyType(course_pipelines)
+        self.course_model_accuracies = MappingProxyType(model_accuracies)
+        self.chosen_course_model_key = best_model_key
+        self.chosen_course_model_name = COURSE_MODEL_NAMES[best_model_key]
+        self.course_model_pipeline = course_pipelines[best_model_key]
+
+        logger.info("Chosen course model for recommendations: %s (Accuracy: %.2f)", self.chosen_course_model_name, model_accuracies[best_model_key])
+
 
 class Recommender:
     def __init__(self, courses_path, careers_path, rf_model_path, xgb_model_path, svm_model_path, metrics_path, career_model_path, career_label_encoder_path):
-        print("Initializing Recommender...")
+        logger.info("Initializing Recommender...")
         self.courses_path = courses_path
         self.careers_path = careers_path
         self.rf_model_path = rf_model_path
@@ -16,53 +131,40 @@ class Recommender:
         self.career_model_path = career_model_path
         self.career_label_encoder_path = career_label_encoder_path
 
-        self.courses_df = pd.read_csv(self.courses_path).fillna('N/A')
-        self.careers_df = pd.read_csv(self.careers_path).fillna('N/A')
-        self.careers_df['career_name'] = self.careers_df['career_name'].apply(lambda x: x.strip())
-        self.course_meta_df = pd.read_csv("data/courses_jobApplicability_future_trends_automation_risk.csv").fillna('N/A')
-
-        self._load_models()
+        # Course and career catalogs with their lookup indexes; reloaded when the files change (see catalog.py)
+        self.catalog = catalog.CatalogManager(self.courses_path, self.careers_path)
 
         self.grade_points = {
             'A': 12, 'A-': 11, 'B+': 10, 'B': 9, 'B-': 8,
             'C+': 7, 'C': 6, 'C-': 5, 'D+': 4, 'D': 3, 'D-': 2, 'E': 1
         }
-        self.all_subjects = ['Mathematics', 'Kiswahili', 'English', 'Arabic', 'German', 'French', 'Chemistry', 'Physics', 'Biology', 'Home Science', 'Agriculture', 'Computer Studies', 'History', 'Geography', 'Religious Education', 'Life Skills', 'Business Studies', 'Music', 'Art and Design', 'Drawing and Design', 'Building Construction', 'Power and Mechanics', 'Metalwork', 'Aviation', 'Woodwork', 'Electronics']
 
-    def _load_models(self):
-        print("Loading models and metrics...")
-        # Load course recommendation models
-        self.rf_course_model_pipeline = joblib.load(self.rf_model_path)
-        self.xgb_course_model_pipeline = joblib.load(self.xgb_model_path)
-        self.svm_course_model_pipeline = joblib.load(self.svm_model_path)
+        # Decides which course model serves each request and which ones shadow it
+        self.serving_policy = serving.ServingPolicy.from_env()
 
-        # Load career recommendation model and label encoder
-        self.career_model_pipeline = joblib.load(self.career_model_path)
-        self.career_label_encoder = joblib.load(self.career_label_encoder_path)
+        self._load_models()
 
-        with open(self.metrics_path, 'r') as f:
-            self.metrics = json.load(f)
-        
-        print("Models and metrics loaded successfully.")
+        self.all_subjects = ['Mathematics', 'Kiswahili', 'English', 'Arabic', 'German', 'French', 'Chemistry', 'Physics', 'Biology', 'Home Science', 'Agriculture', 'Computer Studies', 'History', 'Geography', 'Religious Education', 'Life Skills', 'Business Studies', 'Music', 'Art and Design', 'Drawing and Design', 'Building Construction', 'Power and Mechanics', 'Metalwork', 'Aviation', 'Woodwork', 'Electronics']
 
-        # Determine the best course model based on accuracy
-        model_accuracies = {
-            "Random Forest Course": self.metrics.get("random_forest_course", {}).get('accuracy', 0),
-            "XGBoost Course": self.metrics.get("xgboost_course", {}).get('accuracy', 0),
-            "SVM Course": self.metrics.get("svm_course", {}).get('accuracy', 0)
-        }
-        
-        best_model_name = max(model_accuracies, key=model_accuracies.get)
-        self.chosen_course_model_name = best_model_name
+    # The current catalog version's tables, for callers outside a request
+    @property
+    def courses_df(self):
+        return self.catalog.current.courses_df
 
-        if best_model_name == "Random Forest Course":
-            self.course_model_pipeline = self.rf_course_model_pipeline
-        elif best_model_name == "XGBoost Course":
-            self.course_model_pipeline = self.xgb_course_model_pipeline
-        else:
-            self.course_model_pipeline = self.svm_course_model_pipeline
-            
-        print(f"Chosen course model for recommendations: {self.chosen_course_model_name} (Accuracy: {model_accuracies[best_model_name]:.2f})")
+    @property
+    def careers_df(self):
+        return self.catalog.current.careers_df
+
+    @property
+    def course_families(self):
+        return self.catalog.current.course_families
+
+    def _load_models(self):
+        # Built in full, then published with one assignment: a request that reads self.snapshot once
+        # scores with one training run's models even if a reload swaps in the next meanwhile
+        self.snapshot = ModelSnapshot(
+            self.rf_model_path, self.xgb_model_path, self.svm_model_path, self.metrics_path,
+            self.career_model_path, self.career_label_encoder_path, self.grade_points, self.serving_policy)
 
     def _get_profile_rating(self, avg_points):
         if avg_points >= 10:
@@ -89,17 +191,48 @@ class Recommender:
     def _generate_reasoning(self, student_df, item_features=None): # item_features is now optional
         return "Recommended based on a predictive model trained on student profiles and aptitudes."
 
-    def recommend(self, student_input):
+    def _build_course_frame(self, student_inputs):
+        """Builds the course pipeline input, one row per student."""
+        data = {
+            subject: [self.grade_points.get(s.grades.get(subject, 'E').upper(), 1) for s in student_inputs]
+            for subject in self.all_subjects
+        }
+        data['interests'] = [s.interests for s in student_inputs]
+        data['skills'] = [s.skills for s in student_inputs]
+        return pd.DataFrame(data)
+
+    def _build_career_frame(self, student_inputs):
+        """Builds the career pipeline input, one row per student."""
+        data = {
+            column: [getattr(s, field) for s in student_inputs]
+            for column, field in CAREER_APTITUDE_FIELDS.items()
+        }
+        for i in range(1, 9):
+            data[f'P{i}'] = [P_VALUE_MAPPING.get(getattr(s, f'p{i}'), 1) for s in student_inputs]
+        return pd.DataFrame(data)
+
+    def featurize(self, student_input, snapshot=None):
+        """Returns the preprocessed (course_vector, career_vector) for one student, by the given models (default: the current ones)."""
+        snapshot = snapshot or self.snapshot
+        course_features = snapshot.course_preprocessor.transform(self._build_course_frame([student_input]))
+        career_features = snapshot.career_preprocessor.transform(self._build_career_frame([student_input]))
+        return np.asarray(course_features, dtype=float)[0], np.asarray(career_features, dtype=float)[0]
+
+    def recommend(self, student_input, user_id=None, course_features=None, career_features=None, snapshot=None):
+        """Recommends courses and careers. `course_features`/`career_features` are already preprocessed
+        rows for this student (see feature_store); without them the student is featurized here.
+        `snapshot` is the models those rows were built by; it defaults to the current ones."""
+        # One catalog version and one set of models for the whole request, even if a reload swaps in the next one meanwhile
+        current_catalog = self.catalog.current
+        snapshot = snapshot or self.snapshot
+        stage_start = time.perf_counter()
         total_points = 0
         num_subjects = 0
         subject_grades_points = []
-        student_data = {} # Initialize student_data here
-        # Prepare student data for course recommendation model
         # Convert grades to points
         for subject in self.all_subjects:
             grade = student_input.grades.get(subject, 'E')
             points = self.grade_points.get(grade.upper(), 1)
-            student_data[subject] = points
             if subject in student_input.grades:
                 total_points += points
                 num_subjects += 1
@@ -108,19 +241,30 @@ class Recommender:
         average_points = total_points / num_subjects if num_subjects > 0 else 0
         profile_rating = self._get_profile_rating(average_points)
         possible_types = self._get_possible_course_types(average_points)
+        now = time.perf_counter()
+        _STAGE_GRADE_CONVERSION.observe(now - stage_start)
+        stage_start = now
 
-        # Create a DataFrame for the course model input
-        course_model_input_data = {subject: [student_data[subject]] for subject in self.all_subjects}
-        course_model_input_data['interests'] = [student_input.interests]
-        course_model_input_data['skills'] = [student_input.skills]
-        
-        student_df = pd.DataFrame(course_model_input_data)
+        # Create a DataFrame for the course model input, unless the features were supplied
+        student_df = self._build_course_frame([student_input]) if course_features is None else None
+        now = time.perf_counter()
+        _STAGE_DATAFRAME_BUILD.observe(now - stage_start)
+        stage_start = now
 
         # --- Course Recommendations ---
-        course_probabilities = self.course_model_pipeline.predict_proba(student_df)[0]
-        course_model_classes = self.course_model_pipeline.classes_
+        # The served and the shadow models come from the same training run
+        course_pipelines = snapshot.course_pipelines
+        course_model_key = self.serving_policy.choose(user_id, course_pipelines, snapshot.chosen_course_model_key)
+        course_model_pipeline = course_pipelines[course_model_key]
+        course_probabilities = self.serving_policy.predict_proba(course_model_key, course_model_pipeline, student_df, course_features)[0]
+        course_model_classes = course_model_pipeline.classes_
 
         top_5_course_indices = np.argsort(course_probabilities)[::-1][:5]
+        _STAGE_PREDICT_PROBA.observe(time.perf_counter() - stage_start)
+        self.serving_policy.submit_shadow(student_df, course_model_key, course_model_classes[top_5_course_indices], course_pipelines, course_features)
+        metadata_lookup_seconds = 0.0
+        catalog_match_seconds = 0.0
+        matched_courses = set()
         
         course_recommendations = []
         for idx, i in enumerate(top_5_course_indices):
@@ -135,21 +279,14 @@ class Recommender:
             else:
                 current_type = possible_types[0]
 
-            # The course_id from the model prediction no longer directly maps to combined_courses.csv
-            # For now, we will just pick a course from combined_courses_df based on some criteria
-            # A more robust solution would involve retraining the course model with a target that maps to combined_courses.csv
-            
-            # Temporary: Pick a course from combined_courses_df based on difficulty level or rating
-            # For demonstration, let's just pick the first available course for now
-            # In a real scenario, this would be a more sophisticated lookup or a different model output
-            
-            # Find a course that matches the predicted course_id (if possible) or a similar one
-            # Since combined_courses.csv doesn't have course_id, we'll use a placeholder
-            
-            # For now, let's just get a random course from the combined_courses_df
-            # This is a temporary placeholder until the course model is retrained
-            if not self.courses_df.empty:
-                course_info = self.courses_df.sample(n=1).iloc[0]
+            # The predicted course_id is a course family (courses.csv), not a catalog row. Pick the catalog
+            # course closest to the student's interests and skills and to that family, without repeating a name.
+            match_start = time.perf_counter()
+            position = current_catalog.match_course(student_input, course_id, current_type, matched_courses)
+            catalog_match_seconds += time.perf_counter() - match_start
+            if position is not None:
+                matched_courses.add(current_catalog.course_name_codes[position])
+                course_info = current_catalog.courses_df.iloc[position]
                 course_skills = [s.strip() for s in course_info['skills_tags'].split(',') if s.strip()]
                 matched_interests = [i for i in student_input.interests if i in course_skills]
                 matched_skills = [s for s in student_input.skills if s in course_skills]
@@ -178,15 +315,14 @@ class Recommender:
                 elif current_type == "Certificate" and "certificate" not in recommended_course_name_lower:
                     final_course_name = f"Certificate in {final_course_name}"
 
-                print(f"\nAttempting to find metadata for recommended course: '{recommended_course_name_lower}'")
+                # Debug-level, lazily formatted: costs nothing unless LOG_LEVEL=DEBUG
+                logger.debug("Attempting to find metadata for recommended course: '%s'", recommended_course_name_lower)
                 
-                for idx_meta, meta_row in self.course_meta_df.iterrows():
-                    meta_course_name_lower = meta_row['course_name'].lower()
-                    if meta_course_name_lower in recommended_course_name_lower or recommended_course_name_lower in meta_course_name_lower:
-                        job_applicability = meta_row['job_applicability']
-                        future_trends = meta_row['future_trends']
-                        automation_risk = meta_row['automation_risk']
-                        break # Found a match, no need to check further
+                metadata_start = time.perf_counter()
+                course_metadata = current_catalog.lookup_course_metadata(recommended_course_name_lower)
+                if course_metadata is not None:
+                    job_applicability, future_trends, automation_risk = course_metadata
+                metadata_lookup_seconds += time.perf_counter() - metadata_start
                 if job_applicability == "N/A":
                     job_applicability = "This course offers broad applicability in various industries."
                     future_trends = "The skills learned in this course are highly relevant for future industry trends."
@@ -208,7 +344,7 @@ class Recommender:
             else:
                 course_recommendations.append({
                     "name": "Placeholder Course",
-                    "type": course_type,
+                    "type": current_type,
                     "similarity_score": score,
                     "description": "No courses available in combined_courses.csv for lookup.",
                     "reasoning": "Based on your academic profile and interests, this course is a great fit for you!",
@@ -218,56 +354,27 @@ class Recommender:
                     "automation_risk": "N/A"
                 })
 
+        _STAGE_CATALOG_MATCH.observe(catalog_match_seconds)
+        _STAGE_COURSE_METADATA.observe(metadata_lookup_seconds)
+
         # --- Career Recommendations ---
-        # Prepare input for career model
-        # The career model expects numerical intelligence scores and ordinal P1-P8
-        # We need to map student_input's interests/skills to these features.
-        # For now, we'll create a dummy input for the career model based on the student's grades
-        # In a real scenario, student_input would need to contain these features directly.
-        
+        stage_start = time.perf_counter()
         # Prepare input for career model using actual student aptitude scores and P-values
-        # Map P-values from string ('POOR', 'AVG', 'BEST') to numerical (0, 1, 2)
-        p_value_mapping = {'POOR': 0, 'AVG': 1, 'BEST': 2}
-
-        career_input_data = {
-            'Linguistic': [student_input.linguistic],
-            'Musical': [student_input.musical],
-            'Bodily': [student_input.bodily],
-            'Logical - Mathematical': [student_input.logicalMathematical],
-            'Spatial-Visualization': [student_input.spatialVisualization],
-            'Interpersonal': [student_input.interpersonal],
-            'Intrapersonal': [student_input.intrapersonal],
-            'Naturalist': [student_input.naturalist],
-            'P1': [p_value_mapping.get(student_input.p1, 1)], # Default to AVG (1)
-            'P2': [p_value_mapping.get(student_input.p2, 1)],
-            'P3': [p_value_mapping.get(student_input.p3, 1)],
-            'P4': [p_value_mapping.get(student_input.p4, 1)],
-            'P5': [p_value_mapping.get(student_input.p5, 1)],
-            'P6': [p_value_mapping.get(student_input.p6, 1)],
-            'P7': [p_value_mapping.get(student_input.p7, 1)],
-            'P8': [p_value_mapping.get(student_input.p8, 1)],
-        }
-        career_input_df = pd.DataFrame(career_input_data)
-
-        career_predictions_encoded = self.career_model_pipeline.predict(career_input_df)
-        career_predictions_decoded = self.career_label_encoder.inverse_transform(career_predictions_encoded)
+        if career_features is None:
+            career_input_df = self._build_career_frame([student_input])
+            career_predictions_encoded = snapshot.career_model_pipeline.predict(career_input_df)
+        else:
+            career_predictions_encoded = snapshot.career_model_pipeline[-1].predict(career_features)
+        career_predictions_decoded = snapshot.career_label_encoder.inverse_transform(career_predictions_encoded)
+        now = time.perf_counter()
+        _STAGE_CAREER_PREDICT.observe(now - stage_start)
+        stage_start = now
         
         career_recommendations = []
         for career_name_raw in career_predictions_decoded: # Iterate through all predicted careers
             predicted_career_name = career_name_raw.strip()
             
-            career_info = None
-            
-            # 1. Try exact match
-            career_info_df = self.careers_df[self.careers_df['career_name'].str.lower() == predicted_career_name.lower()]
-            if not career_info_df.empty:
-                career_info = career_info_df.iloc[0]
-            else:
-                # 2. Try flexible (substring) match
-                for idx, row in self.careers_df.iterrows():
-                    if predicted_career_name.lower() in row['career_name'].lower() or row['career_name'].lower() in predicted_career_name.lower():
-                        career_info = row
-                        break
+            career_info = current_catalog.resolve_career(predicted_career_name)
             
             if career_info is not None:
                 career_reasoning = (
@@ -285,7 +392,7 @@ class Recommender:
                     "automation_risk": "N/A"
                 })
             else:
-                print(f"Warning: Predicted career '{predicted_career_name}' not found in career.csv even after flexible matching. Skipping.")
+                logger.warning("Predicted career '%s' not found in career.csv even after flexible matching.", predicted_career_name)
                 # Optionally, add a generic recommendation or skip
                 career_recommendations.append({
                     "name": predicted_career_name, # Use the predicted name
@@ -300,11 +407,13 @@ class Recommender:
         
         # Limit to top 5 career recommendations if more than 5 are generated
         career_recommendations = career_recommendations[:5]
+        _STAGE_CAREER_LOOKUP.observe(time.perf_counter() - stage_start)
 
         return {
             "average_points": average_points,
             "profile_rating": profile_rating,
-            "model_accuracy": self.metrics.get(self.chosen_course_model_name.lower().replace(" ", "_"), {}).get('accuracy', 0.0),
+            "model_accuracy": snapshot.course_model_accuracies.get(course_model_key, 0.0),
+            "course_model": course_model_key,
             "subject_grades_points": subject_grades_points,
             "courses": course_recommendations,
             "careers": career_recommendations
@@ -312,6 +421,6 @@ class Recommender:
 
     def get_similar_careers(self, student_input):
         # This method is now deprecated as career recommendations are generated by the model
-        print("Warning: get_similar_careers is deprecated and should not be called directly.")
+        logger.warning("get_similar_careers is deprecated and should not be called directly.")
         return []
 
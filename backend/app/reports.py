@@ -0,0 +1,328 @@
+"""Server-side recommendation reports (HTML or PDF).
+
+A report covers one recommendation set: the Recommendation rows saved by a single
+/recommend call, which share its server-generated set_id. collect_report() gathers the rows
+and their catalog details into a plain dict in the API process. The layout itself is
+CPU-bound and runs in a small process pool, as the profile image thumbnails do. Rendered
+reports are cached per process by (set, its rows, catalog version, format), bounded by
+REPORT_CACHE_MAX_BYTES; rows added to a set change the key, so a stale report is never served.
+
+iter_reports_zip() streams many reports as one zip archive. It keeps only
+REPORT_ZIP_PREFETCH renders in flight and never buffers the archive.
+"""
+import asyncio
+import html
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from io import BytesIO
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal
+
+REPORT_PROCESS_WORKERS = int(os.getenv("REPORT_PROCESS_WORKERS", 2))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# Reports rendered ahead of the one being written to a zip
+REPORT_ZIP_PREFETCH = 2 * REPORT_PROCESS_WORKERS
+
+REPORT_FORMATS = {
+    "html": ("text/html; charset=utf-8", ".html"),
+    "pdf": ("application/pdf", ".pdf"),
+}
+# Characters kept in file names (zip entries, Content-Disposition); anything else becomes "_"
+_UNSAFE_FILENAME_CHARACTERS = re.compile(r"[^A-Za-z0-9_-]")
+# Prefixes the recommender adds to catalog course names
+_COURSE_NAME_PREFIXES = ("bachelor of ", "diploma in ", "certificate in ")
+
+
+class ReportNotFound(Exception):
+    pass
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn keeps the workers small: they don't inherit the loaded models from the API process
+        _pool = ProcessPoolExecutor(max_workers=REPORT_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+# --- Collecting a report (API process) ---
+
+def _text(value) -> str:
+    return "N/A" if value is None else str(value)
+
+
+def _course_details(catalog, name: str) -> dict:
+    course = catalog.find_course(name)
+    lower = name.lower()
+    if course is None:
+        for prefix in _COURSE_NAME_PREFIXES:
+            if lower.startswith(prefix):
+                course = catalog.find_course(name[len(prefix):])
+                break
+    details = {"description": "N/A", "job_applicability": "N/A", "future_trends": "N/A", "automation_risk": "N/A"}
+    if course is not None:
+        details["description"] = _text(course["description"])
+        lower = str(course["course_name"]).lower()
+    metadata = catalog.lookup_course_metadata(lower)
+    if metadata is not None:
+        details["job_applicability"], details["future_trends"], details["automation_risk"] = (_text(value) for value in metadata)
+    return details
+
+
+def set_owner(db: Session, set_id: str):
+    """user_id of the recommendation set, or None if there is no such set."""
+    row = db.query(models.Recommendation.user_id).filter(models.Recommendation.set_id == set_id).first()
+    return row[0] if row else None
+
+
+def collect_report(db: Session, set_id: str, user_id: int, catalog) -> dict:
+    """The contents of a report, as plain data that can be sent to a worker process."""
+    rows = (
+        db.query(models.Recommendation)
+        .filter(models.Recommendation.set_id == set_id, models.Recommendation.user_id == user_id)
+        .order_by(models.Recommendation.id)
+        .all()
+    )
+    if not rows:
+        raise ReportNotFound(set_id)
+    owner = rows[0].owner
+    return {
+        "set_id": set_id,
+        "user_id": user_id,
+        # Identifies the rows the report was built from, for the cache key
+        "rows": (len(rows), rows[-1].id),
+        "student": owner.username if owner else None,
+        "school": owner.school_attended if owner else None,
+        "created_at": rows[0].created_at.isoformat(timespec="seconds") if rows[0].created_at else None,
+        "course_model": next((row.course_model for row in rows if row.course_model), None),
+        "catalog_version": catalog.version,
+        "courses": [
+            {"name": row.course_name, "type": row.course_type, **_course_details(catalog, row.course_name)}
+            for row in rows if row.course_name
+        ],
+        "careers": [
+            {"name": row.career_name, "description": _text(career["description"]) if career is not None else "N/A"}
+            for row, career in ((row, catalog.find_career(row.career_name)) for row in rows if row.career_name)
+        ],
+    }
+
+
+def load_report(set_id: str, user_id: int, catalog) -> dict:
+    """collect_report() in its own session, for use outside a request (e.g. while streaming a zip)."""
+    db = SessionLocal()
+    try:
+        return collect_report(db, set_id, user_id, catalog)
+    finally:
+        db.close()
+
+
+def list_sets(db: Session, user_ids) -> list:
+    """{"set_id", "user_id", "created_at"} of every recommendation set of these users, oldest first."""
+    created_at = func.min(models.Recommendation.created_at).label("created_at")
+    rows = (
+        db.query(models.Recommendation.set_id, models.Recommendation.user_id, created_at)
+        .filter(models.Recommendation.user_id.in_(user_ids), models.Recommendation.set_id.isnot(None))
+        .group_by(models.Recommendation.set_id, models.Recommendation.user_id)
+        .order_by(created_at, models.Recommendation.set_id)
+        .all()
+    )
+    return [{"set_id": set_id, "user_id": user_id, "created_at": created} for set_id, user_id, created in rows]
+
+
+# --- Rendering (worker processes) ---
+
+def _render_html(report: dict) -> bytes:
+    e = lambda value: html.escape(_text(value))
+    parts = [
+        "<!DOCTYPE html><html><head><meta charset=\"utf-8\">",
+        f"<title>Guidance report for {e(report['student'])}</title>",
+        "<style>body{font-family:sans-serif;max-width:800px;margin:2em auto;color:#222}"
+        "h1{font-size:1.6em}h2{border-bottom:1px solid #ccc;padding-bottom:.2em}"
+        "section{margin-bottom:1.2em;page-break-inside:avoid}dt{font-weight:bold}dd{margin:0 0 .5em 0}"
+        ".meta{color:#666}</style></head><body>",
+        "<h1>Personalized Guidance Report</h1>",
+        f"<p class=\"meta\">Student: <strong>{e(report['student'])}</strong>"
+        + (f" | School: {e(report['school'])}" if report["school"] else "")
+        + f" | Generated from recommendations of {e(report['created_at'])}</p>",
+        "<h2>Recommended courses</h2>",
+    ]
+    for course in report["courses"]:
+        parts.append(
+            f"<section><h3>{e(course['name'])}</h3><p class=\"meta\">{e(course['type'])}</p><p>{e(course['description'])}</p>"
+            f"<dl><dt>Job applicability</dt><dd>{e(course['job_applicability'])}</dd>"
+            f"<dt>Future trends</dt><dd>{e(course['future_trends'])}</dd>"
+            f"<dt>Automation risk</dt><dd>{e(course['automation_risk'])}</dd></dl></section>"
+        )
+    parts.append("<h2>Recommended careers</h2>")
+    for career in report["careers"]:
+        parts.append(f"<section><h3>{e(career['name'])}</h3><p>{e(career['description'])}</p></section>")
+    parts.append(f"<p class=\"meta\">Course model: {e(report['course_model'])} | Report {e(report['set_id'])}</p></body></html>")
+    return "".join(parts).encode()
+
+
+def _render_pdf(report: dict) -> bytes:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import KeepTogether, Paragraph, SimpleDocTemplate, Spacer
+
+    styles = getSampleStyleSheet()
+    e = lambda value: html.escape(_text(value))
+    story = [
+        Paragraph("Personalized Guidance Report", styles["Title"]),
+        Paragraph(
+            f"Student: <b>{e(report['student'])}</b>" + (f" | School: {e(report['school'])}" if report["school"] else "")
+            + f" | Generated from recommendations of {e(report['created_at'])}",
+            styles["Normal"],
+        ),
+        Spacer(1, 12),
+        Paragraph("Recommended courses", styles["Heading1"]),
+    ]
+    for course in report["courses"]:
+        story.append(KeepTogether([
+            Paragraph(e(course["name"]), styles["Heading2"]),
+            Paragraph(f"<i>{e(course['type'])}</i>", styles["Normal"]),
+            Paragraph(e(course["description"]), styles["BodyText"]),
+            Paragraph(f"<b>Job applicability:</b> {e(course['job_applicability'])}", styles["BodyText"]),
+            Paragraph(f"<b>Future trends:</b> {e(course['future_trends'])}", styles["BodyText"]),
+            Paragraph(f"<b>Automation risk:</b> {e(course['automation_risk'])}", styles["BodyText"]),
+        ]))
+    story.append(Paragraph("Recommended careers", styles["Heading1"]))
+    for career in report["careers"]:
+        story.append(KeepTogether([
+            Paragraph(e(career["name"]), styles["Heading2"]),
+            Paragraph(e(career["description"]), styles["BodyText"]),
+        ]))
+    story += [Spacer(1, 12), Paragraph(f"Course model: {e(report['course_model'])} | Report {e(report['set_id'])}", styles["Italic"])]
+
+    buffer = BytesIO()
+    # invariant=1 leaves out the creation date, so the same report renders to the same bytes
+    SimpleDocTemplate(buffer, pagesize=A4, title=f"Guidance report for {_text(report['student'])}", invariant=1).build(story)
+    return buffer.getvalue()
+
+
+def render(report: dict, report_format: str) -> bytes:
+    """Runs in a worker process."""
+    return _render_pdf(report) if report_format == "pdf" else _render_html(report)
+
+
+# --- Cache and API-process entry points ---
+
+class ReportCache:
+    def __init__(self, max_bytes: int = REPORT_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self._bytes -= len(self._items.pop(key))
+            self._items[key] = body
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._bytes -= len(evicted)
+
+
+async def render_report(report: dict, report_format: str, cache: ReportCache) -> bytes:
+    key = (report["set_id"], report["user_id"], report["rows"], report["catalog_version"], report_format)
+    body = cache.get(key)
+    if body is None:
+        loop = asyncio.get_running_loop()
+        body = await loop.run_in_executor(_get_pool(), render, report, report_format)
+        cache.put(key, body)
+    return body
+
+
+def safe_filename(text) -> str:
+    return _UNSAFE_FILENAME_CHARACTERS.sub("_", _text(text))
+
+
+def report_filename(report: dict, report_format: str) -> str:
+    return f"{safe_filename(report['student'])}-{safe_filename(report['set_id'])}{REPORT_FORMATS[report_format][1]}"
+
+
+class _ZipChunks:
+    """Write-only file object for ZipFile; the written bytes are taken out as chunks."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data):
+        self._buffer += data
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        chunk = bytes(self._buffer)
+        self._buffer.clear()
+        return chunk
+
+
+async def iter_reports_zip(reports, report_format: str, cache: ReportCache):
+    """Streams a zip with one rendered report per item of the async iterable `reports`."""
+    out = _ZipChunks()
+    pending = []
+    seen_names = set()
+    # The zip is written without seeking, so entries use data descriptors
+    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        async def write_next():
+            report, rendering = pending.pop(0)
+            name = report_filename(report, report_format)
+            if name in seen_names:
+                name = f"{len(seen_names)}-{name}"
+            seen_names.add(name)
+            info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            archive.writestr(info, await rendering)
+            return out.take()
+
+        try:
+            async for report in reports:
+                pending.append((report, asyncio.ensure_future(render_report(report, report_format, cache))))
+                if len(pending) > REPORT_ZIP_PREFETCH:
+                    yield await write_next()
+            while pending:
+                yield await write_next()
+        finally:
+            # The client went away: drop the renders nobody will read
+            for _, rendering in pending:
+                rendering.cancel()
+    yield out.take()
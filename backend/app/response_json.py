@@ -0,0 +1,106 @@
+"""Fast JSON rendering of /recommend responses.
+
+FastAPI validates the recommend() dict against schemas.Recommendations and then serializes
+it. This renderer writes the same bytes directly with orjson. The catalog-derived parts of
+each recommendation (name and type, description, metadata texts) are encoded once and cached
+as JSON fragments. Only the per-request values are encoded per request: IDs, scores, the
+course reasoning and the profile fields.
+
+Fields are written in the schema's order, omitted fields are rendered as in the schema
+(course_type is null), and extra keys such as skills_tags are dropped, as validation does.
+Set FAST_RECOMMEND_RESPONSES=false to go back to FastAPI's serialization.
+"""
+import os
+import threading
+
+import orjson
+
+FAST_RECOMMEND_RESPONSES = os.getenv("FAST_RECOMMEND_RESPONSES", "true").lower() not in ("0", "false", "no")
+# Bounds the fragment cache; it is also emptied whenever the catalog version changes
+FRAGMENT_CACHE_MAX_ITEMS = int(os.getenv("FRAGMENT_CACHE_MAX_ITEMS", 50000))
+
+# orjson and pydantic agree on every float below this; above it their exponent formats differ
+_ORJSON_FLOAT_LIMIT = 1e16
+
+
+def _float(value) -> bytes:
+    value = float(value)
+    if abs(value) >= _ORJSON_FLOAT_LIMIT:
+        # Same repr as pydantic ("1e+16"); not reachable for scores, points or accuracies
+        return repr(value).encode()
+    return orjson.dumps(value)
+
+
+def _optional_str(value) -> bytes:
+    return b"null" if value is None else orjson.dumps(str(value))
+
+
+class RecommendationsRenderer:
+    def __init__(self, max_items: int = FRAGMENT_CACHE_MAX_ITEMS):
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._catalog_version = None
+        self._fragments = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fragment(self, key, build) -> bytes:
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self.hits += 1
+            return fragment
+        self.misses += 1
+        fragment = build()
+        with self._lock:
+            if len(self._fragments) >= self.max_items:
+                self._fragments.clear()
+            self._fragments[key] = fragment
+        return fragment
+
+    def _use_catalog_version(self, catalog_version):
+        if catalog_version != self._catalog_version:
+            with self._lock:
+                self._fragments = {}
+                self._catalog_version = catalog_version
+
+    def _item(self, item) -> bytes:
+        name, kind, course_type = item["name"], item["type"], item.get("course_type")
+        head = self._fragment(
+            ("head", name, kind, course_type),
+            lambda: b',"name":' + orjson.dumps(str(name)) + b',"type":' + orjson.dumps(str(kind))
+            + b',"course_type":' + _optional_str(course_type) + b',"similarity_score":',
+        )
+        description = item["description"]
+        middle = self._fragment(("description", description), lambda: b',"description":' + orjson.dumps(str(description)) + b',"reasoning":')
+        reasoning = item["reasoning"]
+        reasoning_json = self._fragment(("text", reasoning), lambda: orjson.dumps(str(reasoning)))
+        metadata = (item["job_applicability"], item["future_trends"], item["automation_risk"])
+        tail = self._fragment(
+            ("metadata",) + metadata,
+            lambda: b',"job_applicability":' + orjson.dumps(str(metadata[0])) + b',"future_trends":' + orjson.dumps(str(metadata[1]))
+            + b',"automation_risk":' + orjson.dumps(str(metadata[2])) + b'}',
+        )
+        item_id = item.get("id")
+        return b''.join((
+            b'{"id":', b"null" if item_id is None else str(int(item_id)).encode(),
+            head, _float(item["similarity_score"]), middle, reasoning_json, tail,
+        ))
+
+    def render(self, recommendations: dict, catalog_version=None) -> bytes:
+        """Returns the response body FastAPI would produce for this dict with response_model=Recommendations."""
+        self._use_catalog_version(catalog_version)
+        grades = b",".join(
+            b'{"subject":' + orjson.dumps(str(entry["subject"])) + b',"grade":' + orjson.dumps(str(entry["grade"]))
+            + b',"points":' + str(int(entry["points"])).encode() + b'}'
+            for entry in recommendations["subject_grades_points"]
+        )
+        return b''.join((
+            b'{"average_points":', _float(recommendations["average_points"]),
+            b',"profile_rating":', orjson.dumps(str(recommendations["profile_rating"])),
+            b',"model_accuracy":', _float(recommendations["model_accuracy"]),
+            b',"course_model":', _optional_str(recommendations.get("course_model")),
+            b',"subject_grades_points":[', grades,
+            b'],"courses":[', b",".join(self._item(item) for item in recommendations["courses"]),
+            b'],"careers":[', b",".join(self._item(item) for item in recommendations["careers"]),
+            b']}',
+        ))
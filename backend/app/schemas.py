@@ -1,7 +1,9 @@
 from pydantic import BaseModel, validator
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
+from .models import Student
+
 class SubjectGradePoints(BaseModel):
     subject: str
     grade: str
@@ -23,6 +25,7 @@ class Recommendations(BaseModel):
     average_points: float
     profile_rating: str
     model_accuracy: float
+    course_model: Optional[str] = None
     subject_grades_points: List[SubjectGradePoints]
     courses: List[Recommendation]
     careers: List[Recommendation]
@@ -94,3 +97,105 @@ class ForgotPasswordRequest(BaseModel):
 class ResetPasswordRequest(BaseModel):
     token: str
     new_password: str
+
+class ModelMetrics(BaseModel):
+    accuracy: float
+    precision: float
+    recall: float
+    f1_score: float
+
+class ModelRunMetrics(ModelMetrics):
+    training_time_seconds: Optional[float] = None
+
+class ModelMetricsRun(BaseModel):
+    model_version: Optional[str] = None
+    trained_at: datetime
+    models: Dict[str, ModelRunMetrics]
+
+class GradeRange(BaseModel):
+    low: str = "E"
+    high: str = "A"
+
+class WhatIfRequest(BaseModel):
+    student: Student
+    grades: Dict[str, GradeRange] = {}  # Subject -> grades to try (every grade from low to high)
+    aptitudes: Dict[str, List[int]] = {}  # e.g. {"logicalMathematical": [10, 15]}
+    add_interests: List[str] = []
+    remove_interests: List[str] = []
+    add_skills: List[str] = []
+    remove_skills: List[str] = []
+    combine: str = "each"  # "each": one change per scenario, "grid": every combination
+    top_k: int = 5
+
+class RankedItem(BaseModel):
+    name: str
+    probability: float
+    rank: int
+    previous_rank: Optional[int] = None  # Rank in the base profile
+    probability_change: Optional[float] = None
+
+class WhatIfChanges(BaseModel):
+    grades: Dict[str, str] = {}
+    aptitudes: Dict[str, int] = {}
+    added_interests: List[str] = []
+    removed_interests: List[str] = []
+    added_skills: List[str] = []
+    removed_skills: List[str] = []
+
+class WhatIfScenario(BaseModel):
+    changes: WhatIfChanges
+    courses: List[RankedItem]
+    careers: List[RankedItem]
+    top_course_changed: bool
+    top_career_changed: bool
+
+class WhatIfBase(BaseModel):
+    courses: List[RankedItem]
+    careers: List[RankedItem]
+
+class WhatIfResponse(BaseModel):
+    course_model: str
+    rows_scored: int
+    base: WhatIfBase
+    scenarios: List[WhatIfScenario]
+
+class TrainingJob(BaseModel):
+    id: int
+    status: str
+    requested_by: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    progress: float = 0.0
+    stage: Optional[str] = None
+    model_version: Optional[str] = None
+    exit_code: Optional[int] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    queue_position: Optional[int] = None  # Jobs ahead of this one, while it is queued
+    log_tail: List[str] = []
+
+    class Config:
+        from_attributes = True
+
+class CohortJob(BaseModel):
+    id: int
+    status: str
+    requested_by: Optional[str] = None
+    filename: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    progress: float = 0.0  # Share of the rows processed, 0 to 1
+    rows_total: int = 0
+    rows_processed: int = 0
+    rows_scored: int = 0
+    rows_invalid: int = 0
+    course_model: Optional[str] = None
+    model_version: Optional[str] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    queue_position: Optional[int] = None  # Jobs ahead of this one, while it is queued
+
+    class Config:
+        from_attributes = True
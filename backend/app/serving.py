@@ -0,0 +1,252 @@
+"""Serving policy for the course models: which loaded pipeline answers a request, and which shadow it.
+
+By default the model with the best offline accuracy serves every request (the old behaviour).
+COURSE_MODEL_SPLIT splits traffic across models by weight, e.g.
+"xgboost_course=80,random_forest_course=20". Users are assigned by a hash of their ID, so a
+user keeps getting the same model. COURSE_MODEL_ENSEMBLE=true serves the weighted blend of all
+three models (app/ensemble.py) by default; "ensemble" can also be given a share of the split.
+With COURSE_MODEL_SHADOW=true, the models that did not serve a request score the same input
+on a background thread and are compared with the served ranking; the response never waits
+for them.
+
+Per-model latency and shadow agreement are exported on /metrics and summarised by
+ServingPolicy.stats() for the /model-serving/stats/ endpoint.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from . import telemetry
+
+logger = logging.getLogger(__name__)
+
+COURSE_MODEL_SPLIT = os.getenv("COURSE_MODEL_SPLIT", "")
+COURSE_MODEL_SPLIT_SALT = os.getenv("COURSE_MODEL_SPLIT_SALT", "course-model-split")
+COURSE_MODEL_ENSEMBLE = os.getenv("COURSE_MODEL_ENSEMBLE", "false").lower() in ("1", "true", "yes")
+COURSE_MODEL_SHADOW = os.getenv("COURSE_MODEL_SHADOW", "false").lower() in ("1", "true", "yes")
+# Fraction of requests that are shadow scored, to bound the extra CPU
+COURSE_MODEL_SHADOW_SAMPLE_RATE = float(os.getenv("COURSE_MODEL_SHADOW_SAMPLE_RATE", 1.0))
+# Shadow jobs waiting beyond this are dropped instead of queued
+COURSE_MODEL_SHADOW_MAX_PENDING = int(os.getenv("COURSE_MODEL_SHADOW_MAX_PENDING", 100))
+COURSE_MODEL_SHADOW_WORKERS = int(os.getenv("COURSE_MODEL_SHADOW_WORKERS", 1))
+
+TOP_K = 5
+_LATENCY_WINDOW = 1000
+
+COURSE_MODEL_PREDICT_SECONDS = telemetry.histogram(
+    "course_model_predict_seconds",
+    "predict_proba latency of each course model, when serving or shadowing.",
+    labelnames=("model", "role"),
+)
+COURSE_MODEL_SHADOW_COMPARISONS = telemetry.counter(
+    "course_model_shadow_comparisons_total",
+    "Shadow scorings compared with the served ranking.",
+    labelnames=("model",),
+)
+COURSE_MODEL_SHADOW_TOP1_AGREEMENTS = telemetry.counter(
+    "course_model_shadow_top1_agreements_total",
+    "Shadow scorings whose top course matched the served top course.",
+    labelnames=("model",),
+)
+COURSE_MODEL_SHADOW_DROPPED = telemetry.counter(
+    "course_model_shadow_dropped_total",
+    "Shadow scorings skipped because the shadow queue was full.",
+)
+
+
+def parse_split(value: str) -> dict:
+    """Parses "model=weight,model=weight" into {model: weight}, ignoring non-positive weights."""
+    split = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if not name:
+            continue
+        try:
+            weight = float(weight) if weight.strip() else 1.0
+        except ValueError:
+            raise ValueError(f"Invalid weight for {name!r} in COURSE_MODEL_SPLIT: {weight!r}")
+        if weight > 0:
+            split[name] = weight
+    return split
+
+
+def score(pipeline, frame, features=None):
+    """predict_proba on a model input frame, or directly on preprocessed rows when `features` is given."""
+    if features is None:
+        return pipeline.predict_proba(frame)
+    if hasattr(pipeline, "predict_proba_features"):
+        return pipeline.predict_proba_features(features)
+    return pipeline[-1].predict_proba(features)
+
+
+class _ModelStats:
+    __slots__ = ("served", "shadowed", "latencies", "comparisons", "top1_agreements", "topk_overlap_sum")
+
+    def __init__(self):
+        self.served = 0
+        self.shadowed = 0
+        self.latencies = deque(maxlen=_LATENCY_WINDOW)
+        self.comparisons = 0
+        self.top1_agreements = 0
+        self.topk_overlap_sum = 0.0
+
+    def summary(self) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return None
+            return 1000 * latencies[min(len(latencies) - 1, int(fraction * len(latencies)))]
+
+        return {
+            "served": self.served,
+            "shadowed": self.shadowed,
+            "latency_ms": {
+                "window": len(latencies),
+                "mean": 1000 * sum(latencies) / len(latencies) if latencies else None,
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+            },
+            "shadow_comparisons": self.comparisons,
+            "top1_agreement": self.top1_agreements / self.comparisons if self.comparisons else None,
+            f"top{TOP_K}_overlap": self.topk_overlap_sum / self.comparisons if self.comparisons else None,
+        }
+
+
+class ServingPolicy:
+    def __init__(self, split=None, shadow=False, shadow_sample_rate=1.0, max_pending=100, shadow_workers=1, salt=COURSE_MODEL_SPLIT_SALT, ensemble=False):
+        self.split = dict(split or {})
+        self.ensemble = ensemble
+        self.shadow = shadow
+        self.shadow_sample_rate = shadow_sample_rate
+        self.max_pending = max_pending
+        self.shadow_workers = shadow_workers
+        self.salt = salt
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._pending = 0
+        # Created on first use, so a gunicorn master never forks with live threads
+        self._executor = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            split=parse_split(COURSE_MODEL_SPLIT),
+            shadow=COURSE_MODEL_SHADOW,
+            shadow_sample_rate=COURSE_MODEL_SHADOW_SAMPLE_RATE,
+            max_pending=COURSE_MODEL_SHADOW_MAX_PENDING,
+            shadow_workers=COURSE_MODEL_SHADOW_WORKERS,
+            ensemble=COURSE_MODEL_ENSEMBLE,
+        )
+
+    @property
+    def ensemble_enabled(self) -> bool:
+        """Whether the ensemble can serve: by default, or for part of the traffic split."""
+        return self.ensemble or "ensemble" in self.split
+
+    def _bucket(self, key: str) -> float:
+        digest = hashlib.blake2b(f"{self.salt}:{key}".encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") / 2 ** 64
+
+    def choose(self, user_id, available, default: str) -> str:
+        """Returns the model that serves this user: sticky by user ID when a split is configured."""
+        weights = [(name, weight) for name, weight in self.split.items() if name in available]
+        if not weights or user_id is None:
+            return default
+        point = self._bucket(str(user_id)) * sum(weight for _, weight in weights)
+        for name, weight in weights:
+            point -= weight
+            if point < 0:
+                return name
+        return weights[-1][0]
+
+    def _model_stats(self, name) -> _ModelStats:
+        stats = self._stats.get(name)
+        if stats is None:
+            with self._lock:
+                stats = self._stats.setdefault(name, _ModelStats())
+        return stats
+
+    def predict_proba(self, name, pipeline, frame, features=None):
+        """Scores the request with the serving model and records its latency."""
+        start_time = time.perf_counter()
+        probabilities = score(pipeline, frame, features)
+        elapsed = time.perf_counter() - start_time
+        COURSE_MODEL_PREDICT_SECONDS.labels(model=name, role="serve").observe(elapsed)
+        stats = self._model_stats(name)
+        with self._lock:
+            stats.served += 1
+            stats.latencies.append(elapsed)
+        return probabilities
+
+    def submit_shadow(self, frame, serving_name, served_classes, pipelines: dict, features=None):
+        """Queues the other models to score `frame`; returns immediately."""
+        if not self.shadow or len(pipelines) < 2:
+            return
+        if self.shadow_sample_rate < 1.0 and np.random.random() >= self.shadow_sample_rate:
+            return
+        with self._lock:
+            if self._pending >= self.max_pending:
+                COURSE_MODEL_SHADOW_DROPPED.inc()
+                return
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.shadow_workers, thread_name_prefix="shadow-scoring")
+            executor = self._executor
+        shadows = {name: pipeline for name, pipeline in pipelines.items() if name != serving_name}
+        executor.submit(self._score_shadows, frame, features, list(served_classes), shadows)
+
+    def _score_shadows(self, frame, features, served_classes, shadows):
+        try:
+            for name, pipeline in shadows.items():
+                start_time = time.perf_counter()
+                probabilities = score(pipeline, frame, features)[0]
+                elapsed = time.perf_counter() - start_time
+                COURSE_MODEL_PREDICT_SECONDS.labels(model=name, role="shadow").observe(elapsed)
+
+                classes = pipeline.classes_
+                shadow_classes = [classes[i] for i in np.argsort(probabilities)[::-1][:TOP_K]]
+                top1_agrees = bool(shadow_classes[0] == served_classes[0])
+                overlap = len(set(shadow_classes) & set(served_classes)) / TOP_K
+
+                COURSE_MODEL_SHADOW_COMPARISONS.labels(model=name).inc()
+                if top1_agrees:
+                    COURSE_MODEL_SHADOW_TOP1_AGREEMENTS.labels(model=name).inc()
+                stats = self._model_stats(name)
+                with self._lock:
+                    stats.shadowed += 1
+                    stats.latencies.append(elapsed)
+                    stats.comparisons += 1
+                    stats.top1_agreements += top1_agrees
+                    stats.topk_overlap_sum += overlap
+        except Exception as e:
+            logger.exception("Shadow scoring failed: %s", e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            models = {name: stats.summary() for name, stats in sorted(self._stats.items())}
+            pending = self._pending
+        return {
+            "split": self.split,
+            "ensemble": self.ensemble,
+            "shadow": self.shadow,
+            "shadow_sample_rate": self.shadow_sample_rate,
+            "shadow_pending": pending,
+            "models": models,
+        }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,59 @@
+"""Single-flight coalescing of identical concurrent calls.
+
+When a class submits at once, many /recommend requests carry the same profile within
+milliseconds. The first request for a key runs the computation; requests with the same key
+that arrive while it is running wait for its result instead of running it again. Nothing is
+cached afterwards: a request arriving after the computation finished starts a new one.
+"""
+import hashlib
+import json
+import threading
+from concurrent.futures import Future
+
+from . import telemetry
+
+SINGLE_FLIGHT_CALLS = telemetry.counter(
+    "recommend_single_flight_total",
+    "Recommendation computations by outcome: computed by this request, or coalesced onto a concurrent identical one.",
+    labelnames=("result",),
+)
+
+
+def profile_key(student, *versions) -> str:
+    """Canonical hash of a Student profile and the versions of everything its result depends on."""
+    payload = json.dumps([student.model_dump(), *versions], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def pending(self) -> int:
+        return len(self._calls)
+
+    def do(self, key, function):
+        """Returns (result, coalesced). Concurrent callers with the same key share one call of `function`;
+        its exception, if any, is raised in every one of them."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+        if not leader:
+            SINGLE_FLIGHT_CALLS.labels(result="coalesced").inc()
+            return call.result(), True
+
+        SINGLE_FLIGHT_CALLS.labels(result="computed").inc()
+        try:
+            result = function()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return result, False
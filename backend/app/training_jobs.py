@@ -0,0 +1,290 @@
+"""Training jobs: train.py runs requested through /admin/train or at server start.
+
+Jobs are rows in training_jobs, so any worker can submit one or report its status. A single
+TrainingJobRunner executes them, one at a time in submission order, in the app process or,
+under gunicorn, in the job runner process (app/job_runners.py):
+
+- train.py runs under asyncio.create_subprocess_exec in its own process group, launched
+  through nice (TRAINING_NICE) and, with TRAINING_CPU_SECONDS, prlimit, so the limits hold
+  from its first instruction; BLAS/OpenMP threads can be capped too;
+- its output is streamed line by line to TRAINING_LOG_DIR/<id>.log, and the stage lines it
+  prints advance the job's progress;
+- a cancellation request (a flag on the row) or TRAINING_TIMEOUT_SECONDS stops the whole
+  process group: SIGTERM, then SIGKILL after TRAINING_KILL_GRACE_SECONDS.
+
+A finished run is picked up by the model watcher (app/model_artifacts.py) like any other.
+"""
+import asyncio
+import logging
+import os
+import re
+import signal
+import sys
+import time
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from . import models, telemetry
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+TRAINING_LOG_DIR = os.getenv("TRAINING_LOG_DIR", "logs/training")
+TRAINING_TIMEOUT_SECONDS = int(os.getenv("TRAINING_TIMEOUT_SECONDS", 3600))
+TRAINING_NICE = int(os.getenv("TRAINING_NICE", 10))
+# 0 leaves the limit off / the libraries' default thread counts
+TRAINING_CPU_SECONDS = int(os.getenv("TRAINING_CPU_SECONDS", 0))
+TRAINING_CPU_THREADS = int(os.getenv("TRAINING_CPU_THREADS", 0))
+TRAINING_QUEUE_MAX_JOBS = int(os.getenv("TRAINING_QUEUE_MAX_JOBS", 5))
+# How often the runner looks for new jobs and, during a run, for a cancellation request
+TRAINING_POLL_SECONDS = 1.0
+TRAINING_KILL_GRACE_SECONDS = 10
+
+TRAIN_COMMAND = [sys.executable, "train.py"]
+
+
+def limited_command(command) -> list:
+    """`command` run at TRAINING_NICE priority and, if set, under the TRAINING_CPU_SECONDS limit."""
+    prefix = ["nice", "-n", str(TRAINING_NICE)]
+    if TRAINING_CPU_SECONDS:
+        # SIGXCPU at the soft limit; at an equal hard limit the kernel would send SIGKILL instead.
+        # The hard limit only stops a run that ignores SIGXCPU, and no core file is written.
+        cpu_limit = f"{TRAINING_CPU_SECONDS}:{TRAINING_CPU_SECONDS + TRAINING_KILL_GRACE_SECONDS}"
+        prefix = ["prlimit", f"--cpu={cpu_limit}", "--core=0", "--", *prefix]
+    return prefix + list(command)
+
+
+# Lines train.py prints as it reaches each stage, in order; progress is the share reached
+TRAINING_STAGES = (
+    ("Starting model training process", "loading data"),
+    ("Training the Random Forest course model", "training random forest"),
+    ("Training the XGBoost course model", "training xgboost"),
+    ("Training the SVM course model", "training svm"),
+    ("Training the Career recommendation model", "training career model"),
+    ("Random Forest Course - Accuracy", "evaluating"),
+    ("Model metrics successfully saved to the database", "publishing models"),
+    ("Model manifest for version", "published"),
+)
+_MODEL_VERSION_PATTERN = re.compile(r"model version ([\w-]+)")
+
+# training_runs_total keeps its original labels for the two outcomes it always had
+_RUN_OUTCOME_LABELS = {"succeeded": "success", "failed": "failure"}
+
+
+class TrainingQueueFull(Exception):
+    pass
+
+
+def submit(db: Session, requested_by: Optional[str] = None) -> models.TrainingJob:
+    queued = db.query(models.TrainingJob).filter(models.TrainingJob.status == "queued").count()
+    if queued >= TRAINING_QUEUE_MAX_JOBS:
+        raise TrainingQueueFull(f"{queued} training jobs are already queued")
+    job = models.TrainingJob(status="queued", requested_by=requested_by, progress=0.0, cancel_requested=False)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def cancel(db: Session, job: models.TrainingJob) -> models.TrainingJob:
+    """Cancels a queued job at once; a running one is stopped by the runner within TRAINING_POLL_SECONDS."""
+    # Conditional updates: the runner may claim the job between the caller's read and this write
+    jobs = db.query(models.TrainingJob).filter(models.TrainingJob.id == job.id)
+    cancelled = jobs.filter(models.TrainingJob.status == "queued").update(
+        {"status": "cancelled", "finished_at": datetime.utcnow()}, synchronize_session=False)
+    if not cancelled:
+        jobs.filter(models.TrainingJob.status == "running").update({"cancel_requested": True}, synchronize_session=False)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def log_tail(log_path: Optional[str], lines: int = 20) -> list:
+    if not log_path:
+        return []
+    try:
+        with open(log_path, errors="replace") as f:
+            return [line.rstrip("\n") for line in deque(f, maxlen=lines)]
+    except FileNotFoundError:
+        return []
+
+
+def describe(db: Session, job: models.TrainingJob) -> dict:
+    """The job's row plus its place in the queue and the end of its log."""
+    description = {column.name: getattr(job, column.name) for column in job.__table__.columns}
+    description["queue_position"] = None
+    if job.status == "queued":
+        description["queue_position"] = db.query(models.TrainingJob).filter(
+            (models.TrainingJob.status == "running")
+            | ((models.TrainingJob.status == "queued") & (models.TrainingJob.id < job.id))
+        ).count()
+    description["log_tail"] = log_tail(job.log_path)
+    return description
+
+
+class TrainingJobRunner:
+    def __init__(self, command=TRAIN_COMMAND, cwd: str = ".", log_dir: str = TRAINING_LOG_DIR):
+        self.command = limited_command(command)
+        self.cwd = cwd  # train.py is in the backend directory
+        self.log_dir = log_dir
+
+    # --- Database access, run on worker threads ---
+
+    def _update(self, job_id: int, **fields):
+        db = SessionLocal()
+        try:
+            db.query(models.TrainingJob).filter(models.TrainingJob.id == job_id).update(fields)
+            db.commit()
+        finally:
+            db.close()
+
+    def _cancel_requested(self, job_id: int) -> bool:
+        db = SessionLocal()
+        try:
+            return bool(db.query(models.TrainingJob.cancel_requested).filter(models.TrainingJob.id == job_id).scalar())
+        finally:
+            db.close()
+
+    def _claim_next(self) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            while True:
+                job_id = db.query(models.TrainingJob.id).filter(models.TrainingJob.status == "queued").order_by(models.TrainingJob.id).limit(1).scalar()
+                if job_id is None:
+                    return None
+                # Only if it is still queued: a cancel request may have come in since the read
+                claimed = db.query(models.TrainingJob).filter(models.TrainingJob.id == job_id, models.TrainingJob.status == "queued").update({
+                    "status": "running", "started_at": datetime.utcnow(), "log_path": os.path.join(self.log_dir, f"{job_id}.log"),
+                }, synchronize_session=False)
+                db.commit()
+                if claimed:
+                    return job_id
+        finally:
+            db.close()
+
+    def _recover(self):
+        """Fails the runs a previous server process left behind."""
+        db = SessionLocal()
+        try:
+            db.query(models.TrainingJob).filter(models.TrainingJob.status == "running").update({
+                "status": "failed", "finished_at": datetime.utcnow(),
+                "error": "interrupted: the server stopped during the run",
+            })
+            db.commit()
+        finally:
+            db.close()
+
+    # --- Running train.py ---
+
+    async def run_forever(self):
+        await asyncio.to_thread(self._recover)
+        while True:
+            try:
+                job_id = await asyncio.to_thread(self._claim_next)
+            except Exception as e:
+                logger.exception("Error reading the training job queue: %s", e)
+                job_id = None
+            if job_id is None:
+                await asyncio.sleep(TRAINING_POLL_SECONDS)
+                continue
+            await self.run_job(job_id)
+
+    async def _stream_output(self, job_id: int, stream, log_path: str):
+        stage_index = -1
+        with open(log_path, "w", buffering=1) as log:
+            while True:
+                line = await stream.readline()
+                if not line:
+                    return
+                text = line.decode(errors="replace")
+                log.write(text)
+                for index in range(stage_index + 1, len(TRAINING_STAGES)):
+                    prefix, stage = TRAINING_STAGES[index]
+                    if text.startswith(prefix):
+                        stage_index = index
+                        fields = {"stage": stage, "progress": (index + 1) / len(TRAINING_STAGES)}
+                        version = _MODEL_VERSION_PATTERN.search(text)
+                        if version:
+                            fields["model_version"] = version.group(1)
+                        await asyncio.to_thread(self._update, job_id, **fields)
+                        break
+
+    async def _stop(self, process) -> int:
+        """Terminates train.py and everything it started, and returns its exit code."""
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            try:
+                os.killpg(process.pid, sig)
+            except ProcessLookupError:
+                break
+            try:
+                return await asyncio.wait_for(process.wait(), TRAINING_KILL_GRACE_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        return await process.wait()
+
+    async def run_job(self, job_id: int):
+        log_path = os.path.join(self.log_dir, f"{job_id}.log")
+        os.makedirs(self.log_dir, exist_ok=True)
+        env = dict(os.environ, PYTHONUNBUFFERED="1")
+        if TRAINING_CPU_THREADS:
+            for variable in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+                env[variable] = str(TRAINING_CPU_THREADS)
+
+        logger.info("Starting training job %d (train.py)...", job_id)
+        start_time = time.perf_counter()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command, cwd=self.cwd, env=env, start_new_session=True, limit=1 << 20,
+                stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT,
+            )
+        except OSError as e:
+            logger.error("Could not start train.py for training job %d: %s", job_id, e)
+            await asyncio.to_thread(self._update, job_id, status="failed", finished_at=datetime.utcnow(), error=str(e))
+            return
+        reader = asyncio.create_task(self._stream_output(job_id, process.stdout, log_path))
+
+        status, exit_code, error = None, None, None
+        deadline = time.monotonic() + TRAINING_TIMEOUT_SECONDS
+        try:
+            while exit_code is None:
+                try:
+                    exit_code = await asyncio.wait_for(process.wait(), TRAINING_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    if time.monotonic() >= deadline:
+                        status, error = "timed_out", f"stopped after the {TRAINING_TIMEOUT_SECONDS}s timeout"
+                    elif await asyncio.to_thread(self._cancel_requested, job_id):
+                        status, error = "cancelled", "cancelled on request"
+                    if status is not None:
+                        exit_code = await self._stop(process)
+            await reader
+        except asyncio.CancelledError:
+            # The server is shutting down: do not leave train.py running unsupervised
+            reader.cancel()
+            await self._stop(process)
+            await asyncio.to_thread(self._update, job_id, status="failed", finished_at=datetime.utcnow(), exit_code=process.returncode,
+                                    error="interrupted: the server stopped during the run")
+            raise
+
+        if status is None:
+            status = "succeeded" if exit_code == 0 else "failed"
+            if exit_code == -signal.SIGXCPU:
+                error = f"stopped at the {TRAINING_CPU_SECONDS}s CPU time limit"
+            elif exit_code != 0:
+                error = f"train.py exited with code {exit_code}"
+        elapsed = time.perf_counter() - start_time
+        fields = {"status": status, "finished_at": datetime.utcnow(), "exit_code": exit_code, "error": error}
+        if status == "succeeded":
+            fields["progress"] = 1.0
+        await asyncio.to_thread(self._update, job_id, **fields)
+
+        telemetry.TRAINING_RUN_SECONDS.observe(elapsed)
+        telemetry.TRAINING_RUNS.labels(status=_RUN_OUTCOME_LABELS.get(status, status)).inc()
+        if status == "succeeded":
+            logger.info("Training job %d completed successfully in %.1fs.", job_id, elapsed)
+        else:
+            # Only the tail of the log is useful (the traceback); the full output is in the log file
+            logger.error("Training job %d %s after %.1fs (%s): %s", job_id, status, elapsed, error,
+                         "\n".join(log_tail(log_path, 40)))
@@ -0,0 +1,183 @@
+"""Profile image storage.
+
+Uploads are streamed to disk in chunks under a hard size limit and stored by content
+hash, so the same image uploaded twice is kept once. Validation and thumbnail
+generation are CPU-bound and run in a small process pool, away from the event loop.
+The stored file's extension comes from the format detected in the file, never from
+the client's content type.
+
+BodySizeLimitMiddleware caps the raw request body of the upload endpoints, before the
+multipart parser spools it to disk.
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 5 * 1024 * 1024))
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# Room for the multipart boundaries and part headers around the file in a request body
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+UPLOAD_PROCESS_WORKERS = int(os.getenv("UPLOAD_PROCESS_WORKERS", 2))
+THUMBNAIL_SIZES = (128, 512)
+
+ALLOWED_CONTENT_TYPES = {
+    "image/jpeg": ".jpg",
+    "image/png": ".png",
+    "image/gif": ".gif",
+    "image/webp": ".webp",
+}
+
+# Stored extension by the format Pillow detects in the file
+IMAGE_FORMATS = {
+    "JPEG": ".jpg",
+    "PNG": ".png",
+    "GIF": ".gif",
+    "WEBP": ".webp",
+}
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidImage(Exception):
+    pass
+
+
+class BodySizeLimitMiddleware:
+    """Answers 413 when the body of a request to one of `limits` (path -> bytes) grows past
+    its limit: at once from Content-Length, or while the body is being read, for clients
+    that send no length or lie about it."""
+
+    def __init__(self, app, limits: dict):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": "File is too large"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside the form parser, which lets HTTPException through to the handlers
+                    raise HTTPException(status_code=413, detail="File is too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+_pool = None
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn keeps the workers small: they don't inherit the loaded models from the API process
+        _pool = ProcessPoolExecutor(max_workers=UPLOAD_PROCESS_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def variant_name(digest: str, size: int) -> str:
+    return f"{digest}_{size}.webp"
+
+
+def _render_variants(source_path: str, digest: str, sizes, formats=tuple(IMAGE_FORMATS)):
+    """Validates the image and writes resized variants next to it. Returns (detected format,
+    variant file names). Runs in a worker process."""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    upload_dir = os.path.dirname(source_path)
+    written = []
+    try:
+        with Image.open(source_path) as img:
+            image_format = img.format
+            if image_format not in formats:
+                raise InvalidImage(f"Unsupported image format: {image_format}")
+            img.verify()
+        # verify() leaves the image unusable, so it has to be opened again
+        with Image.open(source_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA")
+            for size in sizes:
+                target = os.path.join(upload_dir, variant_name(digest, size))
+                if not os.path.exists(target):
+                    variant = img.copy()
+                    variant.thumbnail((size, size))
+                    tmp_target = f"{target}.{os.getpid()}.tmp"
+                    variant.save(tmp_target, format="WEBP", quality=85)
+                    os.replace(tmp_target, target)
+                written.append(variant_name(digest, size))
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, SyntaxError, ValueError) as e:
+        raise InvalidImage(str(e))
+    return image_format, written
+
+
+async def store_image(file: UploadFile, upload_dir: str, max_bytes: int = MAX_UPLOAD_BYTES):
+    """Streams an upload into content-addressed storage.
+
+    Returns (stored file name, list of thumbnail file names). Raises UploadTooLarge,
+    InvalidImage or ValueError (unsupported content type).
+    """
+    if file.content_type not in ALLOWED_CONTENT_TYPES:
+        raise ValueError(f"Unsupported content type: {file.content_type}")
+
+    os.makedirs(upload_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=upload_dir, suffix=".part")
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+                hasher.update(chunk)
+                await run_in_threadpool(out.write, chunk)
+
+        digest = hasher.hexdigest()
+        loop = asyncio.get_running_loop()
+        image_format, thumbnails = await loop.run_in_executor(_get_pool(), _render_variants, tmp_path, digest, THUMBNAIL_SIZES)
+        stored_name = f"{digest}{IMAGE_FORMATS[image_format]}"
+        stored_path = os.path.join(upload_dir, stored_name)
+        if os.path.exists(stored_path):
+            # Same content already stored: keep the existing copy
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, stored_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return stored_name, thumbnails
@@ -0,0 +1,175 @@
+"""What-if sensitivity analysis: how rankings move when a student's grades, interests, skills or aptitudes change.
+
+A request names a base student and the changes to try. Every scenario becomes one row of
+the model input, so the whole batch is featurized once and scored with a single
+predict_proba call per model (course and career). Nothing is written to the database.
+"""
+import itertools
+import os
+
+import numpy as np
+
+from . import serving
+from .recommender import CAREER_APTITUDE_FIELDS
+
+MAX_WHAT_IF_SCENARIOS = int(os.getenv("MAX_WHAT_IF_SCENARIOS", 1000))
+# Fields perturbed in one request (each grade, aptitude, added or removed label counts once)
+MAX_WHAT_IF_DIMENSIONS = int(os.getenv("MAX_WHAT_IF_DIMENSIONS", 32))
+MAX_SUBJECTS = 7  # Same limit as /recommend
+
+
+def _grade_options(grade_points: dict, low: str, high: str) -> list:
+    low, high = low.upper(), high.upper()
+    for grade in (low, high):
+        if grade not in grade_points:
+            raise ValueError(f"Unknown grade {grade!r}")
+    lowest, highest = sorted((grade_points[low], grade_points[high]))
+    return [grade for grade, points in sorted(grade_points.items(), key=lambda item: item[1]) if lowest <= points <= highest]
+
+
+def _dimensions(recommender, request) -> list:
+    """One list of options per perturbed field; the first option of each is "unchanged" (None)."""
+    student = request.student
+    dimensions = []
+    for subject, grade_range in request.grades.items():
+        if subject not in recommender.all_subjects:
+            raise ValueError(f"Unknown subject {subject!r}")
+        base_grade = student.grades.get(subject, '').upper()
+        options = [("grade", subject, grade) for grade in _grade_options(recommender.grade_points, grade_range.low, grade_range.high) if grade != base_grade]
+        dimensions.append([None] + options)
+    for field, values in request.aptitudes.items():
+        if field not in CAREER_APTITUDE_FIELDS.values():
+            raise ValueError(f"Unknown aptitude {field!r}")
+        dimensions.append([None] + [("aptitude", field, int(value)) for value in values if int(value) != getattr(student, field)])
+    for kind, labels, field, present in (
+        ("add_interest", request.add_interests, "interests", False),
+        ("remove_interest", request.remove_interests, "interests", True),
+        ("add_skill", request.add_skills, "skills", False),
+        ("remove_skill", request.remove_skills, "skills", True),
+    ):
+        current = set(getattr(student, field))
+        for label in labels:
+            # Adding what is already there (or removing what is not) changes nothing
+            if (label in current) == present:
+                dimensions.append([None, (kind, field, label)])
+    dimensions = [dimension for dimension in dimensions if len(dimension) > 1]
+    if len(dimensions) > MAX_WHAT_IF_DIMENSIONS:
+        raise ValueError(f"{len(dimensions)} fields to perturb; the limit is {MAX_WHAT_IF_DIMENSIONS}")
+    return dimensions
+
+
+def _check_subject_limit(student, request):
+    """Grades for subjects the student did not take add subjects; no scenario may exceed MAX_SUBJECTS."""
+    added = sum(1 for subject in request.grades if subject not in student.grades)
+    # "each" changes one grade per scenario; "grid" can change all of them at once
+    most_added = min(added, 1) if request.combine == "each" else added
+    if len(student.grades) + most_added > MAX_SUBJECTS:
+        raise ValueError(f"Scenarios would grade more than {MAX_SUBJECTS} subjects; only vary the grades of subjects already taken")
+
+
+def _scenarios(dimensions: list, combine: str) -> list:
+    if combine == "each":
+        count = sum(len(dimension) - 1 for dimension in dimensions)
+    elif combine == "grid":
+        # Python ints, stopping once past the limit: the full product can be astronomically large
+        count = 1
+        for dimension in dimensions:
+            count *= len(dimension)
+            if count - 1 > MAX_WHAT_IF_SCENARIOS:
+                break
+        count -= 1
+    else:
+        raise ValueError("combine must be 'each' or 'grid'")
+    if count > MAX_WHAT_IF_SCENARIOS:
+        raise ValueError(f"More than {MAX_WHAT_IF_SCENARIOS} scenarios requested" if combine == "grid"
+                         else f"{count} scenarios requested; the limit is {MAX_WHAT_IF_SCENARIOS}")
+
+    if combine == "each":
+        return [[option] for dimension in dimensions for option in dimension[1:]]
+    combinations = itertools.product(*dimensions)
+    next(combinations)  # all unchanged: that is the base row
+    return [[option for option in combination if option is not None] for combination in combinations]
+
+
+def _apply(student, changes: list):
+    grades = dict(student.grades)
+    updates = {"interests": list(student.interests), "skills": list(student.skills)}
+    description = {"grades": {}, "aptitudes": {}, "added_interests": [], "removed_interests": [], "added_skills": [], "removed_skills": []}
+    for kind, key, value in changes:
+        if kind == "grade":
+            grades[key] = value
+            description["grades"][key] = value
+        elif kind == "aptitude":
+            updates[key] = value
+            description["aptitudes"][key] = value
+        elif kind.startswith("add_"):
+            updates[key].append(value)
+            description[f"added_{key}"].append(value)
+        else:
+            updates[key].remove(value)
+            description[f"removed_{key}"].append(value)
+    updates["grades"] = grades
+    return student.model_copy(update=updates), description
+
+
+def _rankings(probabilities: np.ndarray, names: list, top_k: int, base_ranks=None, base_probabilities=None) -> list:
+    order = np.argsort(probabilities)[::-1][:top_k]
+    ranked = []
+    for rank, index in enumerate(order, start=1):
+        item = {"name": names[index], "probability": float(probabilities[index]), "rank": rank}
+        if base_ranks is not None:
+            item["previous_rank"] = int(base_ranks[index])
+            item["probability_change"] = float(probabilities[index] - base_probabilities[index])
+        ranked.append(item)
+    return ranked
+
+
+def _ranks(probabilities: np.ndarray) -> np.ndarray:
+    ranks = np.empty(len(probabilities), dtype=int)
+    ranks[np.argsort(probabilities)[::-1]] = np.arange(1, len(probabilities) + 1)
+    return ranks
+
+
+def run_what_if(recommender, request, user_id=None) -> dict:
+    """Scores the base student and every requested scenario in one batch; raises ValueError for invalid specs."""
+    top_k = max(1, min(request.top_k, 20))
+    _check_subject_limit(request.student, request)
+    scenarios = _scenarios(_dimensions(recommender, request), request.combine)
+    variants = [_apply(request.student, changes) for changes in scenarios]
+    students = [request.student] + [student for student, _ in variants]
+
+    # One feature matrix and one predict_proba per model for the whole batch
+    # Every model of the batch from one training run, even if a reload swaps in the next meanwhile
+    snapshot = recommender.snapshot
+    course_pipelines = snapshot.course_pipelines
+    course_model_key = recommender.serving_policy.choose(user_id, course_pipelines, snapshot.chosen_course_model_key)
+    course_pipeline = course_pipelines[course_model_key]
+    course_probabilities = serving.score(course_pipeline, recommender._build_course_frame(students))
+    families = recommender.course_families
+    course_names = [families[int(label) + 1]["name"] if int(label) + 1 in families else f"Course {int(label) + 1}" for label in course_pipeline.classes_]
+
+    career_pipeline = snapshot.career_model_pipeline
+    career_probabilities = career_pipeline.predict_proba(recommender._build_career_frame(students))
+    career_names = [str(name).strip() for name in snapshot.career_label_encoder.inverse_transform(career_pipeline.classes_)]
+
+    base_course_ranks, base_career_ranks = _ranks(course_probabilities[0]), _ranks(career_probabilities[0])
+    base_top_course, base_top_career = int(np.argmax(course_probabilities[0])), int(np.argmax(career_probabilities[0]))
+    results = []
+    for row, (_, description) in enumerate(variants, start=1):
+        results.append({
+            "changes": description,
+            "courses": _rankings(course_probabilities[row], course_names, top_k, base_course_ranks, course_probabilities[0]),
+            "careers": _rankings(career_probabilities[row], career_names, top_k, base_career_ranks, career_probabilities[0]),
+            "top_course_changed": int(np.argmax(course_probabilities[row])) != base_top_course,
+            "top_career_changed": int(np.argmax(career_probabilities[row])) != base_top_career,
+        })
+
+    return {
+        "course_model": course_model_key,
+        "rows_scored": len(students),
+        "base": {
+            "courses": _rankings(course_probabilities[0], course_names, top_k),
+            "careers": _rankings(career_probabilities[0], career_names, top_k),
+        },
+        "scenarios": results,
+    }
@@ -0,0 +1,357 @@
+# Micro-benchmarks for the recommender internals, with regression gates.
+#
+# Each case is timed on generated, seeded fixtures (student profiles, course names and
+# career names) against the model artifacts the API serves. Medians are compared with a
+# stored baseline and the run fails (exit code 1) when a case is slower than the
+# baseline by more than --threshold. Without a baseline the run fails (exit code 2)
+# before measuring anything, so a gate can never pass by comparing against nothing.
+#
+# Usage (from the backend directory):
+#   python benchmark.py --save-baseline            # record benchmarks/baseline.json on this machine
+#   python benchmark.py                            # run all cases and gate against the baseline
+#   python benchmark.py --only predict_proba --threshold 0.5
+#   python benchmark.py --only ann --no-baseline   # just report the timings
+#
+# Baselines are machine-specific and are not committed: record one on the machine (or CI
+# runner) that runs the gate. A warning is printed when the gate runs somewhere else.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from pydantic import TypeAdapter
+
+from app.models import Student
+from app import ensemble, feature_store, content_engine, ann_index, response_json, schemas
+from app.catalog import COURSE_CONTENT_COLUMNS
+from app.recommender import Recommender, DEFAULT_PATHS
+
+DEFAULT_BASELINE_PATH = "benchmarks/baseline.json"
+GRADES = ['A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'E']
+INTERESTS_POOL = ['Programming', 'Healthcare', 'Debating', 'Management', 'Building things', 'Technology', 'Science', 'Art', 'Music', 'Sports']
+SKILLS_POOL = ['Problem Solving', 'Logical Thinking', 'Communication', 'Empathy', 'Research', 'Leadership', 'Analytical Skills', 'Manual Dexterity', 'Creativity', 'Teamwork']
+APTITUDE_LEVELS = ['POOR', 'AVG', 'BEST']
+COURSE_PIPELINES = {
+    "rf": "rf_course_model_pipeline",
+    "xgb": "xgb_course_model_pipeline",
+    "svm": "svm_course_model_pipeline",
+}
+
+
+# --- Fixtures ---
+
+def generate_students(count, subjects, seed=0):
+    rng = random.Random(seed)
+    students = []
+    for _ in range(count):
+        students.append(Student(
+            grades={subject: rng.choice(GRADES) for subject in rng.sample(subjects, 7)},
+            interests=rng.sample(INTERESTS_POOL, rng.randint(1, 3)),
+            skills=rng.sample(SKILLS_POOL, rng.randint(1, 4)),
+            linguistic=rng.randint(1, 20), musical=rng.randint(1, 20), bodily=rng.randint(1, 20),
+            logicalMathematical=rng.randint(1, 20), spatialVisualization=rng.randint(1, 20),
+            interpersonal=rng.randint(1, 20), intrapersonal=rng.randint(1, 20), naturalist=rng.randint(1, 20),
+            **{f"p{i}": rng.choice(APTITUDE_LEVELS) for i in range(1, 9)},
+        ))
+    return students
+
+
+def generate_course_names(recommender, count, seed=0):
+    # Mix names that exist in the catalog with prefixed variants, like recommend() produces
+    rng = random.Random(seed)
+    names = list(recommender.courses_df['course_name'].astype(str))
+    prefixes = ["", "Bachelor of ", "Diploma in ", "Certificate in "]
+    return [(rng.choice(prefixes) + rng.choice(names)).lower() for _ in range(count)]
+
+
+def generate_career_names(recommender, count, seed=0):
+    # Mostly names the career model can predict, plus a few that force the substring fallback
+    rng = random.Random(seed)
+    names = [str(name).strip() for name in recommender.snapshot.career_label_encoder.classes_]
+    names += ["Unknown Career Title", "Senior " + names[0]]
+    return [rng.choice(names) for _ in range(count)]
+
+
+# --- Timing ---
+
+def measure(func, repeat, warmup=1, items=1):
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start_time) * 1000 / items)
+    return {
+        "median_ms": statistics.median(timings),
+        "min_ms": min(timings),
+        "mean_ms": statistics.fmean(timings),
+        "repeat": repeat,
+        "items_per_call": items,
+    }
+
+
+def build_cases(recommender, catalogs, args):
+    """Returns {case name: (callable, repeat, items per call)}."""
+    students = generate_students(max(args.batch_size, 64), recommender.all_subjects, seed=args.seed)
+    single = students[:1]
+    batch = students[:args.batch_size]
+    course_frame_single = recommender._build_course_frame(single)
+    course_frame_batch = recommender._build_course_frame(batch)
+    course_names = generate_course_names(recommender, 20, seed=args.seed)
+    career_names = generate_career_names(recommender, 20, seed=args.seed)
+    cycle = {"i": 0}
+
+    def next_student():
+        cycle["i"] = (cycle["i"] + 1) % len(students)
+        return students[cycle["i"]]
+
+    # A returning student who changed two grades: the stored vectors are patched instead of rebuilt
+    revisited = single[0].model_copy(update={"grades": dict(single[0].grades)})
+    for subject in list(revisited.grades)[:2]:
+        revisited.grades[subject] = 'A' if revisited.grades[subject] != 'A' else 'B'
+    old_profile, new_profile = feature_store.student_profile(single[0]), feature_store.student_profile(revisited)
+    stored_course, stored_career = recommender.featurize(single[0])
+
+    def patch_features():
+        course_vector, career_vector = stored_course.copy(), stored_career.copy()
+        recommender.snapshot.feature_layout.patch(old_profile, new_profile, course_vector, career_vector)
+        return course_vector, career_vector
+
+    def recommend_patched():
+        course_vector, career_vector = patch_features()
+        recommender.recommend(revisited, course_features=course_vector.reshape(1, -1), career_features=career_vector.reshape(1, -1))
+
+    cases = {
+        "recommender_init": (lambda: Recommender(**DEFAULT_PATHS), args.slow_repeat, 1),
+        "load_models": (recommender._load_models, args.slow_repeat, 1),
+        "catalog_reload": (recommender.catalog.reload, args.slow_repeat, 1),
+        "recommend_single": (lambda: recommender.recommend(next_student()), args.repeat, 1),
+        "recommend_batch": (lambda: [recommender.recommend(s) for s in batch], args.slow_repeat, len(batch)),
+        "recommend_single_patched_features": (recommend_patched, args.repeat, 1),
+        "featurize_full_single": (lambda: recommender.featurize(revisited), args.repeat, 1),
+        "feature_patch_single": (patch_features, args.repeat, 1),
+        "course_frame_single": (lambda: recommender._build_course_frame(single), args.repeat, 1),
+        "course_frame_batch": (lambda: recommender._build_course_frame(batch), args.repeat, len(batch)),
+        "career_frame_single": (lambda: recommender._build_career_frame(single), args.repeat, 1),
+        "course_metadata_resolution": (lambda: [recommender.catalog.current.lookup_course_metadata(n) for n in course_names], args.slow_repeat, len(course_names)),
+        "career_resolution": (lambda: [recommender.catalog.current.resolve_career(n) for n in career_names], args.repeat, len(career_names)),
+    }
+    for short_name, attribute in COURSE_PIPELINES.items():
+        pipeline = getattr(recommender.snapshot, attribute)
+        preprocessor = pipeline[:-1]
+        cases[f"featurize_{short_name}_single"] = (lambda p=preprocessor: p.transform(course_frame_single), args.repeat, 1)
+        cases[f"featurize_{short_name}_batch"] = (lambda p=preprocessor: p.transform(course_frame_batch), args.repeat, len(batch))
+        cases[f"predict_proba_{short_name}_single"] = (lambda p=pipeline: p.predict_proba(course_frame_single), args.repeat, 1)
+        cases[f"predict_proba_{short_name}_batch"] = (lambda p=pipeline: p.predict_proba(course_frame_batch), args.repeat, len(batch))
+    # Compare with the slowest predict_proba_* case: the members are scored concurrently
+    blend = recommender.snapshot.course_ensemble
+    cases["predict_proba_ensemble_single"] = (lambda: blend.predict_proba(course_frame_single), args.repeat, 1)
+    cases["predict_proba_ensemble_batch"] = (lambda: blend.predict_proba(course_frame_batch), args.repeat, len(batch))
+    # Response body: cached-fragment renderer against FastAPI's validate + dump path
+    response = recommender.recommend(single[0])
+    for position, item in enumerate(response["courses"] + response["careers"]):
+        item["id"] = position + 1
+    renderer = response_json.RecommendationsRenderer()
+    response_adapter = TypeAdapter(schemas.Recommendations)
+    cases["render_response_fragments"] = (lambda: renderer.render(response, recommender.catalog.current.version), args.repeat, 1)
+    cases["render_response_pydantic"] = (lambda: response_adapter.dump_json(response_adapter.validate_python(response)), args.repeat, 1)
+    cases.update(build_content_cases(recommender, single[0], catalogs, args))
+    return cases
+
+
+def build_catalogs(recommender, args):
+    """Synthetic catalogs of --catalog-sizes rows, each with its exact and ANN index."""
+    rng = np.random.default_rng(args.seed)
+    text_columns, tag_column = COURSE_CONTENT_COLUMNS
+    catalogs = []
+    for size in args.catalog_sizes:
+        # Resampled rows of the real catalog, so the vocabulary and row density stay realistic
+        catalog = recommender.courses_df.iloc[rng.integers(0, len(recommender.courses_df), size)]
+        directory = tempfile.TemporaryDirectory(prefix="ann-benchmark-")
+        ann_index.build(catalog, text_columns, tag_column, directory.name, seed=args.seed)
+        catalogs.append({
+            "size": size,
+            "exact": content_engine.ContentIndex.from_frame(catalog, text_columns, tag_column),
+            "ann": ann_index.ANNIndex(directory.name),
+            "directory": directory,  # removed when the benchmark exits
+        })
+    return catalogs
+
+
+def student_terms(student):
+    terms = list(student.interests) + list(student.skills)
+    return " ".join(terms), terms
+
+
+def build_content_cases(recommender, student, catalogs, args):
+    """Catalog matching on the served catalog and on the synthetic catalogs."""
+    cases = {
+        "catalog_match_single": (lambda: recommender.catalog.current.match_course(student, 0, "Bachelor's Degree", set()), args.repeat, 1),
+    }
+    text, tags = student_terms(student)
+    for catalog in catalogs:
+        size, index, ann = catalog["size"], catalog["exact"], catalog["ann"]
+        query = index.query(text, tags)
+        row_major = index.matrix.tocsr()
+        cases[f"content_query_{size}"] = (lambda i=index: i.query(text, tags), args.repeat, 1)
+        cases[f"content_top_k_{size}"] = (lambda i=index, q=query: i.top_k(q, 20), args.repeat, 1)
+        # Reference point: a full row-major product and a full sort
+        cases[f"content_full_sort_{size}"] = (lambda m=row_major, q=query: np.argsort(-(m @ q.T).toarray().ravel())[:20], args.slow_repeat, 1)
+        ann_query = ann.query(text, tags)
+        for n_probe in args.ann_probes:
+            cases[f"ann_top_k_{size}_probe{n_probe}"] = (lambda a=ann, q=ann_query, p=n_probe: a.top_k(q, 20, n_probe=p), args.repeat, 1)
+    return cases
+
+
+def ann_recall(catalogs, students, args, k=20):
+    """recall@k of the ANN index against exact TF-IDF search, per catalog size and n_probe.
+
+    The resampled catalogs repeat rows, so a hit is any returned row scoring at least the exact
+    k-th best score (ties count). The copies of a row share a list, so a query's exact top k is
+    often the copies of one course in one list, and its recall is all or nothing: missed_queries
+    is the share of queries with no hit at all."""
+    report = {}
+    for catalog in catalogs:
+        index, ann = catalog["exact"], catalog["ann"]
+        hits = {n_probe: 0 for n_probe in args.ann_probes}
+        missed = {n_probe: 0 for n_probe in args.ann_probes}
+        for student in students:
+            text, tags = student_terms(student)
+            query = index.query(text, tags)
+            exact_scores = index.scores(query)
+            kth_best = np.partition(exact_scores, len(exact_scores) - k)[len(exact_scores) - k]
+            ann_query = ann.query(text, tags)
+            for n_probe in args.ann_probes:
+                positions, _ = ann.top_k(ann_query, k, n_probe=n_probe)
+                query_hits = int(np.sum(exact_scores[positions] >= kth_best - 1e-6))
+                hits[n_probe] += query_hits
+                missed[n_probe] += query_hits == 0
+        report[str(catalog["size"])] = {
+            "lists": ann.lists,
+            "dims": int(ann.manifest["dims"]),
+            "recall_at_k": {str(n_probe): hits[n_probe] / (k * len(students)) for n_probe in args.ann_probes},
+            "missed_queries": {str(n_probe): missed[n_probe] / len(students) for n_probe in args.ann_probes},
+        }
+    return report
+
+
+# --- Baselines and gating ---
+
+def environment_info():
+    import sklearn
+    import pandas
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pandas.__version__,
+        "scikit-learn": sklearn.__version__,
+    }
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get("cases", {}).get(name)
+        if reference is None:
+            continue
+        current, previous = result["median_ms"], reference["median_ms"]
+        result["baseline_median_ms"] = previous
+        result["change"] = (current - previous) / previous if previous else 0.0
+        if current > previous * (1 + threshold) and current - previous > min_delta_ms:
+            regressions.append(name)
+    return regressions
+
+
+def environment_mismatch(baseline):
+    """Returns the environment fields (CPU, library versions) that differ from the baseline's."""
+    recorded, current = baseline.get("environment", {}), environment_info()
+    return {key: (recorded.get(key), value) for key, value in current.items() if recorded.get(key) != value}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the recommender internals.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH, help="Baseline file (default: %(default)s)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline")
+    mode.add_argument("--no-baseline", action="store_true", help="Only report the results; do not gate against a baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown of the median, as a fraction (default: %(default)s)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="Ignore slowdowns smaller than this many ms")
+    parser.add_argument("--only", action="append", help="Run only cases whose name contains this string (repeatable)")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--slow-repeat", type=int, default=5, help="Repeats for the expensive cases")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--catalog-sizes", type=lambda value: [int(size) for size in value.split(",")], default=[10000],
+                        help="Comma-separated synthetic catalog sizes for the content_* and ann_* cases (default: 10000)")
+    parser.add_argument("--ann-probes", type=lambda value: [int(n) for n in value.split(",")], default=[1, 4, 16],
+                        help="Comma-separated n_probe values for the ann_* cases and --ann-recall (default: 1,4,16)")
+    parser.add_argument("--ann-recall", action="store_true", help="Also report recall@20 of the ANN index against exact search")
+    parser.add_argument("--output", help="Also write the JSON results to this file")
+    args = parser.parse_args()
+    gate = not (args.save_baseline or args.no_baseline)
+    if gate and not os.path.exists(args.baseline):
+        parser.error(f"no baseline at {args.baseline}: record one on this machine with --save-baseline, "
+                     "or pass --no-baseline to only report the timings")
+
+    # Per-request warnings (e.g. unmatched careers) would drown the results
+    logging.getLogger("app").setLevel(logging.ERROR)
+    recommender = Recommender(**DEFAULT_PATHS)
+    catalogs = build_catalogs(recommender, args)
+    cases = build_cases(recommender, catalogs, args)
+    if args.only:
+        cases = {name: case for name, case in cases.items() if any(part in name for part in args.only)}
+
+    results = {}
+    for name, (func, repeat, items) in cases.items():
+        results[name] = measure(func, repeat=repeat, items=items)
+        print(f"{name:<32} {results[name]['median_ms']:>10.3f} ms (min {results[name]['min_ms']:.3f})", file=sys.stderr)
+
+    report = {"environment": environment_info(), "cases": results}
+    if args.ann_recall:
+        report["ann_recall"] = ann_recall(catalogs, generate_students(200, recommender.all_subjects, seed=args.seed + 1), args)
+
+    regressions = []
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline written to {args.baseline}", file=sys.stderr)
+    elif gate:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key, (recorded, current) in environment_mismatch(baseline).items():
+            print(f"WARNING: baseline {key} is {recorded!r}, this run's is {current!r}", file=sys.stderr)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        report["regressions"] = regressions
+        for name in results:
+            if name not in baseline.get("cases", {}):
+                print(f"Not gated (missing from the baseline): {name}", file=sys.stderr)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if regressions:
+        for name in regressions:
+            result = results[name]
+            print(f"REGRESSION {name}: {result['baseline_median_ms']:.3f} ms -> {result['median_ms']:.3f} ms "
+                  f"({result['change']:+.0%})", file=sys.stderr)
+        sys.exit(1)
+    ensemble.shutdown_executor()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Builds the approximate nearest-neighbour indexes the Recommender memory-maps at startup
+# (see app/ann_index.py). Without an index, catalog matching is an exact sparse TF-IDF scan,
+# which is fine for the shipped catalogs; build one when the catalog reaches millions of rows.
+#
+# Usage (from the backend directory):
+#   python build_ann_index.py                        # courses and careers, into app/ann/<catalog>
+#   python build_ann_index.py courses --dims 96 --lists 2000
+#
+# Rebuild after the catalog file changes: an index built for another version of the file is ignored.
+# Search-time recall/latency is tuned with ANN_N_PROBE; measure it with
+#   python benchmark.py --only ann --no-baseline --ann-recall
+
+import argparse
+import logging
+import os
+
+from app import ann_index, catalog
+from app.catalog import COURSE_CONTENT_COLUMNS, CAREER_CONTENT_COLUMNS
+from app.recommender import DEFAULT_PATHS
+
+CATALOGS = {
+    "courses": (DEFAULT_PATHS["courses_path"], COURSE_CONTENT_COLUMNS),
+    "careers": (DEFAULT_PATHS["careers_path"], CAREER_CONTENT_COLUMNS),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the ANN indexes for the course and career catalogs.")
+    parser.add_argument("catalogs", nargs="*", help=f"Catalogs to index: {', '.join(sorted(CATALOGS))} (default: all)")
+    parser.add_argument("--output-dir", default=ann_index.ANN_INDEX_DIR, help="Parent directory of the indexes (default: %(default)s)")
+    parser.add_argument("--dims", type=int, default=ann_index.DEFAULT_DIMS, help="Embedding dimensions (default: %(default)s)")
+    parser.add_argument("--lists", type=int, help="Number of inverted lists (default: sqrt of the row count)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    unknown = sorted(set(args.catalogs) - set(CATALOGS))
+    if unknown:
+        parser.error(f"unknown catalog(s): {', '.join(unknown)}")
+    logging.basicConfig(level=logging.INFO)
+
+    for name in args.catalogs or sorted(CATALOGS):
+        path, (text_columns, tag_column) = CATALOGS[name]
+        # Same preparation as Recommender.__init__, so the row positions line up
+        df = catalog.read_catalog_csv(path)
+        manifest = ann_index.build(df, text_columns, tag_column, os.path.join(args.output_dir, name), catalog_path=path, dims=args.dims, lists=args.lists, seed=args.seed)
+        print(f"{name}: {manifest['rows']} rows, {manifest['dims']} dims, {manifest['lists']} lists, "
+              f"explained variance {manifest['explained_variance']:.2f}, built in {manifest['build_seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
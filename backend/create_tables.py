@@ -1,3 +1,5 @@
+# Recreates the schema from scratch: every table is DROPPED first, with all its data.
+# Only for a fresh development database; upgrade existing databases with migrate_db.py.
 from app.models import Base
 from app.database import engine
 
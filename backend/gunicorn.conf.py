@@ -0,0 +1,110 @@
+# Production serving config: gunicorn with uvicorn workers and a preloaded app.
+#
+# The master imports app.main once, so the recommender's models, the course and career
+# tables and the rest of the module state are built a single time and shared with the
+# workers copy-on-write. The master also owns the background work that must run in
+# exactly one process: the model and catalog file watchers and the expired token purge. When the models or the catalog
+# change, the master reloads them and sends itself SIGHUP so fresh workers are forked from the updated state.
+# The training and cohort jobs run in a child process of their own (app/job_runners.py): the arbiter reaps every
+# child with waitpid(-1), so the job processes must not be its children.
+#
+# Usage (from the backend directory):
+#   gunicorn -c gunicorn.conf.py app.main:app
+#
+# See DEPLOYMENT.md for the measured memory and startup savings.
+
+import gc
+import os
+import random
+import signal
+import threading
+import time
+
+import numpy as np
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", 4))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Model inference is CPU-bound; give slow /recommend calls room before a worker is killed
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Read by app.main at import: the workers only serve requests
+os.environ["RUN_BACKGROUND_TASKS"] = "false"
+
+
+def _master_background_loop(server):
+    from app import job_runners, main, maintenance
+
+    # Training jobs (the startup run and /admin/train requests from the workers) and cohort jobs
+    # run in the job runner process, started by when_ready
+    if main.TRAIN_ON_STARTUP:
+        main.submit_startup_training()
+
+    main.model_watcher.start()
+    next_purge = time.monotonic()
+    while True:
+        # Replaces the job runner process if it died
+        job_runners.ensure_running()
+
+        if time.monotonic() >= next_purge:
+            try:
+                maintenance.run_token_purge()
+            except Exception as e:
+                server.log.exception("Error purging expired password reset tokens: %s", e)
+            next_purge = time.monotonic() + maintenance.TOKEN_PURGE_INTERVAL_SECONDS
+
+        if main.reload_catalog_if_changed():
+            gc.freeze()
+            os.kill(os.getpid(), signal.SIGHUP)
+
+        # Returns as soon as train.py publishes a run, otherwise after the catalog check interval
+        if main.model_watcher.wait(main.CATALOG_CHECK_INTERVAL_SECONDS):
+            server.log.info("Detected new model files. Reloading models in the master...")
+            try:
+                main.reload_models()
+                gc.freeze()
+            except Exception as e:
+                server.log.exception("Error reloading models; keeping the current workers: %s", e)
+            else:
+                # Replace the workers with forks of the updated master
+                os.kill(os.getpid(), signal.SIGHUP)
+
+
+def when_ready(server):
+    from app import job_runners
+
+    # Move everything loaded so far out of the collector's reach: a full collection in a
+    # worker would otherwise touch (and so copy) every shared object header.
+    gc.freeze()
+    job_runners.ensure_running()
+    threading.Thread(target=_master_background_loop, args=(server,), name="model-manager", daemon=True).start()
+
+
+def on_exit(server):
+    from app import job_runners
+
+    job_runners.stop(graceful_timeout)
+
+
+def pre_fork(server, worker):
+    from app import main
+
+    # Wait for a model reload in progress to finish, so a worker never starts from half-swapped models
+    with main.model_reload_lock:
+        pass
+
+
+def post_fork(server, worker):
+    from app.database import engine
+    from app.logging_config import setup_logging
+
+    # Connections opened by the master must not be shared; drop the inherited pool without closing its sockets
+    engine.dispose(close=False)
+    # The log listener thread does not survive fork
+    setup_logging()
+    # Forked workers would otherwise draw the same random sequence (e.g. DataFrame.sample)
+    random.seed()
+    np.random.seed()
@@ -0,0 +1,289 @@
+# HTTP load test for the Career Guidance API.
+#
+# Boots the app with uvicorn against a local database (SQLite by default) with startup
+# training disabled, seeds users, then drives /token, /recommend, /ratings/ and
+# /recommendations/history/ with a configurable mix of concurrent asyncio clients.
+# Prints a JSON report (throughput, p50/p95/p99 latency, error rate per endpoint) that
+# can be saved and compared across commits.
+#
+# Examples (run from the backend directory):
+#   python loadtest.py --duration 30 --concurrency 20 --output loadtest_results.json
+#   python loadtest.py --database-url postgresql+psycopg2://user:pw@localhost/loadtest --workers 4
+#   python loadtest.py --base-url http://localhost:8000 --no-seed   # against a server that is already running
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+SUBJECTS = ['Mathematics', 'Kiswahili', 'English', 'Chemistry', 'Physics', 'Biology', 'History', 'Geography',
+            'Business Studies', 'Computer Studies', 'Agriculture', 'Religious Education']
+GRADES = ['A', 'A-', 'B+', 'B', 'B-', 'C+', 'C', 'C-', 'D+', 'D', 'D-', 'E']
+INTERESTS_POOL = ['Programming', 'Healthcare', 'Debating', 'Management', 'Building things', 'Technology', 'Science', 'Art', 'Music', 'Sports']
+SKILLS_POOL = ['Problem Solving', 'Logical Thinking', 'Communication', 'Empathy', 'Research', 'Leadership', 'Analytical Skills', 'Manual Dexterity', 'Creativity', 'Teamwork']
+APTITUDE_LEVELS = ['POOR', 'AVG', 'BEST']
+
+DEFAULT_MIX = "recommend=6,rate=2,ratings=1,history=2,token=1"
+PASSWORD = "loadtest-password"
+
+
+def parse_mix(mix: str) -> dict:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight or 1)
+    unknown = set(weights) - {"recommend", "rate", "ratings", "history", "token"}
+    if unknown:
+        raise SystemExit(f"Unknown operations in --mix: {', '.join(sorted(unknown))}")
+    return weights
+
+
+def random_student(rng: random.Random) -> dict:
+    subjects = rng.sample(SUBJECTS, 7)
+    student = {
+        "grades": {subject: rng.choice(GRADES) for subject in subjects},
+        "interests": rng.sample(INTERESTS_POOL, rng.randint(1, 3)),
+        "skills": rng.sample(SKILLS_POOL, rng.randint(1, 4)),
+    }
+    for field in ["linguistic", "musical", "bodily", "logicalMathematical", "spatialVisualization",
+                  "interpersonal", "intrapersonal", "naturalist"]:
+        student[field] = rng.randint(1, 20)
+    for i in range(1, 9):
+        student[f"p{i}"] = rng.choice(APTITUDE_LEVELS)
+    return student
+
+
+def seed_users(database_url: str, count: int) -> list:
+    """Creates the load-test users directly in the database and returns their usernames."""
+    os.environ["DATABASE_URL"] = database_url
+    from app import auth, models
+    from app.database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    # bcrypt is deliberately slow, so hash the shared password once
+    hashed_password = auth.get_password_hash(PASSWORD)
+    usernames = [f"loadtest_user_{i}" for i in range(count)]
+    db = SessionLocal()
+    try:
+        existing = {u.username for u in db.query(models.User).filter(models.User.username.in_(usernames))}
+        db.add_all([
+            models.User(username=name, email=f"{name}@loadtest.local", hashed_password=hashed_password)
+            for name in usernames if name not in existing
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return usernames
+
+
+def start_server(args) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url,
+        "TRAIN_ON_STARTUP": "false",
+        "LOG_LEVEL": "WARNING",
+    })
+    command = [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(args.port),
+               "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"]
+    return subprocess.Popen(command, env=env)
+
+
+async def wait_until_ready(base_url: str, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.5)
+    raise SystemExit(f"Server at {base_url} did not become ready within {timeout:.0f}s")
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, username: str, rng: random.Random, results: list):
+        self.client = client
+        self.username = username
+        self.rng = rng
+        self.results = results
+        self.token = None
+        self.recommendation_ids = []
+
+    async def _request(self, operation, method, url, **kwargs):
+        start_time = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError as e:
+            response, status = None, type(e).__name__
+        self.results.append((operation, status, time.perf_counter() - start_time))
+        return response
+
+    def _headers(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+    async def token_op(self):
+        response = await self._request("token", "POST", "/token", data={"username": self.username, "password": PASSWORD})
+        if response is not None and response.status_code == 200:
+            self.token = response.json()["access_token"]
+
+    async def recommend_op(self):
+        response = await self._request("recommend", "POST", "/recommend", json=random_student(self.rng), headers=self._headers())
+        if response is not None and response.status_code == 200:
+            body = response.json()
+            self.recommendation_ids = [item["id"] for item in body["courses"] + body["careers"] if item.get("id")][-20:]
+
+    async def rate_op(self):
+        payload = {
+            "recommendation_id": self.rng.choice(self.recommendation_ids) if self.recommendation_ids else None,
+            "rating": self.rng.randint(1, 5),
+            "comment": "load test",
+        }
+        await self._request("rate", "POST", "/ratings/", json=payload, headers=self._headers())
+
+    async def ratings_op(self):
+        await self._request("ratings", "GET", "/ratings/")
+
+    async def history_op(self):
+        await self._request("history", "GET", "/recommendations/history/", headers=self._headers())
+
+
+async def run_load(args, usernames: list) -> dict:
+    weights = parse_mix(args.mix)
+    operations, operation_weights = zip(*weights.items())
+    results = []
+    deadline = time.monotonic() + args.duration
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        async def worker(index: int):
+            rng = random.Random(args.seed + index)
+            user = VirtualUser(client, usernames[index % len(usernames)], rng, results)
+            await user.token_op()
+            while time.monotonic() < deadline:
+                operation = rng.choices(operations, weights=operation_weights)[0]
+                await getattr(user, f"{operation}_op")()
+
+        start_time = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+        elapsed = time.perf_counter() - start_time
+
+    return build_report(results, elapsed, args)
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank percentile
+    index = min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples: list, elapsed: float) -> dict:
+    latencies = sorted(latency for _, _, latency in samples)
+    errors = sum(1 for _, status, _ in samples if not (isinstance(status, int) and status < 400))
+    count = len(samples)
+    return {
+        "requests": count,
+        "errors": errors,
+        "error_rate": errors / count if count else 0.0,
+        "throughput_rps": count / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": 1000 * sum(latencies) / count if count else 0.0,
+            "p50": 1000 * percentile(latencies, 0.50),
+            "p95": 1000 * percentile(latencies, 0.95),
+            "p99": 1000 * percentile(latencies, 0.99),
+            "max": 1000 * latencies[-1] if latencies else 0.0,
+        },
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def build_report(results: list, elapsed: float, args) -> dict:
+    by_operation = {}
+    for sample in results:
+        by_operation.setdefault(sample[0], []).append(sample)
+    status_counts = {}
+    for operation, status, _ in results:
+        key = f"{operation}:{status}"
+        status_counts[key] = status_counts.get(key, 0) + 1
+    return {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "config": {
+            "base_url": args.base_url,
+            "database_url": args.database_url if not args.base_url_given else None,
+            "workers": args.workers,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "mix": parse_mix(args.mix),
+            "users": args.users,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": elapsed,
+        "overall": summarize(results, elapsed),
+        "endpoints": {operation: summarize(samples, elapsed) for operation, samples in sorted(by_operation.items())},
+        "status_counts": status_counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the Career Guidance API.")
+    parser.add_argument("--database-url", default="sqlite:///./loadtest.db", help="Database the booted app uses (default: %(default)s)")
+    parser.add_argument("--base-url", help="Target an already running server instead of booting one")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes for the booted app")
+    parser.add_argument("--users", type=int, default=50, help="Number of seeded users")
+    parser.add_argument("--no-seed", action="store_true", help="Skip creating users (they must already exist)")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Test length in seconds")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="Weighted operation mix (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    parse_mix(args.mix)
+    args.base_url_given = bool(args.base_url)
+    usernames = [f"loadtest_user_{i}" for i in range(args.users)]
+    if not args.no_seed:
+        usernames = seed_users(args.database_url, args.users)
+
+    server = None
+    if not args.base_url:
+        args.base_url = f"http://127.0.0.1:{args.port}"
+        server = start_server(args)
+    try:
+        asyncio.run(wait_until_ready(args.base_url))
+        report = asyncio.run(run_load(args, usernames))
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Grants or revokes access to the /admin endpoints.
+
+    python manage_admins.py list
+    python manage_admins.py grant <username>
+    python manage_admins.py revoke <username>
+
+The right is stored on the account, so it follows the account if the user is renamed.
+"""
+import sys
+
+from app import models
+from app.database import SessionLocal
+
+USAGE = "Usage: python manage_admins.py list | grant <username> | revoke <username>"
+
+
+def set_admin(db, username, is_admin):
+    user = db.query(models.User).filter(models.User.username == username).first()
+    if user is None:
+        print(f"No user named {username!r}.")
+        return False
+    user.is_admin = is_admin
+    db.commit()
+    print(f"{'Granted' if is_admin else 'Revoked'} administrator access for {username!r} (user ID {user.id}).")
+    return True
+
+
+def main(argv):
+    db = SessionLocal()
+    try:
+        if argv == ["list"]:
+            for user in db.query(models.User).filter(models.User.is_admin.is_(True)).order_by(models.User.id):
+                print(f"{user.id}\t{user.username}")
+            return 0
+        if len(argv) == 2 and argv[0] in ("grant", "revoke"):
+            return 0 if set_admin(db, argv[1], argv[0] == "grant") else 1
+        print(USAGE)
+        return 2
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,78 @@
+"""Brings an existing database up to date with app/models.py without losing data.
+
+create_all() only creates missing tables: it never adds a column to a table that already
+exists. This script creates the missing tables, then adds every model column an existing table
+lacks (ALTER TABLE ... ADD COLUMN, plus the column's index) and fills in the columns that need
+a value for the existing rows. It is idempotent: run it after each upgrade, before starting
+the new version.
+
+    python migrate_db.py
+
+create_tables.py drops every table first; use it only for a fresh development database.
+"""
+import uuid
+
+from sqlalchemy import inspect, text
+
+from app.models import Base
+from app.database import engine
+
+
+def backfill_recommendation_set_ids(connection):
+    """Gives the rows saved before set_id existed one server-generated set per (user, request)."""
+    rows = connection.execute(text(
+        "SELECT DISTINCT user_id, request_id FROM recommendations WHERE set_id IS NULL AND request_id IS NOT NULL"
+    )).all()
+    for user_id, request_id in rows:
+        connection.execute(
+            text("UPDATE recommendations SET set_id = :set_id WHERE set_id IS NULL AND user_id = :user_id AND request_id = :request_id"),
+            {"set_id": uuid.uuid4().hex, "user_id": user_id, "request_id": request_id},
+        )
+    if rows:
+        print(f"Assigned set IDs to {len(rows)} recommendation sets.")
+
+
+def backfill_admin_flags(connection):
+    connection.execute(text("UPDATE users SET is_admin = :no WHERE is_admin IS NULL"), {"no": False})
+
+
+# Run after the columns are added, in order; each must be safe to run again
+BACKFILLS = [backfill_recommendation_set_ids, backfill_admin_flags]
+
+
+def missing_columns(connection):
+    inspector = inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in present:
+                yield table, column
+
+
+def add_column(connection, table, column):
+    preparer = connection.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(
+        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+    ))
+    for index in table.indexes:
+        if list(index.columns.keys()) == [column.name]:
+            index.create(connection)
+
+
+def migrate():
+    with engine.begin() as connection:
+        Base.metadata.create_all(bind=connection)
+        for table, column in list(missing_columns(connection)):
+            print(f"Adding column {table.name}.{column.name}...")
+            add_column(connection, table, column)
+        for backfill in BACKFILLS:
+            backfill(connection)
+    print("Database schema is up to date.")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,4 @@
+import os
+
+# Never touch the configured database from the tests
+os.environ["DATABASE_URL"] = "sqlite://"
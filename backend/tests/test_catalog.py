@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from app import ann_index, catalog, content_engine
+
+rng = np.random.default_rng(0)
+WORDS = sorted({"".join(rng.choice(list("abcdefghijklmnoprstuvw"), 6)) for _ in range(2000)})
+CAREER_NAMES = sorted({" ".join(rng.choice(WORDS, 3, replace=False)) for _ in range(5000)})
+# Two words that are each in some career name, rarely in the same one
+QUERIES = [" ".join(rng.choice(WORDS, 2, replace=False)) for _ in range(200)]
+
+
+@pytest.fixture
+def paths(tmp_path):
+    paths = {name: str(tmp_path / f"{name}.csv") for name in ("courses", "careers", "metadata")}
+    pd.DataFrame({"course_name": ["Diploma in Nursing"], "field": ["Health"], "description": ["Care."], "skills_tags": ["empathy"]}).to_csv(paths["courses"], index=False)
+    pd.DataFrame({"career_name": CAREER_NAMES}).to_csv(paths["careers"], index=False)
+    pd.DataFrame({"course_name": ["Diploma in Nursing"], **{field: ["N/A"] for field in catalog.CourseMetadata.FIELDS}}).to_csv(paths["metadata"], index=False)
+    return paths
+
+
+def load_catalog(paths):
+    return catalog.Catalog(1, paths["courses"], paths["careers"], paths["metadata"], families_path=paths["courses"] + ".missing")
+
+
+@pytest.fixture
+def exact_catalog(paths, tmp_path, monkeypatch):
+    monkeypatch.setattr(ann_index, "ANN_INDEX_DIR", str(tmp_path / "no-ann"))
+    loaded = load_catalog(paths)
+    assert isinstance(loaded.career_content, content_engine.ContentIndex)
+    return loaded
+
+
+@pytest.fixture
+def ann_catalog(paths, tmp_path, monkeypatch):
+    directory = tmp_path / "ann"
+    df = catalog.read_catalog_csv(paths["careers"], strip_columns=('career_name',))
+    ann_index.build(df, *catalog.CAREER_CONTENT_COLUMNS, str(directory / "careers"), paths["careers"])
+    monkeypatch.setattr(ann_index, "ANN_INDEX_DIR", str(directory))
+    loaded = load_catalog(paths)
+    assert isinstance(loaded.career_content, ann_index.ANNIndex)
+    return loaded
+
+
+def test_ann_candidates_are_rescored_in_tfidf_space(ann_catalog, exact_catalog):
+    exact = exact_catalog.career_content
+    for query in QUERIES[:20]:
+        positions, scores = ann_catalog._rescore_careers(query)
+        assert len(positions) == catalog.CAREER_MATCH_CANDIDATES
+        np.testing.assert_allclose(scores, exact.scores(exact.query(query))[positions], rtol=1e-5)
+        assert list(scores) == sorted(scores, reverse=True)
+
+
+def test_ann_career_match_uses_the_tfidf_threshold(ann_catalog, exact_catalog):
+    index, exact = ann_catalog.career_content, exact_catalog.career_content
+    inflated = 0
+    for query in QUERIES:
+        career = ann_catalog.resolve_career(query)
+        best_exact = exact.scores(exact.query(query)).max()
+        if career is not None:
+            position = CAREER_NAMES.index(career["career_name"])
+            assert exact.scores(exact.query(query))[position] >= catalog.CAREER_MATCH_MIN_SCORE
+        _, ann_scores = index.top_k(index.query(query), 1)
+        if ann_scores[0] >= catalog.CAREER_MATCH_MIN_SCORE and best_exact < catalog.CAREER_MATCH_MIN_SCORE:
+            # The SVD score alone would have accepted a match no TF-IDF score supports
+            assert career is None
+            inflated += 1
+    assert inflated > 0
+
+
+def test_exact_names_still_resolve_first(ann_catalog):
+    assert ann_catalog.resolve_career(CAREER_NAMES[7].upper())["career_name"] == CAREER_NAMES[7]
+    assert ann_catalog.resolve_career(" ".join(CAREER_NAMES[7].split()[:2]))["career_name"] == CAREER_NAMES[7]
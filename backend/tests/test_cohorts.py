@@ -0,0 +1,148 @@
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.compose import ColumnTransformer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import LabelEncoder
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import cohorts, models
+from app.recommender import CAREER_APTITUDE_FIELDS, Recommender
+
+SUBJECTS = ["Mathematics", "English", "Physics", "Biology"]
+GRADE_POINTS = {'A': 12, 'B': 9, 'C': 6, 'D': 3, 'E': 1}
+CAREER_COLUMNS = list(CAREER_APTITUDE_FIELDS) + [f"P{i}" for i in range(1, 9)]
+CAREERS = {"engineer": "Engineer", "nurse": "Nurse"}
+
+
+@pytest.fixture(scope="module")
+def scorer():
+    rng = np.random.default_rng(0)
+    course_inputs = pd.DataFrame(rng.integers(1, 13, size=(60, len(SUBJECTS))), columns=SUBJECTS)
+    course_inputs["interests"] = [[]] * 60
+    course_inputs["skills"] = [[]] * 60
+    course_pipeline = make_pipeline(ColumnTransformer([("grades", "passthrough", SUBJECTS)]), LogisticRegression(max_iter=1000))
+    course_pipeline.fit(course_inputs, rng.integers(0, 6, size=60))
+    career_label_encoder = LabelEncoder().fit(list(CAREERS))
+    career_pipeline = make_pipeline(LogisticRegression(max_iter=1000))
+    career_pipeline.fit(pd.DataFrame(rng.integers(0, 21, size=(60, len(CAREER_COLUMNS))), columns=CAREER_COLUMNS), rng.integers(0, 2, size=60))
+    catalog = SimpleNamespace(
+        course_families={1: {"name": "Engineering"}, 2: {"name": "Medicine"}},
+        resolve_career=lambda name: {"career_name": CAREERS[name]} if name in CAREERS else None,
+    )
+    recommender = SimpleNamespace(
+        all_subjects=SUBJECTS, grade_points=GRADE_POINTS,
+        snapshot=SimpleNamespace(
+            model_version="test",
+            chosen_course_model_key="random_forest_course", course_pipelines={"random_forest_course": course_pipeline},
+            career_model_pipeline=career_pipeline, career_label_encoder=career_label_encoder,
+        ),
+        catalog=SimpleNamespace(current=catalog),
+        _get_profile_rating=lambda points: Recommender._get_profile_rating(None, points),
+        _get_possible_course_types=lambda points: Recommender._get_possible_course_types(None, points),
+    )
+    return cohorts._CohortScorer(recommender)
+
+
+def read(csv_text, scorer):
+    chunk = pd.read_csv(io.StringIO(csv_text), dtype=str, keep_default_na=False)
+    return chunk.rename(columns=cohorts.column_names(chunk.columns, scorer.subjects))
+
+
+HEADER = "Student_Ref,mathematics,English,Physics," + ",".join(cohorts.APTITUDE_COLUMNS) + ",p1,p2,p3,p4,p5,p6,p7,p8\n"
+APTITUDES = ",".join(["10"] * 8)
+
+
+def test_valid_rows_are_scored(scorer):
+    chunk = read(HEADER + f"S1,A,b,B,{APTITUDES},AVG,best,,POOR,AVG,AVG,AVG,AVG\nS2, c ,D,,{APTITUDES},,,,,,,,\n", scorer)
+    results = scorer.score_chunk(chunk, first_row=10)
+    assert list(results.columns) == cohorts.RESULT_COLUMNS
+    assert results["row"].tolist() == [11, 12]
+    assert results["status"].tolist() == ["scored", "scored"]
+    assert results["average_points"].tolist() == [10.0, 4.5]
+    assert results["profile_rating"].tolist() == ["Excellent Profile", "Developing Profile"]
+    assert results["eligible_course_types"].tolist() == ["Bachelor's Degree;Diploma", "Certificate"]
+    assert set(results["career"]) <= set(CAREERS.values())
+    probabilities = results[[f"course_{rank}_probability" for rank in range(1, cohorts.TOP_COURSES + 1)]].to_numpy(dtype=float)
+    assert (np.diff(probabilities, axis=1) <= 0).all()
+    # Labels without a course family keep a generic name
+    assert "Course 6" in set(results[[f"course_{rank}" for rank in range(1, cohorts.TOP_COURSES + 1)]].to_numpy().ravel())
+
+
+def test_invalid_rows_are_reported_and_the_rest_scored(scorer):
+    chunk = read(HEADER + "".join([
+        f"ok,A,B,C,{APTITUDES},AVG,AVG,AVG,AVG,AVG,AVG,AVG,AVG\n",
+        f"grade,Z,B,C,{APTITUDES},AVG,AVG,AVG,AVG,AVG,AVG,AVG,AVG\n",
+        f"none,,,,{APTITUDES},AVG,AVG,AVG,AVG,AVG,AVG,AVG,AVG\n",
+        "aptitude,A,B,C,x," + ",".join(["1"] * 7) + ",AVG,AVG,AVG,AVG,AVG,AVG,AVG,AVG\n",
+        f"preference,A,B,C,{APTITUDES},MAYBE,AVG,AVG,AVG,AVG,AVG,AVG,AVG\n",
+    ]), scorer)
+    results = scorer.score_chunk(chunk, first_row=0).set_index(cohorts.REFERENCE_COLUMN)
+    assert results["status"].to_dict() == {
+        "ok": "scored", "grade": "invalid", "none": "invalid", "aptitude": "invalid", "preference": "invalid",
+    }
+    assert results.loc["grade", "error"] == "Unknown grade for Mathematics"
+    assert results.loc["none", "error"] == "No grades"
+    assert results.loc["aptitude", "error"] == "linguistic must be a whole number"
+    assert results.loc["preference", "error"] == "p1 must be POOR, AVG or BEST"
+    assert results.loc["grade", "course_1"] is None
+
+
+def test_unknown_and_missing_columns_are_rejected():
+    with pytest.raises(ValueError, match="Unknown columns: Latin"):
+        cohorts.column_names(["Mathematics", "Latin", *cohorts.APTITUDE_COLUMNS, *cohorts.PREFERENCE_COLUMNS], SUBJECTS)
+    with pytest.raises(ValueError, match="Missing columns: p8"):
+        cohorts.column_names(["Mathematics", *cohorts.APTITUDE_COLUMNS, *cohorts.PREFERENCE_COLUMNS[:-1]], SUBJECTS)
+
+
+@pytest.fixture
+def Session(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(cohorts, "SessionLocal", Session)
+    return Session
+
+
+def queue_jobs(Session, tmp_path, count):
+    db = Session()
+    jobs = []
+    for i in range(count):
+        path = tmp_path / f"{i}.csv"
+        path.write_text("Mathematics\n")
+        jobs.append(models.CohortJob(status="queued", input_path=str(path), cancel_requested=False))
+    db.add_all(jobs)
+    db.commit()
+    job_ids = [job.id for job in jobs]
+    db.close()
+    return job_ids
+
+
+def test_cancel_does_not_undo_a_claim(Session, tmp_path):
+    [job_id] = queue_jobs(Session, tmp_path, 1)
+    db = Session()
+    stale = db.get(models.CohortJob, job_id)
+    # The runner claims the job after the endpoint read it
+    assert cohorts.CohortJobRunner()._claim_next() == job_id
+
+    job = cohorts.cancel(db, stale)
+    assert (job.status, job.cancel_requested) == ("running", True)
+    assert (tmp_path / "0.csv").exists()
+    db.close()
+
+
+def test_cancelled_job_is_never_claimed(Session, tmp_path):
+    first, second = queue_jobs(Session, tmp_path, 2)
+    db = Session()
+    assert cohorts.cancel(db, db.get(models.CohortJob, first)).status == "cancelled"
+    db.close()
+    assert not (tmp_path / "0.csv").exists()
+    runner = cohorts.CohortJobRunner()
+    assert runner._claim_next() == second
+    assert runner._claim_next() is None
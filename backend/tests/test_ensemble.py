@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.tree import DecisionTreeClassifier
+
+from app.ensemble import CourseEnsemble, metric_weights
+
+rng = np.random.default_rng(0)
+FRAME = pd.DataFrame(rng.normal(size=(60, 3)), columns=["x", "y", "z"])
+LABELS = np.repeat([10, 20, 30, 40], 15)
+SCALER = StandardScaler().fit(FRAME)
+
+
+def pipeline(classifier, labels):
+    """A course pipeline whose classifier only saw the rows whose label is in `labels`.
+
+    The preprocessor is shared, as train.py fits the same one on the same data for every pipeline.
+    """
+    rows = np.isin(LABELS, labels)
+    classifier.fit(SCALER.transform(FRAME[rows]), LABELS[rows])
+    return Pipeline([("preprocessor", SCALER), ("classifier", classifier)])
+
+
+class Unscored:
+    """A classifier that must never be asked for probabilities."""
+
+    classes_ = np.array([10, 20])
+
+    def predict_proba(self, features):
+        raise AssertionError("a zero-weight model was scored")
+
+
+@pytest.fixture
+def pipelines():
+    return {
+        "low": pipeline(LogisticRegression(), [10, 20, 30]),
+        "high": pipeline(DecisionTreeClassifier(max_depth=2, random_state=0), [20, 30, 40]),
+    }
+
+
+def test_metric_weights():
+    metrics = {"xgboost_course": {"accuracy": 0.9}, "random_forest_course": {"accuracy": 0.6}, "svm_course": {"accuracy": -1}}
+    assert metric_weights(metrics, ["xgboost_course", "random_forest_course", "svm_course"]) == pytest.approx(
+        {"xgboost_course": 0.6, "random_forest_course": 0.4, "svm_course": 0.0})
+    # No usable metric for any model: equal weights
+    assert metric_weights({}, ["xgboost_course", "svm_course"]) == {"xgboost_course": 0.5, "svm_course": 0.5}
+    assert metric_weights(metrics, ["xgboost_course", "svm_course"], metric="f1") == {"xgboost_course": 0.5, "svm_course": 0.5}
+
+
+def test_probabilities_are_aligned_across_different_classes(pipelines):
+    ensemble = CourseEnsemble(pipelines, {"low": 0.25, "high": 0.75})
+    np.testing.assert_array_equal(ensemble.classes_, [10, 20, 30, 40])
+
+    rows = FRAME.iloc[:5]
+    low, high = pipelines["low"].predict_proba(rows), pipelines["high"].predict_proba(rows)
+    expected = np.zeros((5, 4))
+    expected[:, [0, 1, 2]] += 0.25 * low
+    expected[:, [1, 2, 3]] += 0.75 * high
+    blended = ensemble.predict_proba(rows)
+    np.testing.assert_allclose(blended, expected)
+    np.testing.assert_allclose(blended.sum(axis=1), 1.0)
+    # Features preprocessed once by the caller give the same result
+    np.testing.assert_allclose(ensemble.predict_proba_features(pipelines["low"][:-1].transform(rows)), blended)
+
+
+def test_weights_change_the_blend(pipelines):
+    rows = FRAME.iloc[:5]
+    only_low = CourseEnsemble(pipelines, {"low": 1.0, "high": 0.0}).predict_proba(rows)
+    np.testing.assert_allclose(only_low[:, :3], pipelines["low"].predict_proba(rows))
+    assert not only_low[:, 3].any()
+
+    only_high = CourseEnsemble({"extra": pipelines["low"], **pipelines}, {"high": 1.0}).predict_proba(rows)  # Missing weights count as 0
+    assert not only_high[:, 0].any()
+    np.testing.assert_allclose(only_high[:, 1:], pipelines["high"].predict_proba(rows))
+
+
+def test_zero_weight_models_are_not_scored(pipelines):
+    unscored = Pipeline([("preprocessor", SCALER), ("classifier", Unscored())])
+    ensemble = CourseEnsemble({**pipelines, "unscored": unscored}, {"low": 0.5, "high": 0.5, "unscored": 0.0})
+    np.testing.assert_allclose(ensemble.predict_proba(FRAME.iloc[:3]).sum(axis=1), 1.0)
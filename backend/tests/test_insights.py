@@ -0,0 +1,64 @@
+import os
+
+import pytest
+
+from app import insights
+
+
+@pytest.fixture
+def sources(tmp_path):
+    files = {
+        "students": "Mathematics,English,interests,skills,target_course_id\nA,B,x,y,1\nB,,x,y,1\nC,A,x,y,2\n",
+        "university_grades": "CGPA\n3.5\n2.75\n",
+        "university_points": "Calculus,Physics,CGPA\n4,3,3.5\n2,3,2.75\n",
+        "courses": "course_id,course_name\n1,Engineering\n2,Medicine\n",
+    }
+    paths = {}
+    for name, content in files.items():
+        paths[name] = str(tmp_path / f"{name}.csv")
+        with open(paths[name], "w") as f:
+            f.write(content)
+    return paths
+
+
+def test_views_are_computed_once_per_data_version(sources):
+    cache = insights.InsightsCache(sources)
+    assert cache.index()["views"] == ["cgpa-bins", "course-targets", "grade-distribution", "subject-correlations"]
+    version, body = cache.get("course-targets")
+    assert b'"course_name":"Engineering","students":2' in body
+    cache.get("cgpa-bins")
+    assert cache.computations == 1
+    with open(sources["university_grades"], "a") as f:
+        f.write("1.5\n")
+    new_version, body = cache.get("cgpa-bins")
+    assert new_version != version
+    assert b'"students":3' in body
+    assert cache.computations == 2
+
+
+def test_unknown_view_is_a_key_error(sources):
+    with pytest.raises(KeyError):
+        insights.InsightsCache(sources).get("nope")
+
+
+def test_a_missing_file_makes_the_insights_unavailable(sources):
+    cache = insights.InsightsCache(sources)
+    os.remove(sources["courses"])
+    with pytest.raises(insights.InsightsUnavailable, match="courses data file"):
+        cache.index()
+
+
+def test_an_unreadable_file_is_not_read_again_until_it_changes(sources, monkeypatch):
+    calls = []
+    compute_views = insights.compute_views
+    monkeypatch.setattr(insights, "compute_views", lambda paths: calls.append(1) or compute_views(paths))
+    cache = insights.InsightsCache(sources)
+    with open(sources["university_grades"], "w") as f:
+        f.write("GPA\n3.0\n")
+    for _ in range(2):
+        with pytest.raises(insights.InsightsUnavailable, match="could not be computed"):
+            cache.get("cgpa-bins")
+    assert len(calls) == 1
+    with open(sources["university_grades"], "w") as f:
+        f.write("CGPA\n3.0\n")
+    assert b'"students":1' in cache.get("cgpa-bins")[1]
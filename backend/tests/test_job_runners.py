@@ -0,0 +1,76 @@
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for train.py: prints a couple of stage lines, runs for a moment and succeeds
+STUB_TRAIN = """
+import time
+print("Starting model training process", flush=True)
+time.sleep(0.5)
+print("Model manifest for version v-stub written: model version v-stub", flush=True)
+"""
+
+# Starts the job runner process the way gunicorn.conf.py does, then reaps every child with
+# waitpid(-1), as soon as they exit, like gunicorn's Arbiter.reap_workers
+ARBITER = """
+import os, time
+from app import job_runners
+job_runners.ensure_running()
+while True:
+    try:
+        os.waitpid(-1, 0)
+    except ChildProcessError:
+        time.sleep(0.01)
+"""
+
+
+def wait_for_job(Session, job_id, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        db = Session()
+        try:
+            job = db.get(models.TrainingJob, job_id)
+            if job.status not in ("queued", "running"):
+                return job
+        finally:
+            db.close()
+        time.sleep(0.2)
+    raise AssertionError(f"training job {job_id} did not finish")
+
+
+def test_training_job_succeeds_under_a_reaping_parent(tmp_path):
+    (tmp_path / "train.py").write_text(textwrap.dedent(STUB_TRAIN))
+    database_url = f"sqlite:///{tmp_path / 'jobs.db'}"
+    engine = create_engine(database_url)
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    db = Session()
+    job = models.TrainingJob(status="queued", progress=0.0, cancel_requested=False)
+    db.add(job)
+    db.commit()
+    job_id = job.id
+    db.close()
+
+    env = dict(os.environ, DATABASE_URL=database_url, PYTHONPATH=BACKEND_DIR)
+    with open(tmp_path / "arbiter.log", "w") as log:
+        arbiter = subprocess.Popen([sys.executable, "-c", ARBITER], cwd=tmp_path, env=env, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    try:
+        job = wait_for_job(Session, job_id)
+    finally:
+        os.killpg(arbiter.pid, signal.SIGTERM)
+        arbiter.wait(30)
+        engine.dispose()
+
+    assert (job.status, job.exit_code, job.error) == ("succeeded", 0, None)
+    assert job.model_version == "v-stub"
+    assert job.progress == 1.0
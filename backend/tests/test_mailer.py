@@ -0,0 +1,130 @@
+import asyncio
+import smtplib
+import socket
+from collections import Counter
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from app import mailer
+
+
+class Handler:
+    """Accepts mail, except for the replies queued per recipient (e.g. ["451 Try later"])."""
+
+    def __init__(self):
+        self.delivered = []
+        self.sessions = set()
+        self.replies = {}
+        self.attempts = Counter()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        recipient = envelope.rcpt_tos[0]
+        self.attempts[recipient] += 1
+        replies = self.replies.get(recipient)
+        if replies:
+            return replies.pop(0)
+        self.delivered.append(recipient)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_server():
+    handler = Handler()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    controller = Controller(handler, hostname="127.0.0.1", port=port)
+    controller.start()
+    yield handler, port
+    controller.stop()
+
+
+def send(port, recipients, **options):
+    """Queues one email per recipient, then stops the outbox once each was sent or dropped."""
+    outbox = mailer.MailOutbox(host="127.0.0.1", port=port, username="", use_starttls=False,
+                               retry_base_delay=0.01, **options)
+
+    async def run():
+        outbox.start()
+        for recipient in recipients:
+            outbox.enqueue(recipient, "Subject", "Body")
+        # The queue is also empty while a batch is being sent
+        while outbox.sent_count + outbox.failed_count < len(recipients):
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(run())
+    return outbox
+
+
+def test_batches_share_one_connection(smtp_server):
+    handler, port = smtp_server
+    recipients = [f"user{i}@example.com" for i in range(7)]
+    outbox = send(port, recipients, batch_size=3)
+    assert handler.delivered == recipients
+    assert len(handler.sessions) == 1
+    assert (outbox.sent_count, outbox.failed_count) == (7, 0)
+
+
+def test_temporary_failures_are_retried(smtp_server):
+    handler, port = smtp_server
+    handler.replies["later@example.com"] = ["451 Try again later", "421 Busy"]
+    outbox = send(port, ["later@example.com", "now@example.com"])
+    assert handler.delivered == ["now@example.com", "later@example.com"]
+    assert handler.attempts["later@example.com"] == 3
+    assert (outbox.sent_count, outbox.failed_count) == (2, 0)
+
+
+def test_permanent_failures_are_not_retried(smtp_server):
+    handler, port = smtp_server
+    handler.replies["gone@example.com"] = ["550 No such user"]
+    outbox = send(port, ["gone@example.com", "ok@example.com"])
+    assert handler.delivered == ["ok@example.com"]
+    assert handler.attempts["gone@example.com"] == 1
+    assert (outbox.sent_count, outbox.failed_count) == (1, 1)
+
+
+def test_gives_up_after_max_retries(smtp_server):
+    handler, port = smtp_server
+    handler.replies["busy@example.com"] = ["451 Try again later"] * 10
+    outbox = send(port, ["busy@example.com"], max_retries=2)
+    assert handler.attempts["busy@example.com"] == 3
+    assert (outbox.sent_count, outbox.failed_count) == (0, 1)
+
+
+def test_stop_gives_mail_waiting_for_a_retry_a_last_attempt(smtp_server):
+    handler, port = smtp_server
+    handler.replies["later@example.com"] = ["451 Try again later"]
+    outbox = mailer.MailOutbox(host="127.0.0.1", port=port, username="", use_starttls=False, retry_base_delay=60)
+
+    async def run():
+        outbox.start()
+        outbox.enqueue("later@example.com", "Subject", "Body")
+        while not outbox._retries:
+            await asyncio.sleep(0.01)
+        await outbox.stop()
+
+    asyncio.run(run())
+    assert handler.delivered == ["later@example.com"]
+    assert (outbox.sent_count, outbox.failed_count) == (1, 0)
+
+
+def test_unreachable_server_is_a_temporary_failure():
+    outbox = send(1, ["user@example.com"], max_retries=1)
+    assert (outbox.sent_count, outbox.failed_count) == (0, 1)
+
+
+@pytest.mark.parametrize("error, temporary", [
+    (smtplib.SMTPServerDisconnected("gone"), True),
+    (ConnectionRefusedError(), True),
+    (smtplib.SMTPDataError(451, b"later"), True),
+    (smtplib.SMTPDataError(554, b"rejected"), False),
+    (smtplib.SMTPSenderRefused(550, b"no", "from@example.com"), False),
+    (smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"no")}), False),
+    (smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"no"), "b@example.com": (452, b"full")}), True),
+    (smtplib.SMTPNotSupportedError(), False),
+])
+def test_is_temporary(error, temporary):
+    assert mailer.is_temporary(error) is temporary
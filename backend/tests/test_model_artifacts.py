@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+import time
+
+import joblib
+
+from app import model_artifacts
+
+DEBOUNCE_SECONDS = 0.2
+
+
+def setup_artifacts(tmp_path):
+    paths = {"model": str(tmp_path / "model.joblib"), "metrics": str(tmp_path / "model_metrics.json")}
+    manifest_path = str(tmp_path / "model_manifest.json")
+    model_artifacts.publish({paths["model"]: {"weights": [1, 2]}, paths["metrics"]: {"accuracy": 0.5}}, "v1", manifest_path)
+    watcher = model_artifacts.ArtifactWatcher(paths.values(), manifest_path, debounce_seconds=DEBOUNCE_SECONDS)
+    return paths, manifest_path, watcher
+
+
+def test_publish_writes_the_artifacts_and_then_the_manifest(tmp_path):
+    paths, manifest_path, _ = setup_artifacts(tmp_path)
+    assert joblib.load(paths["model"]) == {"weights": [1, 2]}
+    manifest = model_artifacts.read_manifest(manifest_path)
+    assert manifest["model_version"] == "v1"
+    assert manifest["artifacts"]["model.joblib"]["sha256"] == model_artifacts.file_checksum(paths["model"])
+    # Nothing staged is left behind
+    assert sorted(os.listdir(tmp_path)) == ["model.joblib", "model_manifest.json", "model_metrics.json"]
+
+
+def test_a_published_run_is_reloaded_at_once_and_only_once(tmp_path):
+    paths, manifest_path, watcher = setup_artifacts(tmp_path)
+    assert not watcher.reload_due()
+    model_artifacts.publish({paths["model"]: {"weights": [3]}, paths["metrics"]: {"accuracy": 0.9}}, "v2", manifest_path)
+    assert watcher.reload_due()
+    watcher.mark_loaded()
+    assert not watcher.reload_due()
+
+
+def test_artifacts_ahead_of_the_manifest_wait_for_the_quiet_period(tmp_path):
+    paths, manifest_path, watcher = setup_artifacts(tmp_path)
+    # A run still renaming its files: the model is new, the manifest is not
+    joblib.dump({"weights": [3]}, paths["model"])
+    assert not watcher.reload_due()
+    time.sleep(DEBOUNCE_SECONDS + 0.05)
+    assert watcher.reload_due()
+
+
+def test_changes_restart_the_quiet_period(tmp_path):
+    paths, manifest_path, watcher = setup_artifacts(tmp_path)
+    os.remove(manifest_path)
+    with open(paths["metrics"], "w") as f:
+        json.dump({"accuracy": 0.6}, f)
+    assert not watcher.reload_due()
+    time.sleep(DEBOUNCE_SECONDS * 0.75)
+    joblib.dump({"weights": [4]}, paths["model"])
+    assert not watcher.reload_due()
+    time.sleep(DEBOUNCE_SECONDS * 0.75)
+    assert not watcher.reload_due()
+    assert watcher.wait(DEBOUNCE_SECONDS * 2)
+
+
+def test_wait_returns_false_when_nothing_changes(tmp_path):
+    _, _, watcher = setup_artifacts(tmp_path)
+    start = time.monotonic()
+    assert not watcher.wait(0.1)
+    assert time.monotonic() - start >= 0.1
+
+
+def test_the_inotify_watcher_wakes_wait_on_publish(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_artifacts, "MODEL_POLL_INTERVAL_SECONDS", 10)
+    paths, manifest_path, watcher = setup_artifacts(tmp_path)
+    watcher.start()
+    assert watcher.inotify
+    publisher = threading.Timer(0.2, model_artifacts.publish, args=(
+        {paths["model"]: {"weights": [5]}, paths["metrics"]: {"accuracy": 1.0}}, "v3", manifest_path))
+    try:
+        start = time.monotonic()
+        publisher.start()
+        assert watcher.wait(10)
+        # Polling would only have noticed after 10s
+        assert time.monotonic() - start < 2
+    finally:
+        publisher.join()
+        watcher.stop()
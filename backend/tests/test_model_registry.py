@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import pytest
+from pydantic import TypeAdapter
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import model_registry, models, schemas
+
+SCORES = {"accuracy": 0.9, "precision": 0.8, "recall": 0.7, "f1_score": 0.75}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    start = datetime(2026, 1, 1)
+    for day, model_version in enumerate(["v1", "v2"]):
+        for model_name in ("xgboost_course", "career_recommendation"):
+            session.add(models.ModelMetric(model_name=model_name, model_version=model_version, training_time_seconds=12.5 + day,
+                                           created_at=start + timedelta(days=day), **SCORES))
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_latest_metrics_keep_the_original_contract(db):
+    metrics = model_registry.LatestMetricsCache().get(db, "v1")
+    # /model-metrics/ returns the scores only; the extra run details are in the history
+    assert metrics == {"xgboost_course": SCORES, "career_recommendation": SCORES}
+    adapter = TypeAdapter(Dict[str, schemas.ModelMetrics])
+    assert adapter.dump_python(adapter.validate_python(metrics)) == metrics
+
+
+def test_unknown_version_falls_back_to_the_latest_run(db):
+    assert model_registry.get_run_metrics(db, "gone") == model_registry.get_run_metrics(db, "v2")
+
+
+def test_history_has_versions_and_training_times(db):
+    history = TypeAdapter(List[schemas.ModelMetricsRun]).validate_python(model_registry.get_metrics_history(db, model_name="xgboost_course"))
+    assert [run.model_version for run in history] == ["v1", "v2"]
+    assert [list(run.models) for run in history] == [["xgboost_course"], ["xgboost_course"]]
+    assert [run.models["xgboost_course"].training_time_seconds for run in history] == [12.5, 13.5]
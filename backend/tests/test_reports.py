@@ -0,0 +1,105 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models, reports
+
+CATALOG = SimpleNamespace(
+    version="catalog-1",
+    find_course=lambda name: {"course_name": name, "description": f"About {name}"} if name == "Data Science" else None,
+    lookup_course_metadata=lambda name: ("High", "Growing", "Low") if name == "data science" else None,
+    find_career=lambda name: {"description": "Builds models"} if name == "Data Scientist" else None,
+)
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        models.User(id=1, username="bob", email="bob@example.com", school_attended="Hill School"),
+        models.User(id=2, username="eve", email="eve@example.com"),
+        models.Recommendation(user_id=1, set_id="set1", course_name="Bachelor of Data Science", course_type="Degree"),
+        models.Recommendation(user_id=1, set_id="set1", career_name="Data Scientist"),
+        # A row another user saved under the same set ID cannot join bob's report
+        models.Recommendation(user_id=2, set_id="set1", course_name="Forged Course"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_a_report_holds_only_its_owners_rows(db):
+    report = reports.collect_report(db, "set1", 1, CATALOG)
+    assert report["student"] == "bob"
+    assert [course["name"] for course in report["courses"]] == ["Bachelor of Data Science"]
+    assert report["courses"][0]["description"] == "About Data Science"
+    assert report["courses"][0]["automation_risk"] == "Low"
+    assert report["careers"] == [{"name": "Data Scientist", "description": "Builds models"}]
+    assert [course["name"] for course in reports.collect_report(db, "set1", 2, CATALOG)["courses"]] == ["Forged Course"]
+    with pytest.raises(reports.ReportNotFound):
+        reports.collect_report(db, "missing", 1, CATALOG)
+
+
+def test_set_owner_and_list_sets(db):
+    db.add(models.Recommendation(user_id=1, set_id="set2", course_name="Diploma in Nursing"))
+    db.commit()
+    assert reports.set_owner(db, "set2") == 1
+    assert reports.set_owner(db, "missing") is None
+    assert [s["set_id"] for s in reports.list_sets(db, [1])] == ["set1", "set2"]
+
+
+def test_report_cache_evicts_the_least_recently_used():
+    cache = reports.ReportCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    assert cache.get("a") == b"1234"
+    cache.put("c", b"1234")
+    assert cache.get("b") is None
+    assert cache.get("a") == cache.get("c") == b"1234"
+    # Larger than the whole cache: never stored
+    cache.put("d", b"x" * 11)
+    assert cache.get("d") is None
+    assert (cache.hits, cache.misses) == (3, 2)
+
+
+@pytest.fixture
+def renders(monkeypatch):
+    calls = []
+
+    def render(report, report_format):
+        calls.append((report["set_id"], report_format))
+        return f"{len(report['courses'])} courses".encode()
+
+    monkeypatch.setattr(reports, "render", render)
+    monkeypatch.setattr(reports, "_get_pool", lambda: pool)
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        yield calls
+
+
+def test_rendered_reports_are_cached_until_rows_are_added(db, renders):
+    cache = reports.ReportCache()
+
+    def render_report():
+        report = reports.collect_report(db, "set1", 1, CATALOG)
+        return asyncio.run(reports.render_report(report, "html", cache))
+
+    assert render_report() == b"1 courses"
+    assert render_report() == b"1 courses"
+    assert len(renders) == 1
+    db.add(models.Recommendation(user_id=1, set_id="set1", course_name="Diploma in Nursing"))
+    db.commit()
+    assert render_report() == b"2 courses"
+    assert len(renders) == 2
+
+
+def test_file_names_keep_only_safe_characters():
+    report = {"student": "../../etc/passwd", "set_id": 'x"; filename=evil.sh'}
+    assert reports.report_filename(report, "html") == "______etc_passwd-x___filename_evil_sh.html"
+    assert reports.safe_filename(None) == "N_A"
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+from pydantic import TypeAdapter
+
+from app import schemas
+from app.response_json import RecommendationsRenderer
+
+ADAPTER = TypeAdapter(schemas.Recommendations)
+
+
+def item(**fields):
+    return {
+        "id": 1, "name": "Bachelor of Data Science", "type": "Bachelor's Degree", "similarity_score": 0.4213,
+        "description": "Statistics and programming.", "reasoning": "It aligns with your interests in Programming.",
+        "job_applicability": "High", "future_trends": "Growing", "automation_risk": "Low",
+        **fields,
+    }
+
+
+def recommendations(courses, careers=(), **fields):
+    return {
+        "average_points": 9.571428571428571, "profile_rating": "Strong Profile", "model_accuracy": 0.9867,
+        "course_model": "xgboost_course",
+        "subject_grades_points": [{"subject": "Mathematics", "grade": "A", "points": 12}, {"subject": "English", "grade": "B+", "points": 10}],
+        "courses": list(courses), "careers": list(careers),
+        **fields,
+    }
+
+
+def assert_same_bytes(renderer, response, catalog_version=1):
+    assert renderer.render(response, catalog_version) == ADAPTER.dump_json(ADAPTER.validate_python(response))
+
+
+@pytest.mark.parametrize("response", [
+    recommendations([item()], [item(id=2, name="Data Analyst", type="career", similarity_score=1.0)]),
+    # Items not saved yet have no ID
+    recommendations([item(id=None)], [item(id=None, type="career")]),
+    # course_type is never set by recommend(), so it is rendered as null; set, it is kept
+    recommendations([item(course_type=None), item(id=2, course_type="Diploma")]),
+    # Extra keys are dropped, as validation does
+    recommendations([item(skills_tags="python, statistics", matched=["Programming"])]),
+    recommendations([item(
+        name="Diploma in Café Management – Nairobi",
+        description='Quotes " and backslashes \\ and a\nnewline, a\ttab, \x01 control, </script> and \u2028 \u2029 separators',
+        reasoning="Emoji 🎓 and Kiswahili: Elimu ni ufunguo wa maisha.",
+        job_applicability="Ελληνικά", future_trends="中文", automation_risk="é́",
+    )]),
+    # Integer-valued floats, plain ints in float fields and numpy scalars
+    recommendations([item(similarity_score=1.0), item(id=2, similarity_score=0), item(id=3, similarity_score=np.float64(0.25))],
+                    average_points=0, model_accuracy=1.0),
+    recommendations([item(similarity_score=np.float32(0.1))], average_points=10.0, model_accuracy=np.float64(0.9)),
+    recommendations([], [], course_model=None, subject_grades_points=[]),
+])
+def test_render_matches_pydantic(response):
+    assert_same_bytes(RecommendationsRenderer(), response)
+
+
+def test_cached_fragments_render_the_same_bytes():
+    renderer = RecommendationsRenderer()
+    response = recommendations([item(), item(id=2, similarity_score=0.1, reasoning="Another reason.")])
+    assert_same_bytes(renderer, response)
+    misses = renderer.misses
+    assert_same_bytes(renderer, {**response, "average_points": 8.0, "courses": [item(id=7, similarity_score=0.9)]})
+    assert renderer.misses == misses
+
+
+def test_catalog_version_change_clears_the_fragments():
+    renderer = RecommendationsRenderer()
+    response = recommendations([item()])
+    assert_same_bytes(renderer, response, catalog_version=1)
+    misses = renderer.misses
+    assert_same_bytes(renderer, response, catalog_version=1)
+    assert renderer.misses == misses
+
+    # The next catalog version may describe the same course differently
+    assert_same_bytes(renderer, response, catalog_version=2)
+    assert renderer.misses == 2 * misses
+    changed = recommendations([item(description="Rewritten in the new catalog.")])
+    assert_same_bytes(renderer, changed, catalog_version=2)
+
+
+def test_full_cache_is_emptied_and_refilled():
+    renderer = RecommendationsRenderer(max_items=3)
+    for position in range(5):
+        assert_same_bytes(renderer, recommendations([item(description=f"Course {position}.")]))
+    assert len(renderer._fragments) <= 3
@@ -0,0 +1,204 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.models import Student
+from app.recommender import Recommender
+from app.serving import COURSE_MODEL_SHADOW_DROPPED, ServingPolicy, parse_split
+
+GRADE_POINTS = {'A': 12, 'A-': 11, 'B+': 10, 'B': 9, 'B-': 8, 'C+': 7, 'C': 6, 'C-': 5, 'D+': 4, 'D': 3, 'D-': 2, 'E': 1}
+STUDENT = Student(
+    grades={"Mathematics": "A", "Physics": "B"}, interests=["Programming"], skills=[], linguistic=1, musical=1, bodily=1,
+    logicalMathematical=1, spatialVisualization=1, interpersonal=1, intrapersonal=1, naturalist=1,
+    **{f"p{i}": "AVG" for i in range(1, 9)},
+)
+
+
+class RecordingPolicy:
+    """Stands in for ServingPolicy and records which pipelines a request used."""
+
+    def __init__(self):
+        self.served, self.shadowed = [], []
+
+    def choose(self, user_id, available, default):
+        return default
+
+    def predict_proba(self, name, pipeline, frame, features=None):
+        self.served.append(pipeline)
+        return np.array([[0.6, 0.4]])
+
+    def submit_shadow(self, frame, serving_name, served_classes, pipelines, features=None):
+        self.shadowed.extend(pipeline for name, pipeline in pipelines.items() if name != serving_name)
+
+
+def model_snapshot(run):
+    def course_pipeline(name):
+        return SimpleNamespace(run=run, name=name, classes_=np.array([0, 1]))
+
+    career_pipeline = SimpleNamespace(run=run, predict=lambda frame: np.zeros(len(frame), dtype=int))
+    return SimpleNamespace(
+        run=run,
+        course_pipelines={"random_forest_course": course_pipeline("random_forest_course"), "xgboost_course": course_pipeline("xgboost_course")},
+        chosen_course_model_key="xgboost_course",
+        course_model_accuracies={"random_forest_course": 0.5, "xgboost_course": 0.6},
+        career_model_pipeline=career_pipeline,
+        career_label_encoder=SimpleNamespace(inverse_transform=lambda labels: np.array([f"Career {run}"] * len(labels))),
+    )
+
+
+class ReloadingRecommender(Recommender):
+    """Publishes a new snapshot every time one is read, as if a reload landed between any two reads."""
+
+    def __init__(self):
+        self._runs = itertools.count(1)
+        self.read_runs = []
+        self.grade_points = GRADE_POINTS
+        self.all_subjects = ["Mathematics", "Physics", "English"]
+        self.serving_policy = RecordingPolicy()
+        catalog = SimpleNamespace(match_course=lambda *args: None, resolve_career=lambda name: None)
+        self.catalog = SimpleNamespace(current=catalog)
+
+    @property
+    def snapshot(self):
+        run = next(self._runs)
+        self.read_runs.append(run)
+        return model_snapshot(run)
+
+
+def test_serving_and_shadow_models_come_from_one_reload():
+    recommender = ReloadingRecommender()
+    result = recommender.recommend(STUDENT, user_id=1)
+
+    assert len(recommender.read_runs) == 1
+    run = recommender.read_runs[0]
+    policy = recommender.serving_policy
+    assert [(p.run, p.name) for p in policy.served] == [(run, "xgboost_course")]
+    assert [(p.run, p.name) for p in policy.shadowed] == [(run, "random_forest_course")]
+    assert result["careers"][0]["name"] == f"Career {run}"
+    assert result["model_accuracy"] == 0.6
+
+
+def test_recommend_uses_the_snapshot_it_is_given():
+    recommender = ReloadingRecommender()
+    given = model_snapshot("given")
+    result = recommender.recommend(STUDENT, user_id=1, snapshot=given)
+
+    assert recommender.read_runs == []
+    assert recommender.serving_policy.served == [given.course_pipelines["xgboost_course"]]
+    assert result["careers"][0]["name"] == "Career given"
+
+
+class RecordingExecutor:
+    """Stands in for the shadow thread pool: records the jobs without running them."""
+
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, function, *args):
+        self.jobs.append(args)
+
+
+def shadow_policy(**options):
+    policy = ServingPolicy(shadow=True, **options)
+    policy._executor = RecordingExecutor()
+    return policy
+
+
+class FixedPipeline:
+    def __init__(self, probabilities):
+        self.probabilities = np.array([probabilities], dtype=float)
+        self.classes_ = np.arange(len(probabilities))
+
+    def predict_proba(self, frame):
+        return self.probabilities
+
+
+def test_parse_split():
+    assert parse_split("xgboost_course=80, random_forest_course=20,svm_course=0,ensemble") == {
+        "xgboost_course": 80.0, "random_forest_course": 20.0, "ensemble": 1.0,
+    }
+    assert parse_split("") == {}
+    with pytest.raises(ValueError, match="svm_course"):
+        parse_split("svm_course=lots")
+
+
+def test_split_is_sticky_per_user():
+    available = {"a": None, "b": None, "c": None}
+    policy = ServingPolicy(split={"a": 1, "b": 1, "c": 1})
+    first = [policy.choose(user_id, available, "a") for user_id in range(200)]
+    # Same user, same model: across calls and across processes that share the salt
+    assert [policy.choose(user_id, available, "a") for user_id in range(200)] == first
+    assert [ServingPolicy(split={"a": 1, "b": 1, "c": 1}).choose(user_id, available, "a") for user_id in range(200)] == first
+    assert set(first) == {"a", "b", "c"}
+
+
+def test_split_ratios_roughly_hold():
+    available = {"xgboost_course": None, "random_forest_course": None}
+    policy = ServingPolicy(split={"xgboost_course": 80, "random_forest_course": 20})
+    chosen = [policy.choose(user_id, available, "xgboost_course") for user_id in range(20000)]
+    assert chosen.count("random_forest_course") / len(chosen) == pytest.approx(0.2, abs=0.015)
+
+
+def test_split_skips_models_that_are_not_loaded():
+    policy = ServingPolicy(split={"ensemble": 50, "svm_course": 50})
+    assert {policy.choose(user_id, {"svm_course": None, "xgboost_course": None}, "xgboost_course") for user_id in range(100)} == {"svm_course"}
+    assert {policy.choose(user_id, {"xgboost_course": None}, "xgboost_course") for user_id in range(100)} == {"xgboost_course"}
+    # Anonymous callers (what-if without a user, cohorts) get the default
+    assert policy.choose(None, {"svm_course": None}, "xgboost_course") == "xgboost_course"
+    assert ServingPolicy().choose(7, {"svm_course": None}, "xgboost_course") == "xgboost_course"
+
+
+PIPELINES = {"a": FixedPipeline([0.1, 0.2, 0.3, 0.4, 0, 0]), "b": FixedPipeline([0.4, 0.3, 0.2, 0.1, 0, 0])}
+
+
+def test_shadow_sampling_rate():
+    np.random.seed(0)
+    policy = shadow_policy(shadow_sample_rate=0.25, max_pending=10 ** 6)
+    for _ in range(8000):
+        policy.submit_shadow(None, "a", [3, 2, 1, 0, 4], PIPELINES)
+    assert len(policy._executor.jobs) / 8000 == pytest.approx(0.25, abs=0.02)
+    # Only the models that did not serve are shadowed
+    assert {tuple(job[3]) for job in policy._executor.jobs} == {("b",)}
+
+
+def test_shadow_jobs_are_dropped_at_the_pending_limit():
+    policy = shadow_policy(max_pending=3)
+    dropped = COURSE_MODEL_SHADOW_DROPPED.labels().value
+    for _ in range(5):
+        policy.submit_shadow(None, "a", [3, 2, 1, 0, 4], PIPELINES)
+    assert len(policy._executor.jobs) == 3
+    assert COURSE_MODEL_SHADOW_DROPPED.labels().value == dropped + 2
+    assert policy.stats()["shadow_pending"] == 3
+
+    # A finished job frees its slot
+    frame, features, served_classes, shadows = policy._executor.jobs[0]
+    policy._score_shadows(frame, features, served_classes, shadows)
+    policy.submit_shadow(None, "a", [3, 2, 1, 0, 4], PIPELINES)
+    assert len(policy._executor.jobs) == 4
+
+
+def test_no_shadow_scoring_when_off_or_alone():
+    policy = ServingPolicy(shadow=False)
+    policy._executor = RecordingExecutor()
+    policy.submit_shadow(None, "a", [0], PIPELINES)
+    alone = shadow_policy()
+    alone.submit_shadow(None, "a", [0], {"a": PIPELINES["a"]})
+    assert policy._executor.jobs == alone._executor.jobs == []
+
+
+def test_shadow_agreement_stats():
+    policy = shadow_policy()
+    ranked_first = [0.3, 0.25, 0.2, 0.15, 0.1, 0.0]
+    pipelines = {"a": FixedPipeline(ranked_first), "b": FixedPipeline(ranked_first[::-1]), "c": FixedPipeline(ranked_first)}
+    policy.submit_shadow(None, "a", [0, 1, 2, 3, 4], pipelines)
+    [job] = policy._executor.jobs
+    policy._score_shadows(*job)
+
+    models = policy.stats()["models"]
+    # b ranks class 5 first and shares four of the served top 5; c ranks exactly as a did
+    assert (models["b"]["shadowed"], models["b"]["top1_agreement"], models["b"]["top5_overlap"]) == (1, 0.0, 0.8)
+    assert (models["c"]["shadowed"], models["c"]["top1_agreement"], models["c"]["top5_overlap"]) == (1, 1.0, 1.0)
+    assert "a" not in models
+    assert policy.stats()["shadow_pending"] == 0
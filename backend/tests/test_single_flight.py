@@ -0,0 +1,81 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.models import Student
+from app.single_flight import SINGLE_FLIGHT_CALLS, SingleFlight, profile_key
+
+STUDENT = dict(
+    grades={"Mathematics": "A"}, interests=["Programming"], skills=[], linguistic=1, musical=1, bodily=1,
+    logicalMathematical=1, spatialVisualization=1, interpersonal=1, intrapersonal=1, naturalist=1,
+    **{f"p{i}": "AVG" for i in range(1, 9)},
+)
+
+
+def wait_for_followers(count, before):
+    # Followers count themselves as coalesced once they are bound to the leader's call
+    coalesced = SINGLE_FLIGHT_CALLS.labels(result="coalesced")
+    while coalesced.value < before + count:
+        time.sleep(0.001)
+
+
+def test_concurrent_callers_share_one_call():
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "result"
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(single_flight.do, "key", compute)
+        started.wait(5)
+        before = SINGLE_FLIGHT_CALLS.labels(result="coalesced").value
+        followers = [pool.submit(single_flight.do, "key", compute) for _ in range(3)]
+        wait_for_followers(3, before)
+        release.set()
+        assert leader.result() == ("result", False)
+        assert [f.result() for f in followers] == [("result", True)] * 3
+    assert len(calls) == 1
+    assert single_flight.pending() == 0
+
+
+def test_exception_is_raised_in_every_caller():
+    single_flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError("bad profile")
+
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        leader = pool.submit(single_flight.do, "key", compute)
+        started.wait(5)
+        before = SINGLE_FLIGHT_CALLS.labels(result="coalesced").value
+        follower = pool.submit(single_flight.do, "key", compute)
+        wait_for_followers(1, before)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(ValueError, match="bad profile"):
+                future.result()
+    assert single_flight.pending() == 0
+
+
+def test_results_are_not_cached():
+    single_flight = SingleFlight()
+    results = iter([1, 2])
+    assert single_flight.do("key", lambda: next(results)) == (1, False)
+    assert single_flight.do("key", lambda: next(results)) == (2, False)
+
+
+def test_profile_key_depends_on_the_profile_and_versions():
+    student = Student(**STUDENT)
+    assert profile_key(student, "v1") == profile_key(Student(**STUDENT), "v1")
+    assert profile_key(student, "v1") != profile_key(student, "v2")
+    assert profile_key(student, "v1") != profile_key(Student(**{**STUDENT, "musical": 2}), "v1")
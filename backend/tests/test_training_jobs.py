@@ -0,0 +1,235 @@
+import asyncio
+import os
+import signal
+import sys
+import textwrap
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app import models, training_jobs
+
+
+@pytest.fixture
+def Session(monkeypatch):
+    engine = create_engine("sqlite://", poolclass=StaticPool, connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(bind=engine)
+    monkeypatch.setattr(training_jobs, "SessionLocal", Session)
+    monkeypatch.setattr(training_jobs, "TRAINING_POLL_SECONDS", 0.05)
+    monkeypatch.setattr(training_jobs, "TRAINING_KILL_GRACE_SECONDS", 0.5)
+    return Session
+
+
+def stub(script):
+    """A command that stands in for train.py."""
+    return [sys.executable, "-c", textwrap.dedent(script)]
+
+
+def submit(Session, count=1):
+    db = Session()
+    try:
+        return [training_jobs.submit(db, requested_by="test").id for _ in range(count)]
+    finally:
+        db.close()
+
+
+def get(Session, job_id):
+    db = Session()
+    try:
+        return db.get(models.TrainingJob, job_id)
+    finally:
+        db.close()
+
+
+def run_next(runner):
+    job_id = runner._claim_next()
+    asyncio.run(runner.run_job(job_id))
+    return job_id
+
+
+def alive(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+STAGES_THEN_EXIT = """
+    import sys
+    print("Starting model training process", flush=True)
+    print("unrelated output", flush=True)
+    print("Training the XGBoost course model...", flush=True)
+    # Stages are only ever reached in order: this earlier one is ignored
+    print("Training the Random Forest course model...", flush=True)
+    sys.exit(3)
+"""
+
+SUCCEEDS = "".join(f"print({prefix!r}, flush=True)\n" for prefix, _ in training_jobs.TRAINING_STAGES[:-1]) + (
+    'print("Model manifest for version 20260101-abc written: model version 20260101-abc", flush=True)\n'
+)
+
+# Starts a grandchild in the same process group, then ignores SIGTERM so only SIGKILL stops it
+HANGS = """
+    import signal, subprocess, sys, time
+    child = subprocess.Popen(["sleep", "60"])
+    print(child.pid, flush=True)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    print("Starting model training process", flush=True)
+    time.sleep(60)
+"""
+
+
+def test_stage_lines_advance_progress_and_exit_code_fails_the_job(Session, tmp_path):
+    [job_id] = submit(Session)
+    runner = training_jobs.TrainingJobRunner(command=stub(STAGES_THEN_EXIT), log_dir=str(tmp_path))
+    run_next(runner)
+
+    job = get(Session, job_id)
+    assert (job.status, job.exit_code, job.error) == ("failed", 3, "train.py exited with code 3")
+    assert job.stage == "training xgboost"
+    assert job.progress == pytest.approx(3 / len(training_jobs.TRAINING_STAGES))
+    assert "unrelated output" in training_jobs.log_tail(job.log_path)
+
+
+def test_successful_run_records_the_model_version(Session, tmp_path):
+    [job_id] = submit(Session)
+    runner = training_jobs.TrainingJobRunner(command=stub(SUCCEEDS), log_dir=str(tmp_path))
+    run_next(runner)
+
+    job = get(Session, job_id)
+    assert (job.status, job.exit_code, job.error) == ("succeeded", 0, None)
+    assert (job.stage, job.progress, job.model_version) == ("published", 1.0, "20260101-abc")
+
+
+def test_one_run_at_a_time_in_submission_order(Session, tmp_path):
+    job_ids = submit(Session, 3)
+    db = Session()
+    assert [training_jobs.describe(db, db.get(models.TrainingJob, job_id))["queue_position"] for job_id in job_ids] == [0, 1, 2]
+    db.close()
+
+    runner = training_jobs.TrainingJobRunner(command=stub("import time; time.sleep(0.2)"), log_dir=str(tmp_path))
+
+    async def run():
+        task = asyncio.create_task(runner.run_forever())
+        running_seen = []
+        while get(Session, job_ids[-1]).status != "succeeded":
+            running = [job_id for job_id in job_ids if get(Session, job_id).status == "running"]
+            assert len(running) <= 1
+            running_seen.extend(running)
+            await asyncio.sleep(0.02)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return running_seen
+
+    running_seen = asyncio.run(run())
+    assert sorted(set(running_seen), key=running_seen.index) == job_ids
+    jobs = [get(Session, job_id) for job_id in job_ids]
+    for earlier, later in zip(jobs, jobs[1:]):
+        assert earlier.finished_at <= later.started_at
+
+
+def record_killpg(monkeypatch):
+    calls = []
+    real_killpg = os.killpg
+
+    def killpg(pgid, sig):
+        calls.append(sig)
+        real_killpg(pgid, sig)
+
+    monkeypatch.setattr(training_jobs.os, "killpg", killpg)
+    return calls
+
+
+def grandchild_pid(job):
+    return int(training_jobs.log_tail(job.log_path)[0])
+
+
+def test_cancel_stops_the_whole_process_group(Session, tmp_path, monkeypatch):
+    calls = record_killpg(monkeypatch)
+    [job_id] = submit(Session)
+    runner = training_jobs.TrainingJobRunner(command=stub(HANGS), log_dir=str(tmp_path))
+
+    async def run():
+        claimed = await asyncio.to_thread(runner._claim_next)
+        task = asyncio.create_task(runner.run_job(claimed))
+        while get(Session, job_id).stage is None:
+            await asyncio.sleep(0.02)
+        db = Session()
+        training_jobs.cancel(db, db.get(models.TrainingJob, job_id))
+        db.close()
+        await task
+
+    asyncio.run(run())
+    job = get(Session, job_id)
+    assert (job.status, job.error, job.exit_code) == ("cancelled", "cancelled on request", -signal.SIGKILL)
+    assert calls == [signal.SIGTERM, signal.SIGKILL]
+    deadline = time.monotonic() + 5
+    while alive(grandchild_pid(job)) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not alive(grandchild_pid(job))
+
+
+def test_timeout_stops_the_process_group(Session, tmp_path, monkeypatch):
+    calls = record_killpg(monkeypatch)
+    monkeypatch.setattr(training_jobs, "TRAINING_TIMEOUT_SECONDS", 0.3)
+    [job_id] = submit(Session)
+    runner = training_jobs.TrainingJobRunner(command=stub("import time; time.sleep(60)"), log_dir=str(tmp_path))
+    run_next(runner)
+
+    job = get(Session, job_id)
+    assert (job.status, job.exit_code) == ("timed_out", -signal.SIGTERM)
+    assert job.error == "stopped after the 0.3s timeout"
+    assert calls == [signal.SIGTERM]
+
+
+def test_cpu_time_limit_is_reported(Session, tmp_path, monkeypatch):
+    monkeypatch.setattr(training_jobs, "TRAINING_CPU_SECONDS", 1)
+    monkeypatch.setattr(training_jobs, "TRAINING_KILL_GRACE_SECONDS", 2)
+    [job_id] = submit(Session)
+    runner = training_jobs.TrainingJobRunner(command=stub("while True: pass"), log_dir=str(tmp_path))
+    assert runner.command[:4] == ["prlimit", "--cpu=1:3", "--core=0", "--"]
+    run_next(runner)
+
+    job = get(Session, job_id)
+    assert (job.status, job.exit_code) == ("failed", -signal.SIGXCPU)
+    assert job.error == "stopped at the 1s CPU time limit"
+
+
+def test_cancel_does_not_undo_a_claim(Session, tmp_path):
+    [job_id] = submit(Session)
+    db = Session()
+    stale = db.get(models.TrainingJob, job_id)
+    assert stale.status == "queued"
+    # The runner claims the job after the endpoint read it
+    runner = training_jobs.TrainingJobRunner(log_dir=str(tmp_path))
+    assert runner._claim_next() == job_id
+
+    job = training_jobs.cancel(db, stale)
+    assert (job.status, job.cancel_requested, job.finished_at) == ("running", True, None)
+    db.close()
+
+
+def test_cancelled_job_is_never_claimed(Session, tmp_path):
+    first, second = submit(Session, 2)
+    db = Session()
+    assert training_jobs.cancel(db, db.get(models.TrainingJob, first)).status == "cancelled"
+    db.close()
+    runner = training_jobs.TrainingJobRunner(log_dir=str(tmp_path))
+    assert runner._claim_next() == second
+    assert runner._claim_next() is None
+    assert get(Session, first).status == "cancelled"
+
+
+def test_cancel_leaves_finished_jobs_alone(Session):
+    [job_id] = submit(Session)
+    db = Session()
+    db.get(models.TrainingJob, job_id).status = "succeeded"
+    db.commit()
+    job = training_jobs.cancel(db, db.get(models.TrainingJob, job_id))
+    assert (job.status, job.cancel_requested) == ("succeeded", False)
+    db.close()
@@ -0,0 +1,73 @@
+import io
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app import uploads
+
+LIMIT = 1000
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(uploads.BodySizeLimitMiddleware, limits={"/limited/": LIMIT})
+
+    @app.post("/limited/")
+    @app.post("/unlimited/")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    return TestClient(app)
+
+
+def multipart(size):
+    boundary = "boundary"
+    yield f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="a.bin"\r\n\r\n'.encode()
+    for _ in range(size // 100):
+        yield b"x" * 100
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def post_chunked(client, path, size):
+    # A generator body is sent without Content-Length
+    return client.post(path, content=multipart(size), headers={"content-type": "multipart/form-data; boundary=boundary"})
+
+
+def test_body_within_the_limit_is_accepted(client):
+    assert client.post("/limited/", files={"file": ("a.bin", b"x" * 500)}).json() == {"size": 500}
+    assert post_chunked(client, "/limited/", 500).json() == {"size": 500}
+
+
+def test_declared_length_over_the_limit_is_rejected(client):
+    response = client.post("/limited/", files={"file": ("a.bin", b"x" * 2000)})
+    assert response.status_code == 413
+    assert response.json() == {"detail": "File is too large"}
+
+
+def test_streamed_body_over_the_limit_is_rejected(client):
+    assert post_chunked(client, "/limited/", 2000).status_code == 413
+    assert post_chunked(client, "/unlimited/", 2000).json() == {"size": 2000}
+
+
+def image_bytes(image_format):
+    buffer = io.BytesIO()
+    Image.new("RGB", (40, 30), "red").save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def test_variants_report_the_detected_format(tmp_path):
+    source = tmp_path / "upload.part"
+    source.write_bytes(image_bytes("PNG"))
+    assert uploads._render_variants(str(source), "abc", (16,)) == ("PNG", ["abc_16.webp"])
+    assert (tmp_path / "abc_16.webp").exists()
+
+
+def test_unsupported_formats_are_rejected_before_any_variant_is_written(tmp_path):
+    source = tmp_path / "upload.part"
+    source.write_bytes(image_bytes("BMP"))
+    with pytest.raises(uploads.InvalidImage, match="BMP"):
+        uploads._render_variants(str(source), "abc", (16,))
+    assert not (tmp_path / "abc_16.webp").exists()
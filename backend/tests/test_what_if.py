@@ -0,0 +1,71 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app import what_if
+from app.schemas import WhatIfRequest
+
+GRADE_POINTS = {'A': 12, 'A-': 11, 'B+': 10, 'B': 9, 'B-': 8, 'C+': 7, 'C': 6, 'C-': 5, 'D+': 4, 'D': 3, 'D-': 2, 'E': 1}
+RECOMMENDER = SimpleNamespace(
+    grade_points=GRADE_POINTS,
+    all_subjects=['Mathematics', 'Kiswahili', 'English', 'Chemistry', 'Physics', 'Biology', 'History', 'Geography', 'Music'],
+)
+STUDENT = {
+    "grades": {"Mathematics": "A", "Physics": "B+", "English": "B", "Chemistry": "C+"},
+    "interests": ["Programming"], "skills": ["Problem Solving"],
+    "linguistic": 10, "musical": 5, "bodily": 8, "logicalMathematical": 15, "spatialVisualization": 12,
+    "interpersonal": 9, "intrapersonal": 11, "naturalist": 7,
+    **{f"p{i}": "AVG" for i in range(1, 9)},
+}
+
+
+def request(**fields):
+    return WhatIfRequest(student=STUDENT, **fields)
+
+
+def scenarios(req):
+    what_if._check_subject_limit(req.student, req)
+    return what_if._scenarios(what_if._dimensions(RECOMMENDER, req), req.combine)
+
+
+def test_each_has_one_scenario_per_option():
+    req = request(grades={"Mathematics": {"low": "B", "high": "A"}}, add_interests=["Art"])
+    # B, B+, A- (A is the base grade) and the added interest
+    assert len(scenarios(req)) == 4
+
+
+def test_grid_combines_every_option():
+    req = request(grades={"Mathematics": {"low": "B", "high": "A"}}, add_interests=["Art"], combine="grid")
+    assert len(scenarios(req)) == 4 * 2 - 1
+
+
+def test_grid_over_the_limit_is_rejected():
+    with pytest.raises(ValueError, match="More than"):
+        scenarios(request(add_interests=[f"interest {i}" for i in range(20)], combine="grid"))
+
+
+def test_grid_size_does_not_overflow(monkeypatch):
+    # 2**64 wrapped to 0 in int64 arithmetic, which skipped the limit and hung the request
+    monkeypatch.setattr(what_if, "MAX_WHAT_IF_DIMENSIONS", 100)
+    start = time.perf_counter()
+    with pytest.raises(ValueError, match="More than"):
+        scenarios(request(add_interests=[f"interest {i}" for i in range(64)], combine="grid"))
+    assert time.perf_counter() - start < 1
+
+
+def test_too_many_dimensions_are_rejected():
+    with pytest.raises(ValueError, match="fields to perturb"):
+        scenarios(request(add_interests=[f"interest {i}" for i in range(what_if.MAX_WHAT_IF_DIMENSIONS + 1)]))
+
+
+def test_grades_for_new_subjects_respect_the_subject_limit():
+    # 4 subjects taken: one new subject per scenario is fine, four at once in a grid is not
+    new_subjects = {subject: {} for subject in ("Biology", "History", "Geography", "Music")}
+    assert scenarios(request(grades=new_subjects))
+    with pytest.raises(ValueError, match="more than 7 subjects"):
+        scenarios(request(grades=new_subjects, combine="grid"))
+    full = request(grades={"Biology": {}})
+    full.student.grades.update({"History": "B", "Geography": "C", "Music": "A"})
+    with pytest.raises(ValueError, match="more than 7 subjects"):
+        scenarios(full)
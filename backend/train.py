@@ -22,20 +22,22 @@ from sklearn.svm import SVC
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 
 from sklearn.preprocessing import LabelEncoder, StandardScaler
+import time
+from app.model_registry import new_model_version
+from app import model_artifacts, career_data
 
-print("Starting model training process...")
+# Every training run gets its own version so metrics history is kept per run
+model_version = new_model_version()
+print(f"Starting model training process (model version {model_version})...")
 
 # --- 1. Load Data ---
 # Course recommendation data
 course_data_path = './data/synthetic_student_data.csv'
 course_df = pd.read_csv(course_data_path)
 
-# Career recommendation data
+# Career recommendation data: typed, int8 scores and stripped profession labels (app/career_data.py)
 career_data_path = './data/cleaned_dataset.csv'
-career_df = pd.read_csv(career_data_path)
-
-# Clean 'Job profession' column in career_df
-career_df['Job profession'] = career_df['Job profession'].apply(lambda x: x.strip())
+career_df = career_data.load_career_data(career_data_path)
 
 # --- 2. Feature Engineering (Course Recommendation) ---
 
@@ -71,16 +73,15 @@ X_course_train, X_course_test, y_course_train, y_course_test = train_test_split(
 
 # Define features (X_career) and target (y_career)
 # Numerical features from cleaned_dataset.csv
-numerical_career_cols = ['Linguistic', 'Musical', 'Bodily', 'Logical - Mathematical', 'Spatial-Visualization', 'Interpersonal', 'Intrapersonal', 'Naturalist']
+numerical_career_cols = career_data.APTITUDE_COLUMNS
 # Ordinal features (already mapped to numerical in cleaning script)
-ordinal_career_cols = ['P1', 'P2', 'P3', 'P4', 'P5', 'P6', 'P7', 'P8']
+ordinal_career_cols = career_data.PREFERENCE_COLUMNS
 
 X_career = career_df[numerical_career_cols + ordinal_career_cols]
 y_career = career_df['Job profession']
 
 # Label Encode the `Job profession` target variable
-career_label_encoder = LabelEncoder()
-y_career_encoded = career_label_encoder.fit_transform(y_career)
+career_label_encoder, y_career_encoded = career_data.encode_labels(y_career)
 
 # Split data
 X_career_train, X_career_test, y_career_train, y_career_test = train_test_split(X_career, y_career_encoded, test_size=0.2, random_state=42, stratify=y_career_encoded)
@@ -130,16 +131,24 @@ career_pipeline = Pipeline(steps=[
 
 # --- 6. Train the Models ---
 print("Training the Random Forest course model...")
+start_time = time.perf_counter()
 rf_course_pipeline.fit(X_course_train, y_course_train)
+rf_course_training_time = time.perf_counter() - start_time
 
 print("Training the XGBoost course model...")
+start_time = time.perf_counter()
 xgb_course_pipeline.fit(X_course_train, y_course_train)
+xgb_course_training_time = time.perf_counter() - start_time
 
 print("Training the SVM course model...")
+start_time = time.perf_counter()
 svm_course_pipeline.fit(X_course_train, y_course_train)
+svm_course_training_time = time.perf_counter() - start_time
 
 print("Training the Career recommendation model...")
+start_time = time.perf_counter()
 career_pipeline.fit(X_career_train, y_career_train)
+career_training_time = time.perf_counter() - start_time
 
 # --- 7. Evaluate the Models ---
 
@@ -185,88 +194,98 @@ from app.models import ModelMetric
 db = SessionLocal()
 
 try:
-    # Clear existing metrics to avoid stale data
-    db.query(ModelMetric).delete()
-
-    # Create and add new metric records
+    # Metrics are kept per training run (model_version) so earlier runs remain available as history
     rf_course_metrics = ModelMetric(
         model_name="random_forest_course",
+        model_version=model_version,
         accuracy=rf_course_accuracy,
         precision=rf_course_precision,
         recall=rf_course_recall,
-        f1_score=rf_course_f1
+        f1_score=rf_course_f1,
+        training_time_seconds=rf_course_training_time
     )
     xgb_course_metrics = ModelMetric(
         model_name="xgboost_course",
+        model_version=model_version,
         accuracy=xgb_course_accuracy,
         precision=xgb_course_precision,
         recall=xgb_course_recall,
-        f1_score=xgb_course_f1
+        f1_score=xgb_course_f1,
+        training_time_seconds=xgb_course_training_time
     )
     svm_course_metrics = ModelMetric(
         model_name="svm_course",
+        model_version=model_version,
         accuracy=svm_course_accuracy,
         precision=svm_course_precision,
         recall=svm_course_recall,
-        f1_score=svm_course_f1
+        f1_score=svm_course_f1,
+        training_time_seconds=svm_course_training_time
     )
     career_metrics = ModelMetric(
         model_name="career_recommendation",
+        model_version=model_version,
         accuracy=career_accuracy,
         precision=career_precision,
         recall=career_recall,
-        f1_score=career_f1
+        f1_score=career_f1,
+        training_time_seconds=career_training_time
     )
 
     db.add_all([rf_course_metrics, xgb_course_metrics, svm_course_metrics, career_metrics])
     db.commit()
     print("Model metrics successfully saved to the database.")
 
-    # Save metrics to JSON file for Recommender class
-    metrics_json = {
-        "random_forest_course": {
-            "accuracy": rf_course_accuracy,
-            "precision": rf_course_precision,
-            "recall": rf_course_recall,
-            "f1_score": rf_course_f1
-        },
-        "xgboost_course": {
-            "accuracy": xgb_course_accuracy,
-            "precision": xgb_course_precision,
-            "recall": xgb_course_recall,
-            "f1_score": xgb_course_f1
-        },
-        "svm_course": {
-            "accuracy": svm_course_accuracy,
-            "precision": svm_course_precision,
-            "recall": svm_course_recall,
-            "f1_score": svm_course_f1
-        },
-        "career_recommendation": {
-            "accuracy": career_accuracy,
-            "precision": career_precision,
-            "recall": career_recall,
-            "f1_score": career_f1
-        }
-    }
-    with open('./app/model_metrics.json', 'w') as f:
-        json.dump(metrics_json, f, indent=4)
-    print("Model metrics successfully saved to ./app/model_metrics.json")
-
 except Exception as e:
     print(f"Error saving metrics to database: {e}")
     db.rollback()
 finally:
     db.close()
 
-# Save the Models
-joblib.dump(rf_course_pipeline, './app/random_forest_course_model.joblib')
-print("Random Forest course model pipeline saved to ./app/random_forest_course_model.joblib")
-joblib.dump(xgb_course_pipeline, './app/xgboost_course_model.joblib')
-print("XGBoost course model pipeline saved to ./app/xgboost_course_model.joblib")
-joblib.dump(svm_course_pipeline, './app/svm_course_model.joblib')
-print("SVM course model pipeline saved to ./app/svm_course_model.joblib")
-joblib.dump(career_pipeline, './app/career_recommendation_model.joblib')
-print("Career recommendation model pipeline saved to ./app/career_recommendation_model.joblib")
-joblib.dump(career_label_encoder, './app/career_label_encoder.joblib')
-print("Career label encoder saved to ./app/career_label_encoder.joblib")
\ No newline at end of file
+# --- 9. Publish the Models ---
+# Every artifact is written to a temporary file and renamed into place, and the manifest is
+# written last: the server reloads once, when the manifest describes a complete set of files.
+# Metrics read by the Recommender
+metrics_json = {
+    "model_version": model_version,
+    "random_forest_course": {
+        "accuracy": rf_course_accuracy,
+        "precision": rf_course_precision,
+        "recall": rf_course_recall,
+        "f1_score": rf_course_f1,
+        "training_time_seconds": rf_course_training_time
+    },
+    "xgboost_course": {
+        "accuracy": xgb_course_accuracy,
+        "precision": xgb_course_precision,
+        "recall": xgb_course_recall,
+        "f1_score": xgb_course_f1,
+        "training_time_seconds": xgb_course_training_time
+    },
+    "svm_course": {
+        "accuracy": svm_course_accuracy,
+        "precision": svm_course_precision,
+        "recall": svm_course_recall,
+        "f1_score": svm_course_f1,
+        "training_time_seconds": svm_course_training_time
+    },
+    "career_recommendation": {
+        "accuracy": career_accuracy,
+        "precision": career_precision,
+        "recall": career_recall,
+        "f1_score": career_f1,
+        "training_time_seconds": career_training_time
+    }
+}
+artifacts = {
+    './app/model_metrics.json': metrics_json,
+    './app/random_forest_course_model.joblib': rf_course_pipeline,
+    './app/xgboost_course_model.joblib': xgb_course_pipeline,
+    './app/svm_course_model.joblib': svm_course_pipeline,
+    './app/career_recommendation_model.joblib': career_pipeline,
+    './app/career_label_encoder.joblib': career_label_encoder,
+}
+model_artifacts.publish(artifacts, model_version, './app/model_manifest.json')
+for path in artifacts:
+    print(f"Saved {path}")
+print(f"Model manifest for version {model_version} saved to ./app/model_manifest.json")